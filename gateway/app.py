@@ -2,9 +2,21 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 import os
 
-from blueprints.options_strategy_api import options_strategy_bp
+from blueprints.batch import batch_bp
+from blueprints.push import push_bp
+from blueprints.service_proxy import create_proxy_blueprint
 from config import config
-# Add more blueprints as you add more microservices
+from proxy.admission import AdmissionControl
+from proxy.batch import BatchDispatcher
+from proxy.cache import ResponseCache
+from proxy.compression import Compressor
+from proxy.health import HealthProber
+from proxy.hedging import Hedger
+from proxy.metrics import PROMETHEUS_CONTENT_TYPE, GatewayMetrics, stats_gauges
+from proxy.pool import UpstreamPool
+from proxy.push import PushHub
+from proxy.registry import ServiceRegistry
+from proxy.singleflight import SingleFlight
 
 def create_app(config_name=None):
     app = Flask(__name__)
@@ -18,18 +30,101 @@ def create_app(config_name=None):
     # Enable CORS for all domains on all routes
     CORS(app)
     
-    # Register service blueprints
-    app.register_blueprint(options_strategy_bp)
-    
-    # Gateway health check
+    # Pooled keep-alive sessions shared by every proxy blueprint
+    upstream_pool = UpstreamPool(app)
+
+    # LRU/TTL cache for idempotent GETs on the routes listed in RESPONSE_CACHE_TTLS
+    response_cache = ResponseCache(app)
+
+    # Collapses concurrent identical GETs into one upstream call
+    single_flight = SingleFlight(app)
+
+    # Hedged GETs and the retry budget they draw from
+    hedger = Hedger(app)
+
+    # Per-client/per-service rate limits and concurrency limits for proxied requests
+    admission_control = AdmissionControl(app)
+
+    # Register a proxy blueprint for every service in the registry (SERVICES in config.py)
+    registry = ServiceRegistry(app)
+    for service in registry:
+        app.register_blueprint(create_proxy_blueprint(service))
+
+    # /batch: fans sub-requests out to the proxy blueprints in parallel
+    batch_dispatcher = BatchDispatcher(app)
+    app.register_blueprint(batch_bp)
+
+    # /subscribe: server-sent events fed by one shared upstream poll per topic
+    push_hub = PushHub(app)
+    app.register_blueprint(push_bp)
+
+    # Background health probes and per-instance circuit breakers
+    health_prober = HealthProber(app)
+
+    if app.config['METRICS_ENABLED']:
+        # Latency/throughput metrics, plus the runtime stats above as gauges and counters
+        metrics = GatewayMetrics(app)
+        metrics.add_collector(lambda: stats_gauges(
+            'gateway_upstream_pool', 'Upstream connection pool usage',
+            {(service,): stats for service, stats in upstream_pool.get_stats().items()},
+            ('in_flight', 'idle_connections'), ('service',), counters=('connections_opened',)))
+        metrics.add_collector(lambda: stats_gauges(
+            'gateway_response_cache', 'Response cache counters', {(): response_cache.get_stats()},
+            ('entries', 'bytes'), counters=('hits', 'misses', 'revalidated', 'evictions')))
+        metrics.add_collector(lambda: stats_gauges(
+            'gateway_coalescing', 'Request coalescing counters', {(): single_flight.get_stats()},
+            ('in_flight',), counters=('leaders', 'collapsed')))
+        metrics.add_collector(lambda: stats_gauges(
+            'gateway_admission', 'Admission control counters',
+            {(service,): stats for service, stats in admission_control.get_stats().items()},
+            ('in_flight',), ('service',), counters=('admitted', 'rate_limited', 'shed')))
+        metrics.add_collector(lambda: stats_gauges(
+            'gateway_hedging', 'Hedged request counters',
+            {(service,): stats for service, stats in hedger.get_stats().items()},
+            ('budget_tokens',), ('service',), counters=('hedges', 'hedge_wins', 'retries', 'budget_exhausted')))
+        metrics.add_collector(lambda: stats_gauges(
+            'gateway_instance', 'Upstream instance state',
+            {(service.name, instance.url): {'outstanding': instance.outstanding,
+                                            'circuit_open': int(instance.breaker.state == 'open')}
+             for service in registry for instance in service.instances},
+            ('outstanding', 'circuit_open'), ('service', 'instance')))
+        metrics.add_collector(lambda: stats_gauges(
+            'gateway_push', 'Push subscription counters', {(): push_hub.get_stats()},
+            ('subscribers',), counters=('polls', 'events')))
+
+        @app.route('/metrics', methods=['GET'])
+        def gateway_metrics():
+            return app.response_class(metrics.render(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
+    # gzip/brotli for clients that accept it. Registered last so it runs first among the
+    # after_request hooks and its time is included in the request metrics.
+    compressor = Compressor(app)
+
+    # Gateway health check, aggregated from the cached health of every registered service
     @app.route('/health', methods=['GET'])
     def health_check():
+        services = {service.name: health_prober.service_health(service) for service in registry}
+        all_healthy = all(result['status'] == 'healthy' for result in services.values())
         return jsonify({
-            'status': 'healthy',
+            'status': 'healthy' if all_healthy else 'degraded',
             'service': 'API Gateway',
-            'registered_services': [
-                'options-builder'
-            ]
+            'registered_services': [service.name for service in registry],
+            'services': services
+        }), 200
+    
+    # Gateway runtime stats
+    @app.route('/api/stats', methods=['GET'])
+    def gateway_stats():
+        return jsonify({
+            'services': registry.get_stats(),
+            'upstream_pools': upstream_pool.get_stats(),
+            'response_cache': response_cache.get_stats(),
+            'coalescing': single_flight.get_stats(),
+            'admission': admission_control.get_stats(),
+            'batch': batch_dispatcher.get_stats(),
+            'hedging': hedger.get_stats(),
+            'compression': compressor.get_stats(),
+            'push': push_hub.get_stats()
         }), 200
     
     # Gateway info endpoint
@@ -40,7 +135,7 @@ def create_app(config_name=None):
             'version': '1.0.0',
             'description': 'Central API Gateway for all WatStreet financial services',
             'available_services': {
-                '/options-builder/*': 'Options Strategy Builder Service'
+                f'{service.prefix}/*': service.description for service in registry
             }
         }), 200
     
@@ -55,9 +150,14 @@ if __name__ == '__main__':
         print(f"Starting WatStreet API Gateway (env: {env})...")
         print(f"Debug mode: {app.config['DEBUG']}")
         print("Available services:")
-        print("  - Options Strategy Builder: /options-builder/*")
+        for service in app.extensions['service_registry']:
+            print(f"  - {service.description}: {service.prefix}/* -> {', '.join(i.url for i in service.instances)}")
         print(f"  - Health Check: http://localhost:{app.config['GATEWAY_PORT']}/health")
         print(f"  - Gateway Info: http://localhost:{app.config['GATEWAY_PORT']}/api/info")
+        print(f"  - Gateway Stats: http://localhost:{app.config['GATEWAY_PORT']}/api/stats")
+        print(f"  - Batch Requests: POST http://localhost:{app.config['GATEWAY_PORT']}/batch")
+        print(f"  - Push Updates: http://localhost:{app.config['GATEWAY_PORT']}/subscribe/<topic>/<key>")
+        print(f"  - Gateway Metrics: http://localhost:{app.config['GATEWAY_PORT']}/metrics")
         
         app.run(
             host='0.0.0.0', 
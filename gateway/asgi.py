@@ -0,0 +1,235 @@
+"""
+Async (ASGI) serving mode for the gateway.
+
+Serves the same routes as the Flask app in app.py (generated from the same service
+registry), but upstream calls go through non-blocking aiohttp sessions, so a slow upstream
+request only holds a coroutine rather than a worker thread. Run it with:
+    python asgi.py
+or
+    uvicorn asgi:app --port 5000
+"""
+import asyncio
+import contextlib
+import logging
+import math
+import os
+
+import aiohttp
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from config import config
+from proxy.health import HealthProber
+from proxy.pool import HOP_BY_HOP_HEADERS, UpstreamPool, forwardable_headers
+from proxy.registry import NoAvailableInstance, ServiceRegistry
+
+
+def load_config(config_name=None):
+    """Upper-case settings of a config class, the same way Flask's config.from_object reads them"""
+    if config_name is None:
+        config_name = os.getenv('FLASK_ENV', 'default')
+    config_class = config[config_name]
+    return {key: getattr(config_class, key) for key in dir(config_class) if key.isupper()}
+
+
+class AsyncUpstreamPool:
+    """
+    Async counterpart of proxy.pool.UpstreamPool: one pooled keep-alive aiohttp session
+    per upstream service, with the same keep-alive and timeout settings.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._sessions = {}
+
+    def timeout_for(self, service):
+        overrides = self.settings.get('SERVICE_TIMEOUTS', {}).get(service, {})
+        return aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=overrides.get('connect', self.settings['UPSTREAM_CONNECT_TIMEOUT']),
+            sock_read=overrides.get('read', self.settings['UPSTREAM_READ_TIMEOUT'])
+        )
+
+    def session(self, service):
+        """Return the shared session for a service, creating it on first use (inside the event loop)"""
+        session = self._sessions.get(service)
+        if session is None:
+            connector = aiohttp.TCPConnector(limit=self.settings['ASYNC_UPSTREAM_MAX_CONNECTIONS'],
+                                             force_close=not self.settings['UPSTREAM_KEEP_ALIVE'])
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout_for(service),
+                # shared by every client of the gateway, so never keep upstream cookies
+                cookie_jar=aiohttp.DummyCookieJar(),
+                # bodies are forwarded as-is, and only compressed if the client asked for it
+                auto_decompress=False,
+                skip_auto_headers=['Accept-Encoding', 'User-Agent']
+            )
+            self._sessions[service] = session
+        return session
+
+    async def aclose(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+
+def create_asgi_app(config_name=None):
+    settings = load_config(config_name)
+    upstream_pool = AsyncUpstreamPool(settings)
+    registry = ServiceRegistry()
+    registry.load(settings['SERVICES'], {
+        'failure_threshold': settings['CIRCUIT_BREAKER_FAILURE_THRESHOLD'],
+        'reset_timeout': settings['CIRCUIT_BREAKER_RESET_TIMEOUT'],
+    })
+
+    # The same background prober as the Flask app, on its own thread with a blocking pool:
+    # health endpoints serve its cached results and its probes drive the circuit breakers
+    probe_pool = UpstreamPool()
+    probe_pool.configure(settings)
+    health_prober = HealthProber()
+    health_prober.configure(registry, probe_pool, settings, logging.getLogger('gateway.health'))
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        if settings['HEALTH_PROBE_ENABLED']:
+            health_prober.start()
+        yield
+        health_prober.stop()
+        await upstream_pool.aclose()
+
+    # Gateway health check, aggregated from the cached health of every registered service
+    async def health_check(request):
+        # instances never probed yet are probed on the spot: keep that off the event loop
+        services = {service.name: await asyncio.to_thread(health_prober.service_health, service)
+                    for service in registry}
+        all_healthy = all(result['status'] == 'healthy' for result in services.values())
+        return JSONResponse({
+            'status': 'healthy' if all_healthy else 'degraded',
+            'service': 'API Gateway',
+            'registered_services': [service.name for service in registry],
+            'services': services
+        })
+
+    # Gateway info endpoint
+    async def gateway_info(request):
+        return JSONResponse({
+            'name': 'WatStreet Money Making API Gateway',
+            'version': '1.0.0',
+            'description': 'Central API Gateway for all WatStreet financial services',
+            'engine': 'asgi',
+            'available_services': {
+                f'{service.prefix}/*': service.description for service in registry
+            }
+        })
+
+    routes = [
+        Route('/health', health_check, methods=['GET']),
+        Route('/api/info', gateway_info, methods=['GET']),
+    ]
+    for service in registry:
+        routes.extend(_service_routes(service, upstream_pool, health_prober))
+
+    app = Starlette(debug=settings['DEBUG'], routes=routes, lifespan=lifespan)
+    app.state.settings = settings
+    app.state.registry = registry
+    app.state.health_prober = health_prober
+    return app
+
+
+def _service_routes(service, upstream_pool, health_prober):
+    """Proxy and health routes for one registry service, mirroring blueprints/service_proxy.py"""
+
+    async def proxy(request: Request):
+        """
+        Proxy all requests under the prefix to the service
+        """
+        subpath = request.path_params['subpath']
+        target = f"/{subpath}"
+        if request.url.query:
+            target = f"{target}?{request.url.query}"
+
+        # as in proxy/streaming.py: only a Content-Length or a chunked transfer encoding means a body
+        has_body = ('content-length' in request.headers
+                    or 'chunked' in request.headers.get('transfer-encoding', '').lower())
+        try:
+            instance = service.pick()
+        except NoAvailableInstance as e:
+            # every instance has an open circuit: fail fast instead of waiting on a dead upstream
+            return JSONResponse({
+                "error": f"{service.description} is unavailable (circuit open)",
+                "service": service.name,
+                "requested_path": subpath
+            }, status_code=503, headers={'Retry-After': str(max(1, math.ceil(e.retry_after)))})
+        service.acquire(instance)
+
+        try:
+            resp = await upstream_pool.session(service.name).request(
+                request.method,
+                f"{instance.url}{target}",
+                headers=forwardable_headers(request.headers.items()),
+                data=request.stream() if has_body else None,
+                allow_redirects=False
+            )
+        except Exception as e:
+            service.release(instance)
+            # any failure to get a response counts against the instance (and ends a half-open trial)
+            service.record_result(instance)
+            if isinstance(e, aiohttp.ClientConnectionError):
+                return JSONResponse({
+                    "error": f"{service.description} is unavailable",
+                    "service": service.name,
+                    "requested_path": subpath
+                }, status_code=502)
+            if isinstance(e, asyncio.TimeoutError):
+                return JSONResponse({
+                    "error": f"{service.description} timeout",
+                    "service": service.name
+                }, status_code=504)
+            return JSONResponse({
+                "error": "Internal gateway error",
+                "details": str(e)
+            }, status_code=500)
+
+        service.record_result(instance, resp.status)
+
+        def finish():
+            resp.release()
+            service.release(instance)
+
+        # Forward the upstream bytes as they arrive, headers and encoding untouched
+        response = StreamingResponse(resp.content.iter_any(),
+                                     status_code=resp.status,
+                                     background=BackgroundTask(finish))
+        # replace the defaults StreamingResponse sets, keeping repeated upstream headers
+        response.raw_headers = [(name.lower(), value) for (name, value) in resp.raw_headers
+                                if name.decode('latin-1').lower() not in HOP_BY_HOP_HEADERS]
+        return response
+
+    async def health(request):
+        """
+        Health check for the service, from the prober's cached results: healthy while at least
+        one instance answers its probes and does not have an open circuit
+        """
+        result = await asyncio.to_thread(health_prober.service_health, service)
+        return JSONResponse(result, status_code=200 if result['status'] == 'healthy' else 503)
+
+    return [
+        Route(f'{service.prefix}/health', health, methods=['GET']),
+        Route(f'{service.prefix}/{{subpath:path}}', proxy, methods=['GET', 'POST', 'PUT', 'DELETE']),
+    ]
+
+
+app = create_asgi_app()
+
+if __name__ == '__main__':
+    import uvicorn
+
+    env = os.getenv('FLASK_ENV', 'default')
+    port = load_config(env)['GATEWAY_PORT']
+    print(f"Starting WatStreet API Gateway (asgi engine, env: {env})...")
+    print(f"  - Health Check: http://localhost:{port}/health")
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1,2 @@
+# Gateway benchmarks
+# Scripts in this package start the gateway against a local stub upstream and measure it
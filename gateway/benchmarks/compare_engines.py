@@ -0,0 +1,64 @@
+"""
+Compares the Flask (app.py) and async (asgi.py) gateway engines against a slow local
+stub upstream. Each engine is started in its own process and hit with the same number
+of concurrent requests; the script reports requests/sec and latency percentiles.
+
+    python -m benchmarks.compare_engines --concurrency 500 --requests 2000 --latency-ms 500
+"""
+import argparse
+import asyncio
+import statistics
+
+from benchmarks.harness import ASGI_CMD, FLASK_CMD, drive, gateway_env, percentile, start_process, wait_until_up
+
+
+def run_engine(name, command, env, args):
+    gateway = start_process(['-c', command], env)
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.gateway_port}/health")
+        url = f"http://127.0.0.1:{args.gateway_port}/options-builder/api/v1/quote"
+        latencies, errors, elapsed, _ = asyncio.run(drive(url, args.concurrency, args.requests))
+    finally:
+        gateway.terminate()
+        gateway.wait()
+
+    return {
+        'engine': name,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the Flask and ASGI gateway engines')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=200, help='stub upstream latency')
+    parser.add_argument('--upstream-port', type=int, default=5101)
+    parser.add_argument('--gateway-port', type=int, default=5100)
+    args = parser.parse_args()
+
+    env = gateway_env(args.gateway_port, args.upstream_port)
+
+    stub = start_process(['-m', 'benchmarks.stub_upstream', '--port', str(args.upstream_port),
+                          '--latency-ms', str(args.latency_ms)], env)
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.upstream_port}/api/v1/ping")
+        results = [run_engine('flask', FLASK_CMD, env, args),
+                   run_engine('asgi', ASGI_CMD, env, args)]
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, upstream latency {args.latency_ms}ms")
+    print(f"{'engine':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'errors':>8}")
+    for r in results:
+        print(f"{r['engine']:<8}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+              f"{r['mean_ms']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
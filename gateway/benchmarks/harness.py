@@ -0,0 +1,139 @@
+"""
+Shared pieces of the gateway benchmarks: starting processes, waiting for them, driving
+concurrent load and summarising latencies.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import aiohttp
+import requests
+
+GATEWAY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FLASK_CMD = ("from app import create_app; "
+             "app = create_app(); "
+             "app.run(host='127.0.0.1', port=app.config['GATEWAY_PORT'], threaded=True)")
+ASGI_CMD = ("import uvicorn; from asgi import app; from config import config; "
+            "uvicorn.run(app, host='127.0.0.1', port=config['production'].GATEWAY_PORT, "
+            "log_level='warning', backlog=4096)")
+
+
+def gateway_env(gateway_port, upstream_port, **overrides):
+    """
+    Environment for a benchmarked gateway process pointed at the stub upstream. Rate and
+    concurrency limits are raised far above the generated load so the numbers measure the
+    proxy path rather than the admission limits (which still run on every request).
+    """
+    env = dict(os.environ,
+               FLASK_ENV='production',
+               GATEWAY_PORT=str(gateway_port),
+               OPTIONS_BUILDER_SERVICE_URL=f"http://127.0.0.1:{upstream_port}",
+               OPTIONS_BUILDER_CLIENT_RATE='1000000',
+               OPTIONS_BUILDER_CLIENT_BURST='1000000',
+               OPTIONS_BUILDER_SERVICE_RATE='1000000',
+               OPTIONS_BUILDER_SERVICE_BURST='1000000',
+               OPTIONS_BUILDER_MAX_CONCURRENCY='100000')
+    env.pop('OPTIONS_BUILDER_SERVICE_URLS', None)
+    env.update({name: str(value) for name, value in overrides.items()})
+    return env
+
+
+def start_process(args, env):
+    return subprocess.Popen([sys.executable] + args, cwd=GATEWAY_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_up(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def drive(url, concurrency, total, headers=None):
+    """
+    Send `total` GETs to url with at most `concurrency` in flight.
+    Returns (latencies, errors, elapsed, bytes received); non-200 answers count as errors.
+    Bodies are requested uncompressed unless headers ask for an Accept-Encoding.
+    """
+    headers = dict({'Accept-Encoding': 'identity'}, **(headers or {}))
+    latencies = []
+    errors = 0
+    received = 0
+    queue = iter(range(total))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers,
+                                     auto_decompress=False) as client:
+        async def worker():
+            nonlocal errors, received
+            for _ in queue:
+                start = time.perf_counter()
+                try:
+                    async with client.get(url) as resp:
+                        body = await resp.read()
+                        received += len(body)
+                        if resp.status != 200:
+                            errors += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed, received
+
+
+def rss_bytes(pid):
+    """Resident memory of a process (Linux /proc), or None where that isn't available"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler:
+    """Samples a process' RSS in the background while a scenario runs, keeping the peak"""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = rss_bytes(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
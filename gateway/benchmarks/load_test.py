@@ -0,0 +1,138 @@
+"""
+Gateway load test: starts the gateway (create_app, or the asgi.py engine) in front of the
+local stub Options Builder and drives each scenario with concurrent requests through
+/options-builder/*, reporting requests/sec, p50/p99 latency, error rate and the gateway's
+memory use.
+
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --scenarios small_json,slow_upstream --concurrency 100 --requests 5000
+
+Save a run and compare a later one against it to catch regressions before deploying;
+the comparison exits non-zero when req/s drops or p99 grows by more than --tolerance:
+
+    python -m benchmarks.load_test --save baseline.json
+    python -m benchmarks.load_test --compare baseline.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import json
+import sys
+from urllib.parse import urlencode
+
+from benchmarks.harness import (ASGI_CMD, FLASK_CMD, MemorySampler, drive, gateway_env, percentile, rss_bytes,
+                                start_process, wait_until_up)
+
+# path: proxied gateway path, params: stub upstream options (see stub_upstream.py),
+# headers: client request headers, scale: fraction of --requests to send
+SCENARIOS = {
+    'small_json': {'path': '/options-builder/api/v1/bench/json', 'params': {'bytes': 512}},
+    'large_json': {'path': '/options-builder/api/v1/bench/json', 'params': {'bytes': 1_000_000}, 'scale': 0.1},
+    'large_json_gzip': {'path': '/options-builder/api/v1/bench/json', 'params': {'bytes': 1_000_000},
+                        'headers': {'Accept-Encoding': 'gzip'}, 'scale': 0.1},
+    'binary': {'path': '/options-builder/api/v1/bench/binary', 'params': {'bytes': 1_000_000}, 'scale': 0.1},
+    'slow_upstream': {'path': '/options-builder/api/v1/bench/json', 'params': {'bytes': 512, 'latency_ms': 250}},
+    'flaky_upstream': {'path': '/options-builder/api/v1/bench/json', 'params': {'bytes': 512, 'error_rate': 0.05}},
+}
+
+ENGINES = {'flask': FLASK_CMD, 'asgi': ASGI_CMD}
+
+
+def run_scenario(name, scenario, gateway, args):
+    params = dict(scenario['params'])
+    url = f"http://127.0.0.1:{args.gateway_port}{scenario['path']}?{urlencode(params)}"
+    total = max(args.concurrency, int(args.requests * scenario.get('scale', 1)))
+    headers = scenario.get('headers')
+
+    if args.warmup:
+        asyncio.run(drive(url, min(args.concurrency, args.warmup), args.warmup, headers))
+    with MemorySampler(gateway.pid) as memory:
+        latencies, errors, elapsed, received = asyncio.run(drive(url, args.concurrency, total, headers))
+
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'error_rate': errors / len(latencies),
+        'mb_per_s': received / elapsed / 1e6,
+        'peak_rss_mb': memory.peak / 1e6 if memory.peak else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against a saved run; returns the scenarios that regressed"""
+    previous = {r['scenario']: r for r in baseline['results']}
+    regressions = []
+    print(f"\nvs baseline ({baseline['engine']}, concurrency {baseline['concurrency']}):")
+    for r in results:
+        before = previous.get(r['scenario'])
+        if before is None:
+            continue
+        rps_change = r['rps'] / before['rps'] - 1
+        p99_change = r['p99_ms'] / before['p99_ms'] - 1
+        regressed = rps_change < -tolerance or p99_change > tolerance
+        print(f"  {r['scenario']:<18} req/s {rps_change:+7.1%}  p99 {p99_change:+7.1%}"
+              f"{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(r['scenario'])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the gateway against a local stub upstream')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='flask')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario (before its scale)')
+    parser.add_argument('--warmup', type=int, default=100, help='requests sent before measuring each scenario')
+    parser.add_argument('--upstream-port', type=int, default=5101)
+    parser.add_argument('--gateway-port', type=int, default=5100)
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare against results saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed req/s drop or p99 increase when comparing (fraction)')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    env = gateway_env(args.gateway_port, args.upstream_port)
+    stub = start_process(['-m', 'benchmarks.stub_upstream', '--port', str(args.upstream_port)], env)
+    gateway = start_process(['-c', ENGINES[args.engine]], env)
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.upstream_port}/api/v1/ping")
+        wait_until_up(f"http://127.0.0.1:{args.gateway_port}/health")
+        idle_rss = rss_bytes(gateway.pid)
+        results = [run_scenario(name, SCENARIOS[name], gateway, args) for name in names]
+    finally:
+        gateway.terminate()
+        gateway.wait()
+        stub.terminate()
+        stub.wait()
+
+    print(f"engine {args.engine}, concurrency {args.concurrency}"
+          + (f", idle gateway RSS {idle_rss / 1e6:.1f} MB" if idle_rss else ''))
+    print(f"{'scenario':<18}{'requests':>9}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}"
+          f"{'MB/s':>8}{'peak RSS MB':>13}")
+    for r in results:
+        peak = f"{r['peak_rss_mb']:.1f}" if r['peak_rss_mb'] else 'n/a'
+        print(f"{r['scenario']:<18}{r['requests']:>9}{r['rps']:>10.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+              f"{r['error_rate']:>8.1%}{r['mb_per_s']:>8.1f}{peak:>13}")
+
+    run = {'engine': args.engine, 'concurrency': args.concurrency, 'results': results}
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(run, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(f"Regressed: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
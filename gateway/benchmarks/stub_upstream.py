@@ -0,0 +1,95 @@
+"""
+Local stand-in for the Options Builder service, used by the gateway benchmarks.
+
+Every request to /api/v1/<anything> sleeps for --latency-ms before answering, without
+blocking other requests, and fails with a 500 for a --error-rate fraction of requests.
+The bench routes return payloads of a chosen size:
+    /api/v1/bench/json?bytes=N    JSON option chain of about N bytes (default --payload-bytes)
+    /api/v1/bench/binary?bytes=N  N bytes of application/octet-stream
+Any of latency_ms, bytes and error_rate can also be set per request in the query string,
+so one stub process can serve every benchmark scenario. Run it with:
+    python -m benchmarks.stub_upstream --port 5001 --latency-ms 200 --payload-bytes 2048 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import random
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+
+@functools.lru_cache(maxsize=64)
+def json_payload(size):
+    """An option chain serialised to roughly `size` bytes (built once per size)"""
+    row = {'strike': 0, 'expiry': '2025-12-19', 'type': 'call', 'bid': 1.25, 'ask': 1.3,
+           'iv': 0.2412, 'delta': 0.512, 'open_interest': 1200}
+    row_size = len(json.dumps(row)) + 2
+    rows = [dict(row, strike=100 + i) for i in range(max(1, size // row_size))]
+    return json.dumps({'symbol': 'AAPL', 'rows': rows}).encode()
+
+
+@functools.lru_cache(maxsize=64)
+def binary_payload(size):
+    return os.urandom(size)
+
+
+def create_stub_app(latency_ms=0, payload_bytes=1024, error_rate=0.0):
+
+    def option(request, name, default):
+        return float(request.query_params.get(name, default))
+
+    async def upstream_work(request):
+        """Simulated latency and failures; returns an error response or None"""
+        delay = option(request, 'latency_ms', latency_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if random.random() < option(request, 'error_rate', error_rate):
+            return JSONResponse({'error': 'Simulated upstream failure'}, status_code=500)
+        return None
+
+    async def ping(request):
+        return JSONResponse({'message': 'Options Strategy Builder API is alive!'})
+
+    async def bench_json(request):
+        failure = await upstream_work(request)
+        if failure is not None:
+            return failure
+        return Response(json_payload(int(option(request, 'bytes', payload_bytes))), media_type='application/json')
+
+    async def bench_binary(request):
+        failure = await upstream_work(request)
+        if failure is not None:
+            return failure
+        return Response(binary_payload(int(option(request, 'bytes', payload_bytes))),
+                        media_type='application/octet-stream')
+
+    async def endpoint(request):
+        failure = await upstream_work(request)
+        if failure is not None:
+            return failure
+        return JSONResponse({'path': request.path_params['subpath'],
+                             'latency_ms': option(request, 'latency_ms', latency_ms)})
+
+    return Starlette(routes=[
+        Route('/api/v1/ping', ping, methods=['GET']),
+        Route('/api/v1/bench/json', bench_json, methods=['GET']),
+        Route('/api/v1/bench/binary', bench_binary, methods=['GET']),
+        Route('/api/v1/{subpath:path}', endpoint, methods=['GET', 'POST', 'PUT', 'DELETE']),
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub Options Builder upstream')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--payload-bytes', type=int, default=1024, help='default size of the bench payloads')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    args = parser.parse_args()
+
+    uvicorn.run(create_stub_app(args.latency_ms, args.payload_bytes, args.error_rate),
+                host='127.0.0.1', port=args.port, log_level='warning', backlog=4096)
@@ -0,0 +1,32 @@
+from flask import Blueprint, request, jsonify
+
+from proxy.batch import BatchError, get_batch_dispatcher
+
+batch_bp = Blueprint('batch', __name__)
+
+
+@batch_bp.route('/batch', methods=['POST'])
+def batch():
+    """
+    Run several proxied requests in one round trip.
+
+    Body:
+        {
+            "deadline_ms": 2000,
+            "requests": [
+                {"id": "chain", "method": "GET", "path": "/options-builder/api/v1/chain?symbol=AAPL"},
+                {"id": "build", "method": "POST", "path": "/options-builder/api/v1/strategies",
+                 "headers": {"X-Request-Source": "dashboard"}, "body": {"legs": []}}
+            ]
+        }
+
+    Sub-requests run in parallel. The response lists one result per sub-request, in order,
+    each with its own status; sub-requests that miss the deadline get status 504.
+    """
+    dispatcher = get_batch_dispatcher()
+    try:
+        sub_requests, deadline = dispatcher.parse(request.get_json(silent=True))
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"responses": dispatcher.run(sub_requests, deadline)}), 200
@@ -0,0 +1,33 @@
+from flask import Blueprint, jsonify, current_app
+
+from proxy.push import TooManySubscribers, get_push_hub
+
+push_bp = Blueprint('push', __name__)
+
+
+@push_bp.route('/subscribe/<topic>/<path:key>', methods=['GET'])
+def subscribe(topic, key):
+    """
+    Server-sent event stream of updates to one topic, e.g. /subscribe/ledger/krishalgo
+    or /subscribe/chain/AAPL. The current state is sent first, then an `update` event
+    whenever it changes (`error` events when the upstream fails).
+    """
+    hub = get_push_hub()
+    try:
+        subscription = hub.subscribe(topic, key)
+    except KeyError:
+        return jsonify({
+            "error": f"Unknown topic '{topic}'",
+            "available_topics": hub.available_topics()
+        }), 404
+    except TooManySubscribers:
+        response = jsonify({"error": "Too many subscribers"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(hub.heartbeat))
+        return response
+
+    return current_app.response_class(
+        hub.stream(*subscription),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
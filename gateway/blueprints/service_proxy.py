@@ -0,0 +1,214 @@
+import math
+
+from flask import Blueprint, request, jsonify, current_app
+import requests
+
+from proxy.admission import Rejected, get_admission_control
+from proxy.cache import get_response_cache
+from proxy.health import get_health_prober
+from proxy.hedging import get_hedger
+from proxy.pool import forwardable_headers, get_upstream_pool
+from proxy.registry import NoAvailableInstance
+from proxy.singleflight import get_single_flight
+from proxy.streaming import read_upstream, replay_response, stream_response, upstream_request_body
+
+
+def create_proxy_blueprint(service):
+    """
+    Create the proxy blueprint for a service from the registry (see SERVICES in config.py).
+    It is mounted at the service prefix and forwards every request to one of the
+    service's upstream instances, chosen by the service's balancer.
+    """
+    bp = Blueprint(f"{service.name.replace('-', '_')}_proxy",
+                   __name__,
+                   url_prefix=service.prefix)
+
+    @bp.route('/<path:subpath>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+    def proxy(subpath):
+        """
+        Proxy all requests under the prefix to the service, once admission control lets them in
+        """
+        try:
+            release = get_admission_control().admit(service.name)
+        except Rejected as e:
+            response = jsonify({
+                "error": e.reason,
+                "service": service.name
+            })
+            response.status_code = e.status_code
+            response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+            return response
+
+        try:
+            response = current_app.make_response(forward(subpath))
+        except Exception:
+            release()
+            raise
+        # the request holds its concurrency slot until the body has been sent
+        response.call_on_close(release)
+        return response
+
+    def forward(subpath):
+        """
+        Forward a request to one of the service's instances
+        """
+        target = f"/{subpath}"
+        if request.query_string:
+            target = f"{target}?{request.query_string.decode('latin-1')}"
+
+        pool = get_upstream_pool()
+        hedger = get_hedger()
+        hedge = hedger.should_hedge(service, subpath)
+
+        def upstream_options(extra_headers=None):
+            # Everything about the upstream request that comes from the incoming one
+            headers = forwardable_headers(request.headers)
+            headers.update(extra_headers or {})
+            return {
+                'method': request.method,
+                'headers': headers,
+                'data': upstream_request_body(),
+                'cookies': request.cookies,
+                'allow_redirects': False
+            }
+
+        def send(instance, options):
+            # Forward the request over the pooled keep-alive session for this service.
+            # May run on a hedging worker thread, so it must not touch the request context.
+            # the outcome always reaches the circuit breaker: an exception counts as a failure
+            status_code = None
+            try:
+                resp = pool.request(service.name, url=f"{instance.url}{target}", stream=True, **options)
+                status_code = resp.status_code
+                return resp
+            finally:
+                service.record_result(instance, status_code)
+
+        def open_upstream(extra_headers=None):
+            # Send the request and wait for the response headers. Returns (instance, response),
+            # with the instance acquired until the caller releases it.
+            options = upstream_options(extra_headers)
+            if hedge:
+                return hedger.call(service, lambda instance: send(instance, options))
+            instance = service.pick()
+            service.acquire(instance)
+            try:
+                return instance, send(instance, options)
+            except Exception:
+                service.release(instance)
+                raise
+
+        flight = get_single_flight()
+        coalesce = flight.should_coalesce(service.name, subpath)
+
+        def fetch_once(extra_headers=None):
+            instance, resp = open_upstream(extra_headers)
+            try:
+                return read_upstream(resp)
+            finally:
+                service.release(instance)
+
+        def fetch(extra_headers=None):
+            # Fully read upstream response; identical concurrent requests share a single upstream call
+            if coalesce:
+                key = flight.key(service.name, subpath, extra_headers)
+                return flight.do(key, lambda: fetch_once(extra_headers))
+            return fetch_once(extra_headers)
+
+        try:
+            cache = get_response_cache()
+            if cache.should_cache(service.name, subpath):
+                # Idempotent GET on a cached route: answer from the gateway cache when possible
+                return cache.serve(service.name, subpath, fetch)
+
+            if coalesce:
+                return replay_response(fetch())
+
+            instance, resp = open_upstream()
+            if not current_app.config['PROXY_STREAM_RESPONSES']:
+                try:
+                    return _buffered_response(resp)
+                finally:
+                    service.release(instance)
+
+            # Forward the upstream bytes as they arrive, headers and encoding untouched.
+            # The instance counts as busy until the client has read the whole body.
+            return stream_response(resp, on_close=lambda: service.release(instance))
+
+        except NoAvailableInstance as e:
+            # every instance has an open circuit: fail fast instead of waiting on a dead upstream
+            response = jsonify({
+                "error": f"{service.description} is unavailable (circuit open)",
+                "service": service.name,
+                "requested_path": subpath
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+            return response
+        except requests.exceptions.ConnectionError as e:
+            upstream_url = e.request.url if e.request is not None else service.prefix
+            current_app.logger.error(f"Failed to connect to {service.description} at {upstream_url}")
+            return jsonify({
+                "error": f"{service.description} is unavailable",
+                "service": service.name,
+                "requested_path": subpath
+            }), 502
+        except requests.exceptions.Timeout as e:
+            upstream_url = e.request.url if e.request is not None else service.prefix
+            current_app.logger.error(f"Timeout connecting to {service.description} at {upstream_url}")
+            return jsonify({
+                "error": f"{service.description} timeout",
+                "service": service.name
+            }), 504
+        except Exception as e:
+            current_app.logger.error(f"Error proxying to {service.name}: {e}", exc_info=True)
+            return jsonify({
+                "error": "Internal gateway error",
+                "details": str(e)
+            }), 500
+
+    @bp.route('/health', methods=['GET'])
+    def health():
+        """
+        Health check for the service, served from the background prober's cached results
+        """
+        result = get_health_prober().service_health(service)
+        return jsonify(result), 200 if result['status'] == 'healthy' else 503
+
+    return bp
+
+
+def _buffered_response(resp):
+    """
+    Build the client response from a fully read upstream response.
+    Used when streaming passthrough is turned off (PROXY_STREAM_RESPONSES=False).
+    """
+    # Create a response to send back to the client
+    excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
+    headers = [(name, value) for (name, value) in resp.raw.headers.items()
+               if name.lower() not in excluded_headers]
+
+    # Handle response based on content type
+    if resp.headers.get('Content-Type', '').startswith('application/json'):
+        try:
+            flask_response = jsonify(resp.json())
+            flask_response.status_code = resp.status_code
+        except ValueError:
+            # If JSON parsing fails, treat as plain text
+            flask_response = current_app.response_class(
+                response=resp.content,
+                status=resp.status_code,
+                mimetype='text/plain'
+            )
+    else:
+        flask_response = current_app.response_class(
+            response=resp.content,
+            status=resp.status_code,
+            mimetype=resp.headers.get('Content-Type', 'text/plain')
+        )
+
+    # Add headers to the Flask response object
+    for name, value in headers:
+        flask_response.headers.set(name, value)
+
+    return flask_response
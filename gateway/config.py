@@ -4,6 +4,11 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv('.env')
 
+
+def _url_list(value):
+    """Split a comma separated list of upstream URLs"""
+    return [url.strip() for url in value.split(',') if url.strip()]
+
 class Config:
     """Base configuration"""
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
@@ -11,6 +16,158 @@ class Config:
     
     # Microservice URLs
     OPTIONS_BUILDER_SERVICE_URL = os.getenv('OPTIONS_BUILDER_SERVICE_URL', 'http://localhost:5001')
+    LEDGER_SERVICE_URL = os.getenv('LEDGER_SERVICE_URL')  # the ledger is only proxied when set
+
+    # Service registry: every entry gets a generated proxy blueprint mounted at its prefix.
+    #   instances: upstream URLs serving the service (comma separated in the env var)
+    #   balancer: 'round_robin' or 'least_outstanding'
+    SERVICES = {
+        'options-builder': {
+            'prefix': '/options-builder',
+            'description': 'Options Strategy Builder Service',
+            'instances': _url_list(os.getenv('OPTIONS_BUILDER_SERVICE_URLS', OPTIONS_BUILDER_SERVICE_URL)),
+            'balancer': os.getenv('OPTIONS_BUILDER_BALANCER', 'round_robin'),
+            'health_path': '/api/v1/ping',
+        },
+        **({
+            'ledger': {
+                'prefix': '/ledger',
+                'description': 'Ledger Service',
+                'instances': _url_list(LEDGER_SERVICE_URL),
+                'health_path': '/ping',
+            },
+        } if LEDGER_SERVICE_URL else {}),
+    }
+
+    # Upstream connection pooling (shared by every proxy blueprint)
+    UPSTREAM_POOL_CONNECTIONS = int(os.getenv('UPSTREAM_POOL_CONNECTIONS', 10))  # hosts kept per service
+    UPSTREAM_POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', 50))  # connections kept per host
+    UPSTREAM_POOL_BLOCK = os.getenv('UPSTREAM_POOL_BLOCK', 'False').lower() == 'true'
+    UPSTREAM_KEEP_ALIVE = os.getenv('UPSTREAM_KEEP_ALIVE', 'True').lower() == 'true'
+
+    # Upstream connection cap per service for the async (asgi.py) engine
+    ASYNC_UPSTREAM_MAX_CONNECTIONS = int(os.getenv('ASYNC_UPSTREAM_MAX_CONNECTIONS', 1000))
+
+    # Forward upstream bodies chunk by chunk instead of buffering (and re-encoding JSON)
+    PROXY_STREAM_RESPONSES = os.getenv('PROXY_STREAM_RESPONSES', 'True').lower() == 'true'
+    PROXY_STREAM_CHUNK_SIZE = int(os.getenv('PROXY_STREAM_CHUNK_SIZE', 64 * 1024))
+
+    # Compress responses (gzip, or brotli when installed) for clients that accept it.
+    # Bodies an upstream already compressed are passed through as they are.
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))  # bytes; smaller bodies aren't worth it
+    COMPRESSION_MIMETYPES = [
+        'application/json', 'application/x-ndjson', 'application/javascript',
+        'text/plain', 'text/html', 'text/css', 'text/csv', 'image/svg+xml'
+    ]
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+
+    # Gateway response cache for idempotent GETs
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    RESPONSE_CACHE_MAX_ITEM_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_ITEM_BYTES', 4 * 1024 * 1024))
+    # Request headers that are part of the cache key (upstream responses that Vary on others are not cached)
+    # (Cookie included, so a response that depends on a session is never served to another client)
+    RESPONSE_CACHE_VARY_HEADERS = ['Accept', 'Accept-Encoding', 'Authorization', 'Cookie']
+    # TTLs (seconds) per service and route prefix; the longest matching prefix wins, unlisted routes are not cached
+    RESPONSE_CACHE_TTLS = {
+        'options-builder': {
+            '/api/v1/chain': int(os.getenv('OPTIONS_BUILDER_CHAIN_CACHE_TTL', 15)),
+            '/api/v1/strategies/templates': int(os.getenv('OPTIONS_BUILDER_TEMPLATES_CACHE_TTL', 300)),
+        }
+    }
+
+    # Single-flight coalescing of concurrent identical GETs (coalesced responses are buffered, not streamed)
+    COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'True').lower() == 'true'
+    # Route prefixes per service where identical in-flight GETs share one upstream call
+    COALESCE_ROUTES = {
+        'options-builder': ['/api/v1/chain', '/api/v1/strategies'],
+    }
+    # Request headers that must match for two requests to be considered identical
+    COALESCE_VARY_HEADERS = ['Accept', 'Accept-Encoding', 'Authorization', 'Cookie']
+
+    # Background health probing of every service instance (results cached for the /health endpoints)
+    HEALTH_PROBE_ENABLED = os.getenv('HEALTH_PROBE_ENABLED', 'True').lower() == 'true'
+    HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', 10))
+    HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', 2))
+
+    # Per-instance circuit breaker: open after N consecutive failures, retry after the reset timeout
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5))
+    CIRCUIT_BREAKER_RESET_TIMEOUT = float(os.getenv('CIRCUIT_BREAKER_RESET_TIMEOUT', 30))
+
+    # Hedged GETs: if an instance hasn't answered after the service's HEDGE_PERCENTILE latency,
+    # send a duplicate to another instance and use whichever answers first
+    HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'True').lower() == 'true'
+    # Route prefixes per service where GETs are hedged (only helps with more than one instance)
+    HEDGE_ROUTES = {
+        'options-builder': ['/api/v1'],
+    }
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))
+    HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 0.05))  # seconds, floor for the hedge delay
+    HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', 1))  # until HEDGE_MIN_SAMPLES latencies were seen
+    HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))
+    HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', 256))
+    # Retry budget shared by hedges and connect retries: extra attempts are capped at
+    # RETRY_BUDGET_RATIO x requests, plus RETRY_BUDGET_MIN_PER_SECOND
+    RETRY_BUDGET_RATIO = float(os.getenv('RETRY_BUDGET_RATIO', 0.1))
+    RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv('RETRY_BUDGET_MIN_PER_SECOND', 1))
+
+    # Admission control in front of every proxied service (services without an entry are not limited)
+    ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', 'True').lower() == 'true'
+    # Token buckets per service: 'client' is per client, 'service' is shared by all clients.
+    # rate is in requests/second, burst is the bucket size. Empty buckets answer 429.
+    RATE_LIMITS = {
+        'options-builder': {
+            'client': {'rate': float(os.getenv('OPTIONS_BUILDER_CLIENT_RATE', 20)),
+                       'burst': int(os.getenv('OPTIONS_BUILDER_CLIENT_BURST', 40))},
+            'service': {'rate': float(os.getenv('OPTIONS_BUILDER_SERVICE_RATE', 200)),
+                        'burst': int(os.getenv('OPTIONS_BUILDER_SERVICE_BURST', 400))},
+        }
+    }
+    # Max requests in flight to a service; excess requests are shed with 503
+    CONCURRENCY_LIMITS = {
+        'options-builder': int(os.getenv('OPTIONS_BUILDER_MAX_CONCURRENCY', 100)),
+    }
+    # Header identifying a client for rate limiting (e.g. an API key); the peer address is used when unset or absent
+    RATE_LIMIT_CLIENT_HEADER = os.getenv('RATE_LIMIT_CLIENT_HEADER')
+
+    # /batch endpoint: sub-requests run in parallel on a shared worker pool
+    BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 50))
+    BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', 64))
+    BATCH_DEFAULT_DEADLINE = float(os.getenv('BATCH_DEFAULT_DEADLINE', 10))  # seconds, when deadline_ms is not given
+    BATCH_MAX_DEADLINE = float(os.getenv('BATCH_MAX_DEADLINE', 30))
+
+    # Server-sent event subscriptions (GET /subscribe/<topic>/<key>). Each topic polls one
+    # upstream path for all of its subscribers every `interval` seconds and pushes changes.
+    # Topics whose service is not registered are unavailable.
+    PUSH_TOPICS = {
+        'ledger': {'service': 'ledger', 'path': '/view_ledger?name={key}',
+                   'interval': float(os.getenv('PUSH_LEDGER_INTERVAL', 2))},
+        'chain': {'service': 'options-builder', 'path': '/api/v1/chain?symbol={key}',
+                  'interval': float(os.getenv('PUSH_CHAIN_INTERVAL', 5))},
+    }
+    PUSH_MAX_SUBSCRIBERS = int(os.getenv('PUSH_MAX_SUBSCRIBERS', 1000))
+    # Events buffered per subscriber; a slower client skips to the latest snapshots
+    PUSH_MAX_PENDING_EVENTS = int(os.getenv('PUSH_MAX_PENDING_EVENTS', 16))
+    PUSH_HEARTBEAT_INTERVAL = float(os.getenv('PUSH_HEARTBEAT_INTERVAL', 15))
+    PUSH_FETCH_TIMEOUT = float(os.getenv('PUSH_FETCH_TIMEOUT', 5))
+
+    # Request/upstream latency metrics, exported in Prometheus text format at /metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+
+    # Default upstream timeouts (seconds)
+    UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+    UPSTREAM_READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', 30))
+
+    # Per-service timeout overrides
+    SERVICE_TIMEOUTS = {
+        'options-builder': {
+            'connect': float(os.getenv('OPTIONS_BUILDER_CONNECT_TIMEOUT', UPSTREAM_CONNECT_TIMEOUT)),
+            'read': float(os.getenv('OPTIONS_BUILDER_READ_TIMEOUT', UPSTREAM_READ_TIMEOUT)),
+        }
+    }
     
     # External API Keys
     POLYGON_API_KEY = os.getenv('POLYGON_API_KEY')
@@ -0,0 +1,2 @@
+# Gateway proxy package
+# This package contains the upstream plumbing shared by all the proxy blueprints
@@ -0,0 +1,163 @@
+import threading
+import time
+
+from flask import current_app, request
+
+
+class LocalBucketStore:
+    """
+    In-process token bucket state.
+
+    A store only needs take(key, rate, burst) -> (allowed, retry_after) and refund(key, burst)
+    to be atomic per key, so a shared store (e.g. one backed by a local Redis) can replace this
+    one by passing it to AdmissionControl without touching the proxy.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """
+        Take one token from the bucket for key, refilled at rate tokens/second up to burst.
+        Returns (allowed, seconds until a token is available).
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if key not in self._buckets and len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def refund(self, key, burst):
+        """Put back a token taken for a request that was refused further on"""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(burst, tokens + 1), updated)
+
+    def _prune(self, now):
+        # Forget the least recently used half of the buckets; a forgotten bucket comes back
+        # full, which is what an idle client would have refilled to anyway
+        ordered = sorted(self._buckets.items(), key=lambda item: item[1][1])
+        for key, _ in ordered[:len(ordered) // 2]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class Rejected(Exception):
+    """A request refused by admission control, answered with status and Retry-After"""
+
+    def __init__(self, status_code, reason, retry_after):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    """
+    Sheds load before it reaches an upstream.
+
+    Every proxied request must pass, in order:
+        - the client's token bucket for the service (429 when empty)
+        - the service's token bucket shared by every client (429 when empty)
+        - the service's concurrency limit, a cap on requests in flight upstream (503 when full)
+    Limits come from RATE_LIMITS / CONCURRENCY_LIMITS in config.py; services without
+    an entry are not limited. Rejections carry a Retry-After.
+    """
+
+    def __init__(self, app=None, store=None):
+        self.store = store or LocalBucketStore()
+        self._in_flight = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['ADMISSION_CONTROL_ENABLED']
+        self.rate_limits = app.config['RATE_LIMITS']
+        self.concurrency_limits = app.config['CONCURRENCY_LIMITS']
+        self.client_header = app.config['RATE_LIMIT_CLIENT_HEADER']
+        app.extensions['admission_control'] = self
+
+    def client_id(self):
+        """Who a request is rate limited as: the configured client header if sent, else the peer address"""
+        if self.client_header:
+            value = request.headers.get(self.client_header)
+            if value:
+                return f"key:{value}"
+        return f"addr:{request.remote_addr}"
+
+    def _count(self, service, name):
+        with self._lock:
+            stats = self._stats.setdefault(service, {'admitted': 0, 'rate_limited': 0, 'shed': 0})
+            stats[name] += 1
+
+    def admit(self, service):
+        """
+        Admit a request to a service, raising Rejected when it must be refused.
+        Returns a release callable that must be called once the request is done.
+        """
+        if not self.enabled:
+            return lambda: None
+
+        limits = self.rate_limits.get(service, {})
+        buckets = []
+        if 'client' in limits:
+            buckets.append((f"{service}:{self.client_id()}", limits['client'], 'Rate limit exceeded'))
+        if 'service' in limits:
+            buckets.append((f"{service}:*", limits['service'], 'Service rate limit exceeded'))
+        taken = []
+        for key, limit, reason in buckets:
+            allowed, retry_after = self.store.take(key, limit['rate'], limit['burst'])
+            if not allowed:
+                # a request the service bucket refuses does not cost the client a token
+                for taken_key, taken_limit in taken:
+                    self.store.refund(taken_key, taken_limit['burst'])
+                self._count(service, 'rate_limited')
+                raise Rejected(429, reason, retry_after)
+            taken.append((key, limit))
+
+        limit = self.concurrency_limits.get(service)
+        with self._lock:
+            in_flight = self._in_flight.get(service, 0)
+            if limit is not None and in_flight >= limit:
+                full = True
+            else:
+                full = False
+                self._in_flight[service] = in_flight + 1
+        if full:
+            self._count(service, 'shed')
+            raise Rejected(503, 'Service is at its concurrency limit', 1)
+        self._count(service, 'admitted')
+
+        released = []
+
+        def release():
+            with self._lock:
+                if not released:
+                    released.append(True)
+                    self._in_flight[service] -= 1
+        return release
+
+    def get_stats(self):
+        with self._lock:
+            return {service: dict(stats,
+                                  in_flight=self._in_flight.get(service, 0),
+                                  concurrency_limit=self.concurrency_limits.get(service))
+                    for service, stats in self._stats.items()}
+
+
+def get_admission_control():
+    """The AdmissionControl registered on the current app"""
+    return current_app.extensions['admission_control']
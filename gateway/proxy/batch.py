@@ -0,0 +1,165 @@
+import base64
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import current_app, request
+from werkzeug.test import EnvironBuilder
+
+from proxy.pool import forwardable_headers
+
+# Batch-level request headers that describe the batch itself, not its sub-requests
+_BATCH_ONLY_HEADERS = {'content-type', 'content-length', 'accept-encoding'}
+
+
+class BatchError(ValueError):
+    """A malformed batch payload, answered with 400"""
+
+
+class BatchDispatcher:
+    """
+    Runs the sub-requests of a /batch call in parallel on a shared worker pool.
+
+    Each sub-request is dispatched through the gateway's own routing, so it goes through
+    the same proxy blueprint as a standalone call: admission control, caching, coalescing,
+    load balancing and pooled keep-alive connections all apply. Only paths under a
+    registered service prefix may be requested.
+
+    Sub-requests still running when the batch deadline passes are reported with status
+    504; they finish in the background and their results are dropped.
+    """
+
+    def __init__(self, app=None):
+        self._stats = {'batches': 0, 'sub_requests': 0, 'deadline_exceeded': 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_requests = app.config['BATCH_MAX_REQUESTS']
+        self.default_deadline = app.config['BATCH_DEFAULT_DEADLINE']
+        self.max_deadline = app.config['BATCH_MAX_DEADLINE']
+        self.executor = ThreadPoolExecutor(max_workers=app.config['BATCH_MAX_WORKERS'],
+                                           thread_name_prefix='gateway-batch')
+        app.extensions['batch_dispatcher'] = self
+
+    def parse(self, payload):
+        """Validate a batch payload; returns (sub_requests, deadline in seconds)"""
+        if not isinstance(payload, dict) or not isinstance(payload.get('requests'), list):
+            raise BatchError("Body must be a JSON object with a 'requests' list")
+        items = payload['requests']
+        if not items:
+            raise BatchError("'requests' is empty")
+        if len(items) > self.max_requests:
+            raise BatchError(f"At most {self.max_requests} requests per batch")
+
+        prefixes = [service.prefix for service in self.app.extensions['service_registry']]
+        sub_requests = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+                raise BatchError(f"Request {index} must be an object with a 'path'")
+            path = '/' + item['path'].lstrip('/')
+            if not any(path.startswith(prefix + '/') for prefix in prefixes):
+                raise BatchError(f"Request {index}: '{path}' is not under a registered service")
+            method = str(item.get('method', 'GET')).upper()
+            if method not in ('GET', 'POST', 'PUT', 'DELETE'):
+                raise BatchError(f"Request {index}: unsupported method '{method}'")
+            headers = item.get('headers', {})
+            if not isinstance(headers, dict):
+                raise BatchError(f"Request {index}: 'headers' must be an object")
+            sub_requests.append({'id': item.get('id', index), 'method': method, 'path': path,
+                                 'headers': headers, 'body': item.get('body')})
+
+        deadline = payload.get('deadline_ms')
+        if deadline is None:
+            deadline = self.default_deadline
+        elif isinstance(deadline, (int, float)) and deadline > 0:
+            deadline = min(deadline / 1000, self.max_deadline)
+        else:
+            raise BatchError("'deadline_ms' must be a positive number")
+        return sub_requests, deadline
+
+    def run(self, sub_requests, deadline):
+        """Run sub-requests in parallel and return their results in request order"""
+        # Sub-requests inherit the batch caller's identity (auth headers, address) so they
+        # are authorised and rate limited exactly like the same calls made one by one
+        shared_headers = {name: value for name, value in forwardable_headers(request.headers).items()
+                          if name.lower() not in _BATCH_ONLY_HEADERS}
+        environ_base = {'REMOTE_ADDR': request.remote_addr}
+
+        futures = [self.executor.submit(self._dispatch, sub, shared_headers, environ_base)
+                   for sub in sub_requests]
+        done, _ = wait(futures, timeout=deadline)
+
+        results = []
+        expired = 0
+        for sub, future in zip(sub_requests, futures):
+            if future in done:
+                results.append(dict(future.result(), id=sub['id']))
+            else:
+                future.cancel()
+                expired += 1
+                results.append({'id': sub['id'], 'status': 504, 'error': 'Batch deadline exceeded'})
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['sub_requests'] += len(sub_requests)
+            self._stats['deadline_exceeded'] += expired
+        return results
+
+    def _dispatch(self, sub, shared_headers, environ_base):
+        # bodies are embedded in the batch JSON, so ask for them uncompressed
+        headers = dict(shared_headers)
+        headers['Accept-Encoding'] = 'identity'
+        headers.update(sub['headers'])
+        body = sub['body']
+        if body is not None and not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+            headers.setdefault('Content-Type', 'application/json')
+
+        started = time.perf_counter()
+        builder = EnvironBuilder(path=sub['path'], method=sub['method'], headers=headers,
+                                 data=body, environ_base=environ_base)
+        try:
+            with self.app.request_context(builder.get_environ()):
+                response = self.app.full_dispatch_request()
+                try:
+                    data = response.get_data()
+                finally:
+                    response.close()
+        except Exception as e:
+            self.app.logger.error(f"Batch sub-request {sub['method']} {sub['path']} failed: {e}", exc_info=True)
+            return {'status': 500, 'error': 'Internal gateway error'}
+        finally:
+            builder.close()
+
+        result = {'status': response.status_code,
+                  'headers': {name: value for name, value in response.headers.items()
+                              if name.lower() != 'content-length'},
+                  'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)}
+        result.update(_encode_body(response.mimetype, data))
+        return result
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+def _encode_body(mimetype, data):
+    """Embed a sub-response body in the batch JSON: parsed JSON, text, or base64 for binary"""
+    if mimetype == 'application/json' or (mimetype or '').endswith('+json'):
+        try:
+            return {'body': json.loads(data)}
+        except ValueError:
+            pass
+    try:
+        return {'body': data.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'body': base64.b64encode(data).decode('ascii'), 'body_encoding': 'base64'}
+
+
+def get_batch_dispatcher():
+    """The BatchDispatcher registered on the current app"""
+    return current_app.extensions['batch_dispatcher']
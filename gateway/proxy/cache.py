@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+
+# Upstream statuses we are willing to keep
+CACHEABLE_STATUSES = {200}
+
+
+def parse_cache_control(value):
+    """Parse a Cache-Control header into {directive: value or True}"""
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition('=')
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else True
+    return directives
+
+
+class CachedResponse:
+    """A fully read upstream response plus the bookkeeping needed to serve and revalidate it"""
+
+    def __init__(self, status, headers, body, ttl):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = _header(headers, 'ETag')
+        self.last_modified = _header(headers, 'Last-Modified')
+        self.refresh(ttl)
+
+    def refresh(self, ttl):
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+
+    @property
+    def fresh(self):
+        return time.monotonic() < self.expires_at
+
+    @property
+    def has_validators(self):
+        return bool(self.etag or self.last_modified)
+
+    @property
+    def age(self):
+        return int(time.monotonic() - self.stored_at)
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _etag_matches(if_none_match, etag):
+    """
+    Weak comparison as If-None-Match requires, so a client holding the W/ tag of a
+    gateway-compressed response still gets its 304
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    return any((tag[2:] if tag.startswith('W/') else tag) == opaque
+               for tag in (part.strip() for part in if_none_match.split(',')))
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache for idempotent GET responses proxied by the gateway.
+
+    Only routes with a TTL in RESPONSE_CACHE_TTLS are cached. Upstream Cache-Control is
+    honoured: no-store/private responses are never kept, max-age/s-maxage can only shorten
+    the route TTL, and no-cache makes every use go through conditional revalidation.
+    Stale entries with an ETag or Last-Modified are revalidated with If-None-Match /
+    If-Modified-Since instead of being fetched again.
+    """
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0, 'evictions': 0, 'uncacheable': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['RESPONSE_CACHE_ENABLED']
+        self.max_entries = app.config['RESPONSE_CACHE_MAX_ENTRIES']
+        self.max_bytes = app.config['RESPONSE_CACHE_MAX_BYTES']
+        self.max_item_bytes = app.config['RESPONSE_CACHE_MAX_ITEM_BYTES']
+        self.vary_headers = app.config['RESPONSE_CACHE_VARY_HEADERS']
+        self.route_ttls = app.config['RESPONSE_CACHE_TTLS']
+        app.extensions['response_cache'] = self
+
+    def ttl_for(self, service, path):
+        """TTL configured for the longest matching route prefix, or None if the route is not cached"""
+        path = '/' + path.lstrip('/')
+        best = None
+        for prefix, ttl in self.route_ttls.get(service, {}).items():
+            if path.startswith(prefix) and (best is None or len(prefix) > len(best[0])):
+                best = (prefix, ttl)
+        return best[1] if best else None
+
+    def should_cache(self, service, path):
+        return self.enabled and request.method == 'GET' and self.ttl_for(service, path) is not None
+
+    def key(self, service, path):
+        vary = tuple(request.headers.get(name, '') for name in self.vary_headers)
+        return (service, request.method, path, request.query_string, vary)
+
+    # LRU storage
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        size = len(entry.body)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = entry
+            self._bytes += size
+            self._stats['stores'] += 1
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self._stats['evictions'] += 1
+
+    def discard(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'entries': len(self._entries), 'bytes': self._bytes})
+        lookups = stats['hits'] + stats['misses'] + stats['revalidated']
+        stats['hit_ratio'] = round((stats['hits'] + stats['revalidated']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    # Request handling
+
+    def _storable(self, status, headers, body):
+        """Whether an upstream response may be kept at all"""
+        if status not in CACHEABLE_STATUSES or len(body) > self.max_item_bytes:
+            return False
+        if _header(headers, 'Set-Cookie') is not None:
+            return False
+        vary = _header(headers, 'Vary')
+        if vary:
+            known = {name.lower() for name in self.vary_headers}
+            if any(name.strip().lower() not in known for name in vary.split(',')):
+                return False
+        return True
+
+    def _freshness(self, route_ttl, cache_control):
+        """Seconds a response stays fresh given its Cache-Control, or None if it must not be cached"""
+        directives = parse_cache_control(cache_control)
+        if 'no-store' in directives or 'private' in directives:
+            return None
+        if 'no-cache' in directives:
+            return 0
+
+        for directive in ('s-maxage', 'max-age'):
+            if directive in directives:
+                try:
+                    return min(route_ttl, int(directives[directive]))
+                except (TypeError, ValueError):
+                    break
+        return route_ttl
+
+    def serve(self, service, path, fetch):
+        """
+        Answer the current GET from the cache, revalidating or fetching through
+        fetch(extra_headers) when needed. fetch must return a BufferedUpstreamResponse.
+        """
+        key = self.key(service, path)
+        route_ttl = self.ttl_for(service, path)
+        client_directives = parse_cache_control(request.headers.get('Cache-Control'))
+        entry = None if 'no-cache' in client_directives else self.get(key)
+
+        if entry is not None and entry.fresh:
+            self._count('hits')
+            return self._respond(entry, 'HIT')
+
+        conditional = {}
+        if entry is not None and entry.has_validators:
+            if entry.etag:
+                conditional['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                conditional['If-Modified-Since'] = entry.last_modified
+
+        resp = fetch(conditional)
+        headers, body = resp.headers, resp.body
+
+        if resp.status_code == 304 and conditional:
+            # unchanged upstream: the entry gets the freshness of the 304 (or of the original response)
+            ttl = self._freshness(route_ttl, _header(headers, 'Cache-Control') or _header(entry.headers, 'Cache-Control'))
+            entry.refresh(ttl or 0)
+            self._count('revalidated')
+            return self._respond(entry, 'REVALIDATED')
+
+        self._count('misses')
+        ttl = None
+        if self._storable(resp.status_code, headers, body):
+            ttl = self._freshness(route_ttl, _header(headers, 'Cache-Control'))
+
+        fresh_entry = CachedResponse(resp.status_code, headers, body, ttl or 0)
+        if ttl is None:
+            self.discard(key)
+            self._count('uncacheable')
+        else:
+            self.put(key, fresh_entry)
+        return self._respond(fresh_entry, 'MISS')
+
+    def _respond(self, entry, outcome):
+        if entry.etag and _etag_matches(request.headers.get('If-None-Match'), entry.etag):
+            response = current_app.response_class(status=304)
+            response.headers.set('ETag', entry.etag)
+        else:
+            response = current_app.response_class(entry.body, status=entry.status, headers=entry.headers)
+        response.headers.set('X-Cache', outcome)
+        if outcome == 'HIT':
+            response.headers.set('Age', str(entry.age))
+        return response
+
+
+def get_response_cache():
+    """The ResponseCache registered on the current app"""
+    return current_app.extensions['response_cache']
@@ -0,0 +1,163 @@
+import threading
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip is offered
+    brotli = None
+
+
+def parse_accept_encoding(value):
+    """Accept-Encoding header -> {coding: q}, e.g. 'gzip, br;q=0.5' -> {'gzip': 1.0, 'br': 0.5}"""
+    accepted = {}
+    for part in (value or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class _GzipStream:
+    def __init__(self, level):
+        # wbits=31: gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def _compress_chunks(chunks, stream):
+    """Compress an iterable of chunks as they come, flushing after each so streaming isn't held back"""
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = stream.compress(chunk)
+            if data:
+                yield data
+        yield stream.finish()
+    finally:
+        # closing the wrapper must still close the upstream body underneath
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class Compressor:
+    """
+    Compresses gateway responses with gzip or brotli, negotiated from the client's
+    Accept-Encoding.
+
+    Only responses whose content type is in COMPRESSION_MIMETYPES and whose size is at
+    least COMPRESSION_MIN_SIZE are compressed. Responses that already carry a
+    Content-Encoding (e.g. an upstream that compressed its own body) are passed through
+    untouched, never decompressed and recompressed. Streamed responses are compressed
+    chunk by chunk, so they stay streamed.
+    """
+
+    def __init__(self, app=None):
+        self._stats = {'compressed': 0, 'passthrough': 0, 'skipped': 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['COMPRESSION_ENABLED']
+        self.min_size = app.config['COMPRESSION_MIN_SIZE']
+        self.mimetypes = set(app.config['COMPRESSION_MIMETYPES'])
+        self.gzip_level = app.config['COMPRESSION_GZIP_LEVEL']
+        self.brotli_quality = app.config['COMPRESSION_BROTLI_QUALITY']
+        # in order of preference when the client accepts several equally
+        self.codings = ['br', 'gzip'] if brotli is not None else ['gzip']
+        app.extensions['compressor'] = self
+        if self.enabled:
+            app.after_request(self._after_request)
+
+    def negotiate(self, accept_encoding):
+        """The coding to use for a client, or None"""
+        accepted = parse_accept_encoding(accept_encoding)
+        best = None
+        for coding in self.codings:
+            q = accepted.get(coding, accepted.get('*', 0))
+            if q > 0 and (best is None or q > best[1]):
+                best = (coding, q)
+        return best[0] if best else None
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _stream(self, coding):
+        return _BrotliStream(self.brotli_quality) if coding == 'br' else _GzipStream(self.gzip_level)
+
+    def _after_request(self, response):
+        if 'Content-Encoding' in response.headers:
+            # already compressed upstream: forward the bytes as they are
+            self._count('passthrough')
+            return response
+
+        coding = self.negotiate(request.headers.get('Accept-Encoding'))
+        if (coding is None or request.method == 'HEAD'
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.mimetype not in self.mimetypes):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        length = response.content_length
+        if length is not None and length < self.min_size:
+            self._count('skipped')
+            return response
+
+        if response.is_streamed:
+            # unknown or large length: compress on the fly, dropping the Content-Length
+            response.response = _compress_chunks(response.response, self._stream(coding))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                self._count('skipped')
+                return response
+            stream = self._stream(coding)
+            response.set_data(stream.compress(data) + stream.finish())
+
+        response.headers['Content-Encoding'] = coding
+        # the compressed body is a different representation of the same resource
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        self._count('compressed')
+        return response
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, codings=self.codings)
+
+
+def get_compressor():
+    """The Compressor registered on the current app"""
+    return current_app.extensions['compressor']
@@ -0,0 +1,203 @@
+import threading
+import time
+
+import requests
+from flask import current_app
+
+
+class CircuitBreaker:
+    """
+    Per-instance circuit breaker.
+
+    closed: requests flow; consecutive failures are counted and reaching
+        failure_threshold opens the circuit.
+    open: requests are refused (the proxy answers 503 straight away) until
+        reset_timeout seconds have passed.
+    half_open: a limited number of trial requests are let through; a success
+        closes the circuit again, a failure re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    def _current_state(self):
+        # open -> half_open happens lazily once the reset timeout has passed
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def retry_after(self):
+        """Seconds until an open circuit lets a trial request through"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0
+            return max(0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def allow_request(self):
+        """
+        Whether a request may be sent now; in half_open this takes one of the trial slots,
+        which record_success / record_failure (or cancel_request) gives back
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._trials < self.half_open_max_calls:
+                self._trials += 1
+                return True
+            return False
+
+    def cancel_request(self):
+        """Give back the trial slot of a request that was allowed but not sent after all"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trials = 0
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trials = 0
+
+    def half_open(self):
+        """
+        Let trial requests through early (used when a health probe succeeds). On a circuit
+        already half open this frees its trial slots, in case a trial never reported back.
+        """
+        with self._lock:
+            if self._current_state() in (self.OPEN, self.HALF_OPEN):
+                self._state = self.HALF_OPEN
+                self._trials = 0
+
+
+class HealthProber:
+    """
+    Background thread that pings every instance of every registered service and caches
+    the result on the instance, so health endpoints never wait on an upstream.
+
+    Failed probes count against the instance's circuit breaker, and a successful probe
+    lets trial requests through to an instance whose circuit is open.
+    """
+
+    def __init__(self, app=None):
+        self._stop = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.configure(app.extensions['service_registry'], app.extensions['upstream_pool'], app.config, app.logger)
+        app.extensions['health_prober'] = self
+        if app.config['HEALTH_PROBE_ENABLED']:
+            self.start()
+
+    def configure(self, registry, pool, settings, logger):
+        """Set up probing outside of Flask (the ASGI engine); the caller starts and stops it"""
+        self.registry = registry
+        self.pool = pool
+        self.interval = settings['HEALTH_PROBE_INTERVAL']
+        self.timeout = settings['HEALTH_PROBE_TIMEOUT']
+        self.logger = logger
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='gateway-health-prober', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe_all()
+            except Exception as e:
+                self.logger.error(f"Health probe round failed: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+
+    def probe_all(self):
+        for service in self.registry:
+            self.probe_service(service)
+
+    def probe_service(self, service):
+        for instance in service.instances:
+            self.probe(service, instance)
+
+    def probe(self, service, instance):
+        started = time.monotonic()
+        health = {'last_checked': time.time()}
+        try:
+            resp = self.pool.request(service.name, 'GET', f"{instance.url}{service.health_path}",
+                                     timeout=self.timeout)
+            health['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+            if resp.status_code == 200:
+                health['status'] = 'healthy'
+                try:
+                    health['upstream_response'] = resp.json()
+                except ValueError:
+                    pass
+            else:
+                health['status'] = 'unhealthy'
+                health['upstream_status'] = resp.status_code
+        except requests.exceptions.RequestException as e:
+            health['status'] = 'unavailable'
+            health['error'] = str(e)
+
+        instance.health = health
+        if health['status'] == 'healthy':
+            instance.breaker.half_open()
+        else:
+            instance.breaker.record_failure()
+        return health
+
+    def service_health(self, service):
+        """
+        Cached health of a service. Instances that were never probed are probed now, and
+        so is every instance when background probing is turned off.
+        """
+        for instance in service.instances:
+            if self._thread is None or instance.health['status'] == 'unknown':
+                self.probe(service, instance)
+
+        instances = [dict(instance.health, url=instance.url, circuit=instance.breaker.state)
+                     for instance in service.instances]
+        healthy = any(item['status'] == 'healthy' and item['circuit'] != CircuitBreaker.OPEN
+                      for item in instances)
+        return {
+            'service': service.name,
+            'status': 'healthy' if healthy else 'unavailable',
+            'instances': instances
+        }
+
+
+def get_health_prober():
+    """The HealthProber registered on the current app"""
+    return current_app.extensions['health_prober']
@@ -0,0 +1,256 @@
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from flask import current_app, request
+
+from proxy.metrics import record_upstream_wait
+from proxy.registry import NoAvailableInstance
+
+
+class RetryBudget:
+    """
+    Caps extra upstream attempts (hedges and retries) at a fraction of normal traffic.
+
+    Every request deposits `ratio` of a token and every extra attempt withdraws a whole
+    one, so extra attempts can never exceed ratio x requests (plus a small floor of
+    min_per_second so low-traffic services can still hedge). When an upstream is down and
+    every request is slow or failing, the budget runs dry instead of doubling its load.
+    """
+
+    def __init__(self, ratio=0.1, min_per_second=1, max_tokens=None):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens if max_tokens is not None else max(10, min_per_second * 10)
+        self._tokens = self.max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Take one token for an extra attempt; False when the budget is spent"""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class LatencyWindow:
+    """The most recent upstream latencies of a service, for picking the hedge delay"""
+
+    def __init__(self, size=500):
+        self._samples = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile, min_samples):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class Hedger:
+    """
+    Hedged upstream requests for idempotent GETs on the routes in HEDGE_ROUTES.
+
+    The request goes to one instance; if it has not answered (response headers) after the
+    service's HEDGE_PERCENTILE latency, a duplicate is sent to another instance and the
+    first answer wins. The slower attempt is dropped and its connection closed. An attempt
+    that fails to connect is retried once on another instance. Hedges and retries both
+    draw from the service's RetryBudget, so they cannot amplify an outage.
+    """
+
+    def __init__(self, app=None):
+        self._budgets = {}
+        self._latencies = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['HEDGE_ENABLED']
+        self.routes = app.config['HEDGE_ROUTES']
+        self.percentile = app.config['HEDGE_PERCENTILE']
+        self.min_delay = app.config['HEDGE_MIN_DELAY']
+        self.default_delay = app.config['HEDGE_DEFAULT_DELAY']
+        self.min_samples = app.config['HEDGE_MIN_SAMPLES']
+        self.budget_ratio = app.config['RETRY_BUDGET_RATIO']
+        self.budget_min_per_second = app.config['RETRY_BUDGET_MIN_PER_SECOND']
+        self.executor = ThreadPoolExecutor(max_workers=app.config['HEDGE_MAX_WORKERS'],
+                                           thread_name_prefix='gateway-hedge')
+        app.extensions['upstream_pool'].add_observer(self)
+        app.extensions['hedger'] = self
+
+    def should_hedge(self, service, path):
+        """Whether a request to service (a Service) for path is sent through the hedge executor"""
+        # a hedge needs another instance to go to
+        if not self.enabled or len(service.instances) < 2:
+            return False
+        # a request body can only be sent once, so only body-less GETs are hedged
+        if (request.method != 'GET' or request.content_length
+                or 'chunked' in request.headers.get('Transfer-Encoding', '').lower()):
+            return False
+        path = '/' + path.lstrip('/')
+        return any(path.startswith(prefix) for prefix in self.routes.get(service.name, []))
+
+    def _state(self, service):
+        with self._lock:
+            if service not in self._budgets:
+                self._budgets[service] = RetryBudget(self.budget_ratio, self.budget_min_per_second)
+                self._latencies[service] = LatencyWindow()
+                self._stats[service] = {'requests': 0, 'hedges': 0, 'hedge_wins': 0, 'retries': 0,
+                                        'budget_exhausted': 0}
+            return self._budgets[service], self._latencies[service], self._stats[service]
+
+    def budget(self, service):
+        """The RetryBudget of a service"""
+        return self._state(service)[0]
+
+    def _count(self, stats, name):
+        with self._lock:
+            stats[name] += 1
+
+    def delay(self, service):
+        """Seconds to wait for the first attempt before hedging"""
+        _, latencies, _ = self._state(service)
+        observed = latencies.percentile(self.percentile, self.min_samples)
+        return max(self.min_delay, observed if observed is not None else self.default_delay)
+
+    # Upstream pool observer: learns each service's latency distribution
+
+    def observe_connect(self, service, seconds):
+        pass
+
+    def observe_upstream(self, service, url, seconds, status_code):
+        if status_code is not None:
+            self._state(service)[1].add(seconds)
+
+    def call(self, service, send):
+        """
+        Run send(instance) -> streamed upstream response, hedged across instances.
+        Returns (instance, response); the instance stays acquired on the service and the
+        caller must release it once the response has been consumed.
+        """
+        budget, _, stats = self._state(service.name)
+        budget.deposit()
+        self._count(stats, 'requests')
+        delay = self.delay(service.name)
+
+        def attempt(instance):
+            service.acquire(instance)
+            try:
+                return send(instance)
+            except Exception:
+                service.release(instance)
+                raise
+
+        def discard(future, instance):
+            # the losing attempt: drop its connection and free the instance once it returns
+            if future.exception() is None:
+                future.result().close()
+                service.release(instance)
+
+        started = time.perf_counter()
+        first = service.pick()
+        pending = {self.executor.submit(attempt, first): first}
+        tried = [first]
+        hedged = retried = False
+        error = None
+        try:
+            while pending:
+                timeout = None if hedged else max(0.0, delay - (time.perf_counter() - started))
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    # first attempt is slower than usual: send a hedge to another instance
+                    hedged = True
+                    instance = self._other_instance(service, tried)
+                    if instance is not None:
+                        if budget.withdraw():
+                            self._count(stats, 'hedges')
+                            pending[self.executor.submit(attempt, instance)] = instance
+                            tried.append(instance)
+                        else:
+                            service.cancel(instance)
+                            self._count(stats, 'budget_exhausted')
+                    continue
+
+                for future in done:
+                    instance = pending.pop(future)
+                    try:
+                        resp = future.result()
+                    except requests.exceptions.RequestException as e:
+                        error = e
+                        continue
+                    for other, other_instance in pending.items():
+                        other.add_done_callback(lambda f, i=other_instance: discard(f, i))
+                    if instance is not first:
+                        self._count(stats, 'hedge_wins')
+                    return instance, resp
+
+                if not pending and not retried and isinstance(error, requests.exceptions.ConnectionError):
+                    # nothing answered and the last attempt could not connect: retry elsewhere once
+                    retried = True
+                    instance = self._other_instance(service, tried)
+                    if instance is not None:
+                        if budget.withdraw():
+                            self._count(stats, 'retries')
+                            pending[self.executor.submit(attempt, instance)] = instance
+                            tried.append(instance)
+                        else:
+                            service.cancel(instance)
+                            self._count(stats, 'budget_exhausted')
+            raise error
+        finally:
+            # attempts run on worker threads, so account for the wait here
+            record_upstream_wait(time.perf_counter() - started)
+
+    @staticmethod
+    def _other_instance(service, tried):
+        """An available instance not tried yet for this request, or None"""
+        try:
+            instance = service.pick(exclude=tried)
+        except NoAvailableInstance:
+            return None
+        if instance in tried:
+            service.cancel(instance)
+            return None
+        return instance
+
+    def get_stats(self):
+        with self._lock:
+            services = {service: dict(stats) for service, stats in self._stats.items()}
+        for service in services:
+            services[service]['budget_tokens'] = round(self.budget(service).tokens, 2)
+            services[service]['hedge_delay_ms'] = round(self.delay(service) * 1000, 1)
+        return services
+
+
+def get_hedger():
+    """The Hedger registered on the current app"""
+    return current_app.extensions['hedger']
@@ -0,0 +1,225 @@
+import bisect
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flask import g, has_request_context, request
+
+# Latency buckets (seconds) shared by every histogram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+                                for labels, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # per-bucket (non cumulative) counts, plus +Inf, sum and count
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((labels, (list(series[0]), series[1], series[2]))
+                           for labels, series in self._values.items())
+        lines = self.header()
+        names = self.label_names + ('le',)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+def record_upstream_wait(seconds):
+    """
+    Count time the current request spent waiting on upstreams towards its upstream time.
+    The pool does this itself; code that waits on upstream calls made from other threads
+    (where there is no request context) reports the wait with this.
+    """
+    if has_request_context() and 'metrics_upstream_seconds' in g:
+        g.metrics_upstream_seconds += seconds
+
+
+def _instance_label(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class GatewayMetrics:
+    """
+    Request and upstream instrumentation for the gateway, exported in Prometheus text format.
+
+    For every request the total handling time is split into:
+        - upstream time: spent waiting on upstream calls (until response headers when streaming)
+        - connect time: spent opening new upstream connections (a part of upstream time)
+        - gateway time: everything else (routing, caching, coalescing waits, building the response)
+    Streamed bodies are timed up to the moment the response is handed to the server.
+    Recording is a dict update under a lock, cheap enough to leave on in production.
+    """
+
+    def __init__(self, app=None):
+        self.requests = Counter('gateway_requests_total', 'Requests handled by the gateway',
+                                ('route', 'method', 'status'))
+        self.in_flight = Gauge('gateway_requests_in_flight', 'Requests currently being handled', ('route',))
+        self.request_seconds = Histogram('gateway_request_duration_seconds',
+                                         'Total time to produce a response', ('route',))
+        self.gateway_seconds = Histogram('gateway_overhead_seconds',
+                                         'Time spent in the gateway itself (total minus upstream time)', ('route',))
+        self.upstream_requests = Counter('gateway_upstream_requests_total', 'Calls made to upstream instances',
+                                         ('service', 'instance', 'status'))
+        self.upstream_seconds = Histogram('gateway_upstream_duration_seconds',
+                                          'Time waiting on an upstream call', ('service', 'instance'))
+        self.connect_seconds = Histogram('gateway_upstream_connect_seconds',
+                                         'Time to open a new upstream connection', ('service',))
+        self._metrics = [self.requests, self.in_flight, self.request_seconds, self.gateway_seconds,
+                         self.upstream_requests, self.upstream_seconds, self.connect_seconds]
+        self._collectors = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['gateway_metrics'] = self
+        app.extensions['upstream_pool'].add_observer(self)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def add_collector(self, collector):
+        """Register a callable returning extra exposition lines, called on every scrape"""
+        self._collectors.append(collector)
+
+    # Request hooks
+
+    @staticmethod
+    def _route():
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_upstream_seconds = 0.0
+        g.metrics_route = self._route()
+        self.in_flight.inc(g.metrics_route)
+
+    def _after_request(self, response):
+        started = g.get('metrics_started')
+        if started is not None:
+            route = g.metrics_route
+            total = time.perf_counter() - started
+            self.requests.inc(route, request.method, str(response.status_code))
+            self.request_seconds.observe(route, value=total)
+            self.gateway_seconds.observe(route, value=max(0.0, total - g.metrics_upstream_seconds))
+        return response
+
+    def _teardown_request(self, exc):
+        route = g.pop('metrics_route', None)
+        if route is not None:
+            self.in_flight.dec(route)
+
+    # Upstream pool observer
+
+    def observe_connect(self, service, seconds):
+        self.connect_seconds.observe(service, value=seconds)
+
+    def observe_upstream(self, service, url, seconds, status_code):
+        instance = _instance_label(url)
+        self.upstream_requests.inc(service, instance, str(status_code) if status_code is not None else 'error')
+        self.upstream_seconds.observe(service, instance, value=seconds)
+        record_upstream_wait(seconds)
+
+    # Exposition
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+def stats_gauges(name, help_text, stats, fields, label_names=(), counters=()):
+    """
+    Exposition lines for numeric fields of existing runtime stats (pool, cache, coalescing...).
+    stats maps a tuple of label values (matching label_names) to a stats dict; every field in
+    fields becomes a gauge named {name}_{field}, and every field in counters (the cumulative
+    ones) a counter named {name}_{field}_total.
+    """
+    lines = []
+    for kind, kind_fields in (('gauge', fields), ('counter', counters)):
+        for field in kind_fields:
+            metric = f"{name}_{field}" + ('_total' if kind == 'counter' else '')
+            lines.append(f"# HELP {metric} {help_text} ({field})")
+            lines.append(f"# TYPE {metric} {kind}")
+            for labels, values in sorted(stats.items()):
+                lines.append(f"{metric}{_format_labels(label_names, labels)} {_format_value(values[field])}")
+    return lines
@@ -0,0 +1,202 @@
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Headers that only describe the client <-> gateway connection and must not be forwarded upstream
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade'
+}
+
+
+def forwardable_headers(headers):
+    """
+    Return the incoming request headers that are safe to send upstream
+    (everything except Host and the hop-by-hop headers)
+    """
+    return {key: value for (key, value) in headers
+            if key.lower() != 'host' and key.lower() not in HOP_BY_HOP_HEADERS}
+
+
+def _timed_pool_class(pool_class, connection_class, on_connect):
+    """Connection pool class whose new connections report how long they took to establish"""
+
+    class TimedConnection(connection_class):
+        def connect(self):
+            started = time.perf_counter()
+            super().connect()
+            on_connect(time.perf_counter() - started)
+
+    return type(pool_class.__name__, (pool_class,), {'ConnectionCls': TimedConnection})
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that reports connect (TCP + TLS) time for every new upstream connection"""
+
+    def __init__(self, on_connect, **kwargs):
+        self._on_connect = on_connect
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _timed_pool_class(HTTPConnectionPool, HTTPConnection, self._on_connect),
+            'https': _timed_pool_class(HTTPSConnectionPool, HTTPSConnection, self._on_connect),
+        }
+
+
+class UpstreamPool:
+    """
+    Owns one keep-alive session (and its connection pool) per upstream service.
+
+    Every proxy blueprint sends its traffic through the pool registered on the app,
+    so connections to a service are reused across requests instead of being opened
+    and torn down on every call.
+
+    Observers added with add_observer are told about every new connection
+    (observe_connect(service, seconds)) and every upstream call
+    (observe_upstream(service, url, seconds, status_code), status_code None on error).
+    """
+
+    def __init__(self, app=None):
+        self._sessions = {}
+        self._stats = {}
+        self._observers = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.configure(app.config)
+        app.extensions['upstream_pool'] = self
+
+    def configure(self, settings):
+        """Read the pool settings from a config mapping (used directly outside of Flask)"""
+        self.pool_connections = settings['UPSTREAM_POOL_CONNECTIONS']
+        self.pool_maxsize = settings['UPSTREAM_POOL_MAXSIZE']
+        self.pool_block = settings['UPSTREAM_POOL_BLOCK']
+        self.keep_alive = settings['UPSTREAM_KEEP_ALIVE']
+        self.default_timeout = (settings['UPSTREAM_CONNECT_TIMEOUT'],
+                                settings['UPSTREAM_READ_TIMEOUT'])
+        self.service_timeouts = settings.get('SERVICE_TIMEOUTS', {})
+
+    def timeout_for(self, service):
+        """(connect, read) timeout tuple for a service, falling back to the gateway defaults"""
+        overrides = self.service_timeouts.get(service, {})
+        return (overrides.get('connect', self.default_timeout[0]),
+                overrides.get('read', self.default_timeout[1]))
+
+    def session(self, service):
+        """Return the shared session for a service, creating it on first use"""
+        session = self._sessions.get(service)
+        if session is not None:
+            return session
+
+        with self._lock:
+            if service not in self._sessions:
+                self._sessions[service] = self._create_session(service)
+                self._stats[service] = {'requests': 0, 'in_flight': 0, 'errors': 0, 'connections_opened': 0}
+            return self._sessions[service]
+
+    def add_observer(self, observer):
+        self._observers.append(observer)
+
+    def _observe_connect(self, service, seconds):
+        # counted here rather than summed over the live host pools, which the PoolManager
+        # evicts (pool_connections), so that the count only ever grows
+        with self._lock:
+            self._stats[service]['connections_opened'] += 1
+        for observer in self._observers:
+            observer.observe_connect(service, seconds)
+
+    def _create_session(self, service):
+        session = requests.Session()
+        adapter = _TimedHTTPAdapter(lambda seconds: self._observe_connect(service, seconds),
+                                    pool_connections=self.pool_connections,
+                                    pool_maxsize=self.pool_maxsize,
+                                    pool_block=self.pool_block,
+                                    max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        # The session is shared by every client of the gateway, so it must never
+        # remember cookies set by an upstream response and replay them for someone else.
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        # Upstream bodies are forwarded as they are, so only ask for a compressed body when
+        # the client did (its Accept-Encoding is forwarded and overrides this default)
+        session.headers['Accept-Encoding'] = 'identity'
+
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def request(self, service, method, url, **kwargs):
+        """
+        Send a request to a service through its pooled session.
+        Accepts the same keyword arguments as requests.Session.request.
+        """
+        session = self.session(service)
+        kwargs.setdefault('timeout', self.timeout_for(service))
+        stats = self._stats[service]
+
+        with self._lock:
+            stats['requests'] += 1
+            stats['in_flight'] += 1
+        started = time.perf_counter()
+        status_code = None
+        try:
+            resp = session.request(method, url, **kwargs)
+            status_code = resp.status_code
+            return resp
+        except requests.exceptions.RequestException:
+            with self._lock:
+                stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                stats['in_flight'] -= 1
+            # time until the response headers (or the whole body when not streaming) arrived
+            elapsed = time.perf_counter() - started
+            for observer in self._observers:
+                observer.observe_upstream(service, url, elapsed, status_code)
+
+    def get_stats(self):
+        """Request counters and connection pool usage for every upstream service"""
+        with self._lock:
+            services = {service: dict(stats) for service, stats in self._stats.items()}
+            sessions = dict(self._sessions)
+
+        for service, session in sessions.items():
+            idle = 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    try:
+                        pool = pools[key]
+                    except KeyError:
+                        # evicted while we were looking
+                        continue
+                    idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+            services[service].update({
+                'idle_connections': idle,
+                'pool_maxsize': self.pool_maxsize,
+            })
+        return services
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+def get_upstream_pool():
+    """The UpstreamPool registered on the current app"""
+    return current_app.extensions['upstream_pool']
@@ -0,0 +1,247 @@
+import collections
+import hashlib
+import itertools
+import json
+import threading
+from urllib.parse import quote
+
+import requests
+from flask import current_app
+
+from proxy.registry import NoAvailableInstance
+
+
+class TooManySubscribers(Exception):
+    """The gateway is already holding PUSH_MAX_SUBSCRIBERS open streams"""
+
+
+class Subscriber:
+    """
+    One client stream. Events wait in a bounded buffer; when a slow client lets it fill
+    up, the oldest event is dropped. Every event is a full snapshot of the topic, so a
+    client that falls behind skips intermediate states but always ends on the latest one,
+    and a slow reader never holds up the others or grows the gateway's memory.
+    """
+
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._events = collections.deque()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def offer(self, event):
+        with self._cond:
+            if len(self._events) >= self.max_pending:
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append(event)
+            self._cond.notify()
+
+    def next_event(self, timeout):
+        """The next event, or None after timeout seconds (or once closed)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._events or self._closed, timeout)
+            return self._events.popleft() if self._events else None
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+class Topic:
+    """
+    A polled upstream resource, e.g. ledger/<name> -> GET /view_ledger?name=<name>.
+
+    One background thread per topic fetches the resource every `interval` seconds for
+    all of its subscribers, and publishes an event only when the body changed. The
+    thread runs only while the topic has subscribers.
+    """
+
+    def __init__(self, hub, name, key, service, path, interval):
+        self.hub = hub
+        self.key = (name, key)
+        self.name = f"{name}/{key}"
+        self.service = service
+        self.path = path
+        self.interval = interval
+        self.subscribers = set()
+        self.last_event = None
+        self._digest = None
+        self._etag = None
+        self._ids = itertools.count(1)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"gateway-push-{self.name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self.hub.logger.error(f"Push topic {self.name} poll failed: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+
+    def poll(self):
+        """Fetch the resource once and publish it if it changed"""
+        self.hub.count('polls')
+        headers = {'Accept-Encoding': 'identity'}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        try:
+            instance = self.service.pick()
+        except NoAvailableInstance:
+            return self.publish('error', {'status': 503, 'error': f"{self.service.description} is unavailable"})
+        status_code = None
+        try:
+            with self.service.track(instance):
+                resp = self.hub.pool.request(self.service.name, 'GET', f"{instance.url}{self.path}",
+                                             headers=headers, timeout=self.hub.fetch_timeout)
+            status_code = resp.status_code
+        except requests.exceptions.RequestException:
+            return self.publish('error', {'status': 502, 'error': f"{self.service.description} is unavailable"})
+        finally:
+            self.service.record_result(instance, status_code)
+
+        if resp.status_code == 304:
+            return None
+        self._etag = resp.headers.get('ETag')
+        try:
+            body = resp.json()
+        except ValueError:
+            body = resp.text
+        return self.publish('update' if resp.status_code < 400 else 'error',
+                            {'status': resp.status_code, 'body': body})
+
+    def publish(self, kind, data):
+        """Send an event to every subscriber, unless it is identical to the last one"""
+        payload = json.dumps(dict(data, topic=self.name), sort_keys=True)
+        digest = hashlib.sha1(f"{kind}:{payload}".encode()).hexdigest()
+        with self.hub.lock:
+            if digest == self._digest:
+                return None
+            self._digest = digest
+            event = f"id: {next(self._ids)}\nevent: {kind}\ndata: {payload}\n\n".encode()
+            self.last_event = event
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(event)
+        self.hub.count('events')
+        return event
+
+
+class PushHub:
+    """
+    Server-sent event subscriptions to upstream resources (PUSH_TOPICS in config.py).
+
+    However many clients subscribe to a topic, the upstream is polled once per interval
+    for all of them, and clients are only sent changes, instead of each client polling
+    the upstream in a loop.
+    """
+
+    def __init__(self, app=None):
+        self.topics = {}
+        self.lock = threading.Lock()
+        self._stats = {'subscribers': 0, 'polls': 0, 'events': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.registry = app.extensions['service_registry']
+        self.pool = app.extensions['upstream_pool']
+        self.topic_settings = app.config['PUSH_TOPICS']
+        self.max_subscribers = app.config['PUSH_MAX_SUBSCRIBERS']
+        self.max_pending = app.config['PUSH_MAX_PENDING_EVENTS']
+        self.heartbeat = app.config['PUSH_HEARTBEAT_INTERVAL']
+        self.fetch_timeout = app.config['PUSH_FETCH_TIMEOUT']
+        self.logger = app.logger
+        app.extensions['push_hub'] = self
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self._stats[name] += amount
+
+    def available_topics(self):
+        """Topic names whose upstream service is registered on this gateway"""
+        services = {service.name for service in self.registry}
+        return [name for name, settings in self.topic_settings.items() if settings['service'] in services]
+
+    def subscribe(self, name, key):
+        """
+        Subscribe to topic name/key, starting its poller if this is the first subscriber.
+        Raises KeyError for an unknown topic and TooManySubscribers when at capacity.
+        """
+        if name not in self.available_topics():
+            raise KeyError(name)
+        settings = self.topic_settings[name]
+        subscriber = Subscriber(self.max_pending)
+        with self.lock:
+            if self._stats['subscribers'] >= self.max_subscribers:
+                raise TooManySubscribers()
+            topic = self.topics.get((name, key))
+            started = topic is None
+            if started:
+                topic = self.topics[(name, key)] = Topic(
+                    self, name, key, self.registry.get(settings['service']),
+                    settings['path'].format(key=quote(key, safe='')), settings.get('interval', 5))
+            topic.subscribers.add(subscriber)
+            self._stats['subscribers'] += 1
+            if topic.last_event is not None:
+                # late joiners get the current state straight away
+                subscriber.offer(topic.last_event)
+        if started:
+            topic.start()
+        return topic, subscriber
+
+    def unsubscribe(self, topic, subscriber):
+        subscriber.close()
+        with self.lock:
+            if subscriber in topic.subscribers:
+                topic.subscribers.discard(subscriber)
+                self._stats['subscribers'] -= 1
+            if not topic.subscribers and self.topics.get(topic.key) is topic:
+                # last subscriber gone: stop polling the upstream for this topic
+                del self.topics[topic.key]
+                topic.stop()
+
+    def stream(self, topic, subscriber):
+        """SSE byte stream for a subscriber; heartbeats keep proxies from timing it out and reveal gone clients"""
+        try:
+            yield f"retry: {int(self.heartbeat * 1000)}\n\n".encode()
+            while not subscriber.closed:
+                event = subscriber.next_event(self.heartbeat)
+                yield event if event is not None else b": heartbeat\n\n"
+        finally:
+            self.unsubscribe(topic, subscriber)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self._stats)
+            stats['topics'] = {topic.name: {'subscribers': len(topic.subscribers),
+                                            'dropped_events': sum(s.dropped for s in topic.subscribers)}
+                               for topic in self.topics.values()}
+        return stats
+
+    def close(self):
+        with self.lock:
+            topics = list(self.topics.values())
+            self.topics = {}
+        for topic in topics:
+            for subscriber in list(topic.subscribers):
+                subscriber.close()
+            topic.stop()
+
+
+def get_push_hub():
+    """The PushHub registered on the current app"""
+    return current_app.extensions['push_hub']
@@ -0,0 +1,164 @@
+import itertools
+import threading
+from contextlib import contextmanager
+
+from flask import current_app
+
+from proxy.health import CircuitBreaker
+
+BALANCERS = ('round_robin', 'least_outstanding')
+
+
+class NoAvailableInstance(Exception):
+    """Every instance of a service has an open circuit"""
+
+    def __init__(self, service, retry_after):
+        super().__init__(f"No available instance for service '{service}'")
+        self.service = service
+        self.retry_after = retry_after
+
+
+class UpstreamInstance:
+    """One running copy of a service, with its circuit breaker and last probed health"""
+
+    def __init__(self, url, breaker=None):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.requests = 0
+        self.breaker = breaker or CircuitBreaker()
+        self.health = {'status': 'unknown'}
+
+    def __repr__(self):
+        return f"UpstreamInstance({self.url!r})"
+
+
+class Service:
+    """
+    A proxied microservice as declared in the SERVICES config: where it is mounted on the
+    gateway and the upstream instances that serve it.
+
+    Instances are picked either round robin or by fewest outstanding requests
+    (least_outstanding), which favours instances that are answering faster.
+    Instances whose circuit breaker is open are skipped.
+    """
+
+    def __init__(self, name, prefix, description, instances, balancer='round_robin', health_path='/api/v1/ping',
+                 breaker_settings=None):
+        if not instances:
+            raise ValueError(f"Service '{name}' has no upstream instances configured")
+        if balancer not in BALANCERS:
+            raise ValueError(f"Unknown balancer '{balancer}' for service '{name}', expected one of {BALANCERS}")
+
+        self.name = name
+        self.prefix = '/' + prefix.strip('/')
+        self.description = description
+        self.instances = [UpstreamInstance(url, CircuitBreaker(**(breaker_settings or {})))
+                          for url in instances]
+        self.balancer = balancer
+        self.health_path = health_path
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, name, settings, breaker_settings=None):
+        return cls(name,
+                   prefix=settings.get('prefix', f'/{name}'),
+                   description=settings.get('description', name),
+                   instances=settings['instances'],
+                   balancer=settings.get('balancer', 'round_robin'),
+                   health_path=settings.get('health_path', '/api/v1/ping'),
+                   breaker_settings=breaker_settings)
+
+    def pick(self, exclude=()):
+        """
+        Choose the instance for the next request, skipping any in exclude when possible.
+        Raises NoAvailableInstance when every circuit is open.
+        """
+        candidates = [instance for instance in self.instances if instance not in exclude] or self.instances
+        with self._lock:
+            offset = next(self._counter) % len(candidates)
+            # rotate so ties (and round robin) are spread across instances
+            ordered = candidates[offset:] + candidates[:offset]
+            if self.balancer == 'least_outstanding':
+                ordered.sort(key=lambda instance: instance.outstanding)
+
+        for instance in ordered:
+            if instance.breaker.allow_request():
+                return instance
+        raise NoAvailableInstance(self.name, min(instance.breaker.retry_after() for instance in candidates))
+
+    def record_result(self, instance, status_code=None):
+        """
+        Feed the outcome of a proxied request to the instance's circuit breaker. Every pick()
+        must end in a record_result (no status code: the request failed) or a cancel().
+        """
+        if status_code is None or status_code in (502, 503, 504):
+            instance.breaker.record_failure()
+        else:
+            instance.breaker.record_success()
+
+    def cancel(self, instance):
+        """The instance returned by pick() will not be sent the request after all"""
+        instance.breaker.cancel_request()
+
+    def acquire(self, instance):
+        with self._lock:
+            instance.outstanding += 1
+            instance.requests += 1
+
+    def release(self, instance):
+        with self._lock:
+            instance.outstanding -= 1
+
+    @contextmanager
+    def track(self, instance):
+        """Count a request against an instance for as long as the block runs"""
+        self.acquire(instance)
+        try:
+            yield instance
+        finally:
+            self.release(instance)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'balancer': self.balancer,
+                'instances': [{'url': instance.url,
+                               'outstanding': instance.outstanding,
+                               'requests': instance.requests,
+                               'circuit': instance.breaker.state} for instance in self.instances]
+            }
+
+
+class ServiceRegistry:
+    """All services proxied by the gateway, built from app.config['SERVICES']"""
+
+    def __init__(self, app=None):
+        self.services = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.load(app.config['SERVICES'], {
+            'failure_threshold': app.config['CIRCUIT_BREAKER_FAILURE_THRESHOLD'],
+            'reset_timeout': app.config['CIRCUIT_BREAKER_RESET_TIMEOUT'],
+        })
+        app.extensions['service_registry'] = self
+
+    def load(self, services_config, breaker_settings=None):
+        self.services = {name: Service.from_config(name, settings, breaker_settings)
+                         for name, settings in services_config.items()}
+
+    def __iter__(self):
+        return iter(self.services.values())
+
+    def get(self, name):
+        return self.services[name]
+
+    def get_stats(self):
+        return {service.name: service.get_stats() for service in self}
+
+
+def get_service_registry():
+    """The ServiceRegistry registered on the current app"""
+    return current_app.extensions['service_registry']
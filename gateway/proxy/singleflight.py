@@ -0,0 +1,89 @@
+import threading
+
+from flask import current_app, request
+
+
+class _Call:
+    """An upstream call in progress that later identical requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical idempotent requests into one upstream call.
+
+    The first request for a key (the leader) calls upstream; requests with the same key
+    that arrive while it is in flight wait for it and get the same result (or the same
+    error). Nothing is kept once the call finishes, so this only collapses requests that
+    actually overlap; it is not a cache.
+    """
+
+    def __init__(self, app=None):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'collapsed': 0, 'errors': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['COALESCE_ENABLED']
+        self.routes = app.config['COALESCE_ROUTES']
+        self.vary_headers = app.config['COALESCE_VARY_HEADERS']
+        app.extensions['single_flight'] = self
+
+    def should_coalesce(self, service, path):
+        if not self.enabled or request.method not in ('GET', 'HEAD'):
+            return False
+        path = '/' + path.lstrip('/')
+        return any(path.startswith(prefix) for prefix in self.routes.get(service, []))
+
+    def key(self, service, path, extra_headers=None):
+        """Requests are identical when method, path, query and the relevant headers match"""
+        headers = tuple(request.headers.get(name, '') for name in self.vary_headers)
+        extra = tuple(sorted((extra_headers or {}).items()))
+        return (service, request.method, path, request.query_string, headers, extra)
+
+    def do(self, key, fn):
+        """Run fn() for key, or wait for the identical call already in flight and share its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+            else:
+                self._stats['collapsed'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+def get_single_flight():
+    """The SingleFlight registered on the current app"""
+    return current_app.extensions['single_flight']
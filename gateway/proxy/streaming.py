@@ -0,0 +1,104 @@
+from flask import current_app, request
+
+from proxy.pool import HOP_BY_HOP_HEADERS
+
+
+class _RequestBodyStream:
+    """
+    File-like view over the incoming request body with a known length, so requests
+    streams it upstream with a Content-Length instead of reading it into memory first
+    """
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self.len = length
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+
+def _iter_chunked_body(stream, chunk_size):
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def upstream_request_body():
+    """
+    Body to send upstream for the current request, without buffering it:
+        - a length-aware stream when the client sent a Content-Length
+        - a chunk generator when the client used chunked transfer encoding
+        - None when there is no body
+    """
+    if request.content_length:
+        return _RequestBodyStream(request.stream, request.content_length)
+    # servers like gunicorn set wsgi.input_terminated on every request, so it alone does not
+    # mean there is a body: only stream one the client actually sent chunked
+    if 'chunked' in request.headers.get('Transfer-Encoding', '').lower():
+        return _iter_chunked_body(request.stream, current_app.config['PROXY_STREAM_CHUNK_SIZE'])
+    return None
+
+
+def passthrough_headers(resp):
+    """
+    Upstream response headers minus the hop-by-hop ones. Content-Encoding and
+    Content-Length are kept since the body is forwarded byte for byte.
+    Repeated headers (e.g. Set-Cookie) are preserved.
+    """
+    return [(name, value) for (name, value) in resp.raw.headers.items()
+            if name.lower() not in HOP_BY_HOP_HEADERS]
+
+
+def stream_response(resp, on_close=None):
+    """
+    Build a Flask response that forwards the upstream body chunk by chunk, exactly
+    as it came off the wire (no decompression, no JSON round trip). The upstream
+    response must have been requested with stream=True. on_close is called once the
+    body has been sent or the client went away.
+    """
+    chunk_size = current_app.config['PROXY_STREAM_CHUNK_SIZE']
+
+    def generate():
+        try:
+            for chunk in resp.raw.stream(chunk_size, decode_content=False):
+                yield chunk
+        finally:
+            # returns the connection to the pool once fully read, drops it if the client went away
+            resp.close()
+            if on_close is not None:
+                on_close()
+
+    return current_app.response_class(
+        generate(),
+        status=resp.status_code,
+        headers=passthrough_headers(resp)
+    )
+
+
+class BufferedUpstreamResponse:
+    """
+    A fully read upstream response (status, passthrough headers and the raw, still
+    encoded body) that can be replayed to any number of clients
+    """
+
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+
+def read_upstream(resp):
+    """Read an upstream response requested with stream=True into a BufferedUpstreamResponse"""
+    try:
+        # reading to the end hands the connection back to the pool
+        body = resp.raw.read(decode_content=False)
+        return BufferedUpstreamResponse(resp.status_code, passthrough_headers(resp), body)
+    finally:
+        resp.close()
+
+
+def replay_response(buffered):
+    """Flask response for a BufferedUpstreamResponse"""
+    return current_app.response_class(buffered.body, status=buffered.status_code, headers=buffered.headers)
@@ -0,0 +1,127 @@
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import create_app
+from config import Config
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for an upstream microservice, speaking keep-alive HTTP/1.1"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.requests_seen.append(('GET', self.path, dict(self.headers)))
+        if self.server.delay and self.path != '/api/v1/ping':
+            time.sleep(self.server.delay)
+        if self.path == '/api/v1/ping':
+            self._reply(200, json.dumps({'message': 'pong'}).encode())
+        elif self.path.startswith('/api/v1/strategies/slow'):
+            time.sleep(0.3)
+            self._reply(200, json.dumps({'path': self.path}).encode())
+        elif self.path.startswith('/api/v1/chain'):
+            etag = '"chain-v1"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            cache_control = 'no-store' if 'nostore' in self.path else 'max-age=60'
+            self._reply(200, json.dumps({'path': self.path}).encode(),
+                        headers={'ETag': etag, 'Cache-Control': cache_control})
+        elif self.path == '/gzip':
+            self._reply(200, gzip.compress(b'{"compressed": true}'), headers={'Content-Encoding': 'gzip'})
+        elif self.path.startswith('/json'):
+            rows = [{'strike': i, 'bid': 1.25, 'ask': 1.5} for i in range(int(self.path.split('=')[1]))]
+            self._reply(200, json.dumps({'rows': rows}).encode())
+        elif self.path.startswith('/large'):
+            self._reply(200, b'x' * int(self.path.split('=')[1]), content_type='application/octet-stream')
+        elif self.path == '/set-cookie':
+            self._reply(200, b'{}', headers={'Set-Cookie': 'session=secret; Path=/'})
+        else:
+            self._reply(200, json.dumps({'path': self.path}).encode())
+
+    def do_POST(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunk = self.rfile.read(size + 2)[:size]
+                if size == 0:
+                    break
+                body += chunk
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.requests_seen.append(('POST', self.path, dict(self.headers)))
+        self._reply(200, body, content_type=self.headers.get('Content-Type', 'application/octet-stream'))
+
+
+def start_stub_upstream():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubUpstreamHandler)
+    server.requests_seen = []
+    server.delay = 0  # seconds added to every GET except the ping, to simulate a stalled instance
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stop_stub_upstream(server):
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub_upstream():
+    server = start_stub_upstream()
+    yield server
+    stop_stub_upstream(server)
+
+
+@pytest.fixture
+def second_stub_upstream():
+    server = start_stub_upstream()
+    yield server
+    stop_stub_upstream(server)
+
+
+@pytest.fixture(autouse=True)
+def no_background_probes(monkeypatch):
+    """Tests probe on demand; a background prober would add requests the tests count"""
+    monkeypatch.setattr(Config, 'HEALTH_PROBE_ENABLED', False)
+
+
+@pytest.fixture
+def upstream_url(stub_upstream, monkeypatch):
+    """Point the options builder service in the registry at the stub upstream"""
+    url = f'http://127.0.0.1:{stub_upstream.server_port}'
+    monkeypatch.setitem(Config.SERVICES['options-builder'], 'instances', [url])
+    return url
+
+
+@pytest.fixture
+def app(upstream_url):
+    app = create_app('development')
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
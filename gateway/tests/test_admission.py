@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from config import Config
+from proxy.admission import LocalBucketStore
+
+
+@pytest.fixture
+def limited_client(monkeypatch, upstream_url):
+    def make(client=None, service=None, concurrency=None, header=None):
+        limits = {}
+        if client:
+            limits['client'] = {'rate': client[0], 'burst': client[1]}
+        if service:
+            limits['service'] = {'rate': service[0], 'burst': service[1]}
+        monkeypatch.setattr(Config, 'RATE_LIMITS', {'options-builder': limits})
+        monkeypatch.setattr(Config, 'CONCURRENCY_LIMITS',
+                            {'options-builder': concurrency} if concurrency else {})
+        monkeypatch.setattr(Config, 'RATE_LIMIT_CLIENT_HEADER', header)
+        return create_app('development').test_client()
+    return make
+
+
+def test_bucket_refills_at_the_configured_rate():
+    store = LocalBucketStore()
+    assert store.take('k', rate=10, burst=2) == (True, 0)
+    assert store.take('k', rate=10, burst=2) == (True, 0)
+
+    allowed, retry_after = store.take('k', rate=10, burst=2)
+    assert not allowed
+    assert 0 < retry_after <= 0.1
+
+    time.sleep(0.11)
+    assert store.take('k', rate=10, burst=2)[0]
+
+
+def test_store_forgets_idle_buckets_when_full():
+    store = LocalBucketStore(max_keys=4)
+    for i in range(10):
+        store.take(f'client-{i}', rate=1, burst=1)
+    assert len(store) <= 4
+
+
+def test_client_over_its_rate_gets_429(limited_client):
+    client = limited_client(client=(0.5, 3))
+
+    statuses = [client.get('/options-builder/api/v1/quote').status_code for _ in range(5)]
+    assert statuses == [200, 200, 200, 429, 429]
+
+    resp = client.get('/options-builder/api/v1/quote')
+    assert int(resp.headers['Retry-After']) >= 1
+    assert resp.json['service'] == 'options-builder'
+
+
+def test_clients_are_limited_separately(limited_client):
+    client = limited_client(client=(0.1, 1), header='X-API-Key')
+
+    assert client.get('/options-builder/api/v1/quote', headers={'X-API-Key': 'a'}).status_code == 200
+    assert client.get('/options-builder/api/v1/quote', headers={'X-API-Key': 'a'}).status_code == 429
+    assert client.get('/options-builder/api/v1/quote', headers={'X-API-Key': 'b'}).status_code == 200
+
+
+def test_service_bucket_is_shared_by_all_clients(limited_client):
+    client = limited_client(service=(0.1, 2), header='X-API-Key')
+
+    statuses = [client.get('/options-builder/api/v1/quote', headers={'X-API-Key': key}).status_code
+                for key in ('a', 'b', 'c')]
+    assert statuses == [200, 200, 429]
+
+
+def test_service_rejections_do_not_cost_the_client_a_token(limited_client):
+    client = limited_client(client=(0.1, 2), service=(0.1, 1), header='X-API-Key')
+
+    assert client.get('/options-builder/api/v1/quote', headers={'X-API-Key': 'b'}).status_code == 200
+    # the service bucket is empty: a's requests are refused without draining a's own bucket
+    for _ in range(3):
+        assert client.get('/options-builder/api/v1/quote', headers={'X-API-Key': 'a'}).status_code == 429
+    store = client.application.extensions['admission_control'].store
+    assert store.take('options-builder:key:a', rate=0.1, burst=2)[0]
+    assert store.take('options-builder:key:a', rate=0.1, burst=2)[0]
+
+
+def test_requests_over_the_concurrency_limit_are_shed(limited_client):
+    client = limited_client(concurrency=1)
+    results = []
+
+    def slow_request():
+        # the test client only frees the slot once the response is closed, like a WSGI server
+        with client.get('/options-builder/api/v1/strategies/slow') as resp:
+            results.append(resp.status_code)
+
+    slow = threading.Thread(target=slow_request)
+    slow.start()
+    time.sleep(0.1)
+
+    resp = client.get('/options-builder/api/v1/quote')
+    slow.join()
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == '1'
+    assert results == [200]
+
+    # the slot is free again once the slow request has finished
+    with client.get('/options-builder/api/v1/quote') as resp:
+        assert resp.status_code == 200
+    stats = client.get('/api/stats').json['admission']['options-builder']
+    assert stats['shed'] == 1
+    assert stats['in_flight'] == 0
+
+
+def test_streamed_responses_hold_their_slot_until_sent(limited_client):
+    client = limited_client(concurrency=1)
+
+    resp = client.get('/options-builder/large?size=200000', buffered=False)
+    assert client.get('/options-builder/api/v1/quote').status_code == 503
+
+    assert len(resp.get_data()) == 200000
+    resp.close()
+    assert client.get('/options-builder/api/v1/quote').status_code == 200
+
+
+def test_health_endpoints_are_not_limited(limited_client):
+    client = limited_client(client=(0.1, 1))
+
+    assert client.get('/options-builder/api/v1/quote').status_code == 200
+    assert client.get('/options-builder/health').status_code == 200
@@ -0,0 +1,76 @@
+import gzip
+
+import pytest
+from starlette.testclient import TestClient
+
+from asgi import create_asgi_app
+
+
+@pytest.fixture
+def asgi_client(upstream_url):
+    app = create_asgi_app('development')
+    with TestClient(app) as client:
+        yield client
+
+
+def test_gateway_routes_match_flask_app(asgi_client):
+    assert asgi_client.get('/health').json()['registered_services'] == ['options-builder']
+    assert '/options-builder/*' in asgi_client.get('/api/info').json()['available_services']
+
+
+def test_gateway_health_aggregates_cached_probe_results(asgi_client):
+    health = asgi_client.get('/health').json()
+
+    assert health['status'] == 'healthy'
+    [instance] = health['services']['options-builder']['instances']
+    assert instance['circuit'] == 'closed'
+    assert 'last_checked' in instance
+
+    asgi_client.app.state.registry.get('options-builder').instances[0].url = 'http://127.0.0.1:1'
+    asgi_client.app.state.health_prober.probe_all()
+    assert asgi_client.get('/health').json()['status'] == 'degraded'
+    assert asgi_client.get('/options-builder/health').status_code == 503
+
+
+def test_proxies_requests_with_query_string(asgi_client):
+    resp = asgi_client.get('/options-builder/api/v1/chain?symbol=AAPL')
+
+    assert resp.status_code == 200
+    assert resp.json() == {'path': '/api/v1/chain?symbol=AAPL'}
+
+
+def test_forwards_request_body(asgi_client):
+    resp = asgi_client.post('/options-builder/echo', content=b'b' * 2048,
+                            headers={'Content-Type': 'application/octet-stream'})
+
+    assert resp.content == b'b' * 2048
+
+
+def test_non_chunked_transfer_encoding_is_not_a_body(asgi_client, stub_upstream):
+    resp = asgi_client.get('/options-builder/api/v1/strategies', headers={'Transfer-Encoding': 'identity'})
+
+    assert resp.status_code == 200
+    _, _, headers = stub_upstream.requests_seen[-1]
+    assert 'Transfer-Encoding' not in headers
+
+
+def test_compressed_body_is_forwarded_untouched(asgi_client):
+    with asgi_client.stream('GET', '/options-builder/gzip') as resp:
+        body = b''.join(resp.iter_raw())
+
+    assert resp.headers['content-encoding'] == 'gzip'
+    assert gzip.decompress(body) == b'{"compressed": true}'
+
+
+def test_service_health(asgi_client):
+    resp = asgi_client.get('/options-builder/health')
+
+    assert resp.status_code == 200
+    assert resp.json()['instances'][0]['upstream_response'] == {'message': 'pong'}
+
+
+def test_unreachable_upstream_returns_502(asgi_client):
+    asgi_client.app.state.registry.get('options-builder').instances[0].url = 'http://127.0.0.1:1'
+    resp = asgi_client.get('/options-builder/api/v1/ping')
+
+    assert resp.status_code == 502
@@ -0,0 +1,78 @@
+import time
+
+from app import create_app
+from config import Config
+
+
+def test_batch_returns_every_result_in_order(client):
+    resp = client.post('/batch', json={'requests': [
+        {'id': 'quote', 'path': '/options-builder/api/v1/quote?symbol=AAPL'},
+        {'id': 'echo', 'method': 'POST', 'path': '/options-builder/api/v1/echo', 'body': {'legs': [1, 2]}},
+        {'path': '/options-builder/large?size=10', 'headers': {'X-Request-Source': 'dashboard'}},
+    ]})
+
+    assert resp.status_code == 200
+    results = resp.json['responses']
+    assert [item['id'] for item in results] == ['quote', 'echo', 2]
+    assert [item['status'] for item in results] == [200, 200, 200]
+    assert results[0]['body'] == {'path': '/api/v1/quote?symbol=AAPL'}
+    assert results[1]['body'] == {'legs': [1, 2]}
+    assert results[2]['body'] == 'x' * 10
+
+
+def test_sub_requests_run_in_parallel(client, stub_upstream):
+    started = time.perf_counter()
+    resp = client.post('/batch', json={'requests': [
+        {'path': f'/options-builder/api/v1/strategies/slow?n={i}'} for i in range(5)
+    ]})
+    elapsed = time.perf_counter() - started
+
+    assert [item['status'] for item in resp.json['responses']] == [200] * 5
+    # five 0.3s upstream calls, not run one after another
+    assert elapsed < 1.0
+
+
+def test_sub_requests_share_the_caller_headers(client, stub_upstream):
+    client.post('/batch', headers={'Authorization': 'Bearer abc'}, json={'requests': [
+        {'path': '/options-builder/api/v1/quote', 'headers': {'X-Request-Source': 'dashboard'}},
+    ]})
+
+    _, _, headers = stub_upstream.requests_seen[-1]
+    assert headers['Authorization'] == 'Bearer abc'
+    assert headers['X-Request-Source'] == 'dashboard'
+
+
+def test_sub_requests_past_the_deadline_get_504(client, app):
+    resp = client.post('/batch', json={'deadline_ms': 100, 'requests': [
+        {'id': 'fast', 'path': '/options-builder/api/v1/quote'},
+        {'id': 'slow', 'path': '/options-builder/api/v1/strategies/slow'},
+    ]})
+
+    results = {item['id']: item for item in resp.json['responses']}
+    assert results['fast']['status'] == 200
+    assert results['slow']['status'] == 504
+    assert app.extensions['batch_dispatcher'].get_stats()['deadline_exceeded'] == 1
+
+
+def test_sub_requests_count_against_the_client_rate_limit(monkeypatch, upstream_url):
+    monkeypatch.setattr(Config, 'RATE_LIMITS', {'options-builder': {'client': {'rate': 0.1, 'burst': 2}}})
+    client = create_app('development').test_client()
+
+    resp = client.post('/batch', json={'requests': [
+        {'path': f'/options-builder/api/v1/quote?n={i}'} for i in range(3)
+    ]})
+
+    assert resp.status_code == 200
+    assert sorted(item['status'] for item in resp.json['responses']) == [200, 200, 429]
+
+
+def test_invalid_batches_are_rejected(client):
+    assert client.post('/batch', data='not json').status_code == 400
+    assert client.post('/batch', json={'requests': []}).status_code == 400
+    assert client.post('/batch', json={'requests': [{'path': '/batch'}]}).status_code == 400
+    assert client.post('/batch', json={'requests': [{'path': '/api/stats'}]}).status_code == 400
+    assert client.post('/batch', json={'requests': [{'path': '/options-builder'}]}).status_code == 400
+    assert client.post('/batch', json={'requests': [{'method': 'PATCH',
+                                                     'path': '/options-builder/x'}]}).status_code == 400
+    assert client.post('/batch', json={'deadline_ms': -1,
+                                       'requests': [{'path': '/options-builder/x'}]}).status_code == 400
@@ -0,0 +1,128 @@
+import time
+
+from app import create_app
+from config import Config
+from proxy.health import CircuitBreaker
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert 0 < breaker.retry_after() <= 30
+
+
+def test_half_open_allows_one_trial_then_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0)
+    for _ in range(5):
+        breaker.record_failure()
+    breaker.allow_request()
+    breaker.reset_timeout = 30
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_successful_probe_frees_a_stuck_half_open_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow_request()  # a trial that never reports back
+    assert not breaker.allow_request()
+
+    breaker.half_open()
+    assert breaker.allow_request()
+
+
+def test_unexpected_upstream_error_ends_the_trial(monkeypatch, upstream_url):
+    monkeypatch.setitem(Config.SERVICES['options-builder'], 'instances', [upstream_url])
+    app = create_app('development')
+    instance = app.extensions['service_registry'].get('options-builder').instances[0]
+    instance.breaker.failure_threshold = 1
+    instance.breaker.record_failure()  # half open after the zero reset timeout below
+    instance.breaker.reset_timeout = 0
+
+    def broken(*args, **kwargs):
+        raise ValueError("upstream went away mid-response")
+    monkeypatch.setattr(app.extensions['upstream_pool'], 'request', broken)
+
+    app.test_client().get('/options-builder/api/v1/quote')
+    # the failed trial was recorded, re-opening the circuit, rather than left holding the slot
+    assert instance.breaker.state == CircuitBreaker.HALF_OPEN
+    assert instance.breaker.allow_request()
+
+
+def test_proxy_fails_fast_once_the_circuit_is_open(monkeypatch):
+    monkeypatch.setitem(Config.SERVICES['options-builder'], 'instances', ['http://127.0.0.1:1'])
+    monkeypatch.setattr(Config, 'CIRCUIT_BREAKER_FAILURE_THRESHOLD', 2)
+    client = create_app('development').test_client()
+
+    assert client.get('/options-builder/api/v1/quote').status_code == 502
+    assert client.get('/options-builder/api/v1/quote').status_code == 502
+
+    resp = client.get('/options-builder/api/v1/quote')
+    assert resp.status_code == 503
+    assert int(resp.headers['Retry-After']) >= 1
+
+
+def test_traffic_moves_to_healthy_instance(monkeypatch, upstream_url, stub_upstream):
+    monkeypatch.setitem(Config.SERVICES['options-builder'], 'instances', ['http://127.0.0.1:1', upstream_url])
+    monkeypatch.setattr(Config, 'CIRCUIT_BREAKER_FAILURE_THRESHOLD', 1)
+    client = create_app('development').test_client()
+
+    statuses = [client.get('/options-builder/api/v1/quote').status_code for _ in range(6)]
+
+    # only the first request can hit the dead instance before its circuit opens
+    assert statuses.count(502) <= 1
+    assert statuses.count(200) >= 5
+
+
+def test_health_endpoints_aggregate_cached_probe_results(monkeypatch, upstream_url):
+    monkeypatch.setitem(Config.SERVICES, 'mean-reversion', {
+        'description': 'Mean Reversion Service',
+        'instances': ['http://127.0.0.1:1'],
+    })
+    client = create_app('development').test_client()
+
+    resp = client.get('/health')
+    assert resp.status_code == 200
+    assert resp.json['status'] == 'degraded'
+    assert resp.json['services']['options-builder']['status'] == 'healthy'
+    assert resp.json['services']['mean-reversion']['status'] == 'unavailable'
+
+    assert client.get('/mean-reversion/health').status_code == 503
+    assert client.get('/options-builder/health').json['instances'][0]['circuit'] == 'closed'
+
+
+def test_background_prober_serves_cached_state(monkeypatch, upstream_url, stub_upstream):
+    monkeypatch.setattr(Config, 'HEALTH_PROBE_ENABLED', True)
+    monkeypatch.setattr(Config, 'HEALTH_PROBE_INTERVAL', 60)
+    app = create_app('development')
+    prober = app.extensions['health_prober']
+    try:
+        instance = app.extensions['service_registry'].get('options-builder').instances[0]
+        while instance.health['status'] == 'unknown':
+            time.sleep(0.01)
+        probes = len(stub_upstream.requests_seen)
+
+        for _ in range(3):
+            assert app.test_client().get('/options-builder/health').status_code == 200
+        assert len(stub_upstream.requests_seen) == probes
+    finally:
+        prober.stop()
@@ -0,0 +1,77 @@
+import gzip
+import json
+
+import brotli
+
+from app import create_app
+from config import Config
+from proxy.compression import parse_accept_encoding
+
+
+def test_accept_encoding_is_parsed_with_q_values(app):
+    assert parse_accept_encoding('gzip, br;q=0.5, *;q=0') == {'gzip': 1.0, 'br': 0.5, '*': 0.0}
+
+    compressor = app.extensions['compressor']
+    assert compressor.negotiate('gzip, deflate, br') == 'br'
+    assert compressor.negotiate('gzip, br;q=0.5') == 'gzip'
+    assert compressor.negotiate('deflate') is None
+    assert compressor.negotiate(None) is None
+
+
+def test_large_json_is_gzipped_for_clients_that_accept_it(client, stub_upstream):
+    resp = client.get('/options-builder/json?rows=500', headers={'Accept-Encoding': 'gzip'})
+
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    body = gzip.decompress(resp.get_data())
+    assert len(json.loads(body)['rows']) == 500
+    assert len(resp.get_data()) < len(body) / 4
+    # the upstream was asked for the encoding the client accepts and answered uncompressed
+    assert stub_upstream.requests_seen[-1][2]['Accept-Encoding'] == 'gzip'
+
+
+def test_brotli_is_preferred_when_accepted(client):
+    resp = client.get('/options-builder/json?rows=500', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert resp.headers['Content-Encoding'] == 'br'
+    assert len(json.loads(brotli.decompress(resp.get_data()))['rows']) == 500
+
+
+def test_small_and_binary_bodies_are_left_alone(client):
+    small = client.get('/options-builder/json?rows=1', headers={'Accept-Encoding': 'gzip'})
+    binary = client.get('/options-builder/large?size=100000', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in small.headers
+    assert 'Content-Encoding' not in binary.headers
+    assert binary.headers['Content-Length'] == '100000'
+
+
+def test_upstream_compressed_body_is_passed_through(client, app):
+    resp = client.get('/options-builder/gzip', headers={'Accept-Encoding': 'br, gzip'})
+
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(resp.get_data()) == b'{"compressed": true}'
+    assert app.extensions['compressor'].get_stats()['passthrough'] == 1
+
+
+def test_clients_without_accept_encoding_get_identity(client, stub_upstream):
+    resp = client.get('/options-builder/json?rows=500')
+
+    assert 'Content-Encoding' not in resp.headers
+    assert stub_upstream.requests_seen[-1][2]['Accept-Encoding'] == 'identity'
+
+
+def test_cached_responses_are_compressed_with_a_weak_etag(monkeypatch, upstream_url):
+    monkeypatch.setattr(Config, 'COMPRESSION_MIN_SIZE', 0)
+    client = create_app('development').test_client()
+    headers = {'Accept-Encoding': 'gzip'}
+
+    client.get('/options-builder/api/v1/chain', headers=headers)
+    resp = client.get('/options-builder/api/v1/chain', headers=headers)
+    assert resp.headers['X-Cache'] == 'HIT'
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert resp.headers['ETag'] == 'W/"chain-v1"'
+    assert json.loads(gzip.decompress(resp.get_data())) == {'path': '/api/v1/chain'}
+
+    revalidated = client.get('/options-builder/api/v1/chain', headers=dict(headers, **{'If-None-Match': 'W/"chain-v1"'}))
+    assert revalidated.status_code == 304
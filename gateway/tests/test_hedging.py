@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from app import create_app
+from config import Config
+from proxy.hedging import LatencyWindow, RetryBudget
+
+
+@pytest.fixture
+def two_instances(monkeypatch, stub_upstream, second_stub_upstream):
+    urls = [f'http://127.0.0.1:{server.server_port}' for server in (stub_upstream, second_stub_upstream)]
+    monkeypatch.setitem(Config.SERVICES['options-builder'], 'instances', urls)
+    monkeypatch.setattr(Config, 'HEDGE_DEFAULT_DELAY', 0.05)
+    return stub_upstream, second_stub_upstream
+
+
+def test_budget_caps_extra_attempts_at_a_fraction_of_requests():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, max_tokens=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_hedge_delay_follows_observed_latency():
+    window = LatencyWindow()
+    assert window.percentile(95, min_samples=5) is None
+
+    for ms in range(1, 101):
+        window.add(ms / 1000)
+    assert window.percentile(95, min_samples=5) == pytest.approx(0.096)
+
+
+def test_stalled_instance_is_hedged_to_another(two_instances):
+    slow, fast = two_instances
+    slow.delay = 1
+    app = create_app('development')
+    client = app.test_client()
+
+    for _ in range(2):
+        started = time.perf_counter()
+        resp = client.get('/options-builder/api/v1/quote')
+        assert resp.status_code == 200
+        assert resp.json == {'path': '/api/v1/quote'}
+        assert time.perf_counter() - started < 0.5
+        resp.close()
+
+    stats = app.extensions['hedger'].get_stats()['options-builder']
+    assert stats['hedges'] >= 1
+    assert stats['hedge_wins'] >= 1
+    assert all(instance['outstanding'] == 0 or instance['url'].endswith(str(slow.server_port))
+               for instance in app.extensions['service_registry'].get_stats()['options-builder']['instances'])
+
+
+def test_no_hedge_when_the_budget_is_spent(monkeypatch, two_instances):
+    slow, fast = two_instances
+    slow.delay = 0.3
+    fast.delay = 0.3
+    monkeypatch.setattr(Config, 'RETRY_BUDGET_RATIO', 0)
+    monkeypatch.setattr(Config, 'RETRY_BUDGET_MIN_PER_SECOND', 0)
+    app = create_app('development')
+    client = app.test_client()
+    budget = app.extensions['hedger'].budget('options-builder')
+    while budget.withdraw():
+        pass
+
+    assert client.get('/options-builder/api/v1/quote').status_code == 200
+
+    stats = app.extensions['hedger'].get_stats()['options-builder']
+    assert stats['hedges'] == 0
+    assert stats['budget_exhausted'] == 1
+    assert len(slow.requests_seen) + len(fast.requests_seen) == 1
+
+
+def test_connect_failures_are_retried_on_another_instance(monkeypatch, upstream_url):
+    monkeypatch.setitem(Config.SERVICES['options-builder'], 'instances', ['http://127.0.0.1:1', upstream_url])
+    app = create_app('development')
+    client = app.test_client()
+
+    statuses = [client.get('/options-builder/api/v1/quote').status_code for _ in range(4)]
+
+    assert statuses == [200] * 4
+    assert app.extensions['hedger'].get_stats()['options-builder']['retries'] >= 1
+
+
+def test_single_instance_is_never_hedged(app, client, stub_upstream):
+    stub_upstream.delay = 0.2
+
+    assert client.get('/options-builder/api/v1/quote').status_code == 200
+    assert len(stub_upstream.requests_seen) == 1
+    # with nowhere to hedge to, the request is not routed through the hedge executor at all
+    assert app.extensions['hedger'].get_stats().get('options-builder', {}).get('requests', 0) == 0
+
+
+def test_chunked_requests_are_not_hedged(two_instances):
+    app = create_app('development')
+    client = app.test_client()
+
+    client.get('/options-builder/api/v1/quote', headers={'Transfer-Encoding': 'chunked'}, data=b'')
+    assert app.extensions['hedger'].get_stats().get('options-builder', {}).get('requests', 0) == 0
+    client.get('/options-builder/api/v1/quote')
+    assert app.extensions['hedger'].get_stats()['options-builder']['requests'] == 1
+
+
+def test_requests_with_a_body_are_not_hedged(client, app):
+    client.post('/options-builder/api/v1/echo', data=b'{}')
+    assert app.extensions['hedger'].get_stats()['options-builder']['requests'] == 0
@@ -0,0 +1,88 @@
+import re
+
+from app import create_app
+from config import Config
+from proxy.metrics import Histogram
+
+
+def _sample(body, name, **labels):
+    """Value of one exposition sample, matched on its name and a subset of its labels"""
+    for line in body.splitlines():
+        match = re.match(r'^([a-z_]+)(?:\{(.*)\})? (\S+)$', line)
+        if not match or match.group(1) != name:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2) or ''))
+        if all(found.get(key) == value for key, value in labels.items()):
+            return float(match.group(3))
+    return None
+
+
+def test_metrics_endpoint_uses_prometheus_text_format(client):
+    resp = client.get('/metrics')
+
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert '# TYPE gateway_request_duration_seconds histogram' in resp.get_data(as_text=True)
+
+
+def test_proxied_requests_are_counted_per_route_and_instance(client, upstream_url):
+    for _ in range(3):
+        client.get('/options-builder/api/v1/quote')
+    client.post('/options-builder/api/v1/echo', data=b'{}')
+
+    body = client.get('/metrics').get_data(as_text=True)
+    route = '/options-builder/<path:subpath>'
+    assert _sample(body, 'gateway_requests_total', route=route, method='GET', status='200') == 3
+    assert _sample(body, 'gateway_requests_total', route=route, method='POST', status='200') == 1
+    assert _sample(body, 'gateway_request_duration_seconds_count', route=route) == 4
+    assert _sample(body, 'gateway_overhead_seconds_count', route=route) == 4
+    assert _sample(body, 'gateway_upstream_requests_total', service='options-builder',
+                   instance=upstream_url, status='200') == 4
+    assert _sample(body, 'gateway_upstream_duration_seconds_bucket', service='options-builder',
+                   instance=upstream_url, le='+Inf') == 4
+    # one keep-alive connection served every call
+    assert _sample(body, 'gateway_upstream_connect_seconds_count', service='options-builder') == 1
+    assert _sample(body, 'gateway_requests_in_flight', route=route) == 0
+
+
+def test_upstream_errors_are_labelled(client):
+    client.get('/options-builder/api/v1/quote')
+    upstream = client.application.extensions['service_registry'].get('options-builder').instances[0]
+    upstream.url = 'http://127.0.0.1:1'
+
+    assert client.get('/options-builder/api/v1/quote').status_code == 502
+    body = client.get('/metrics').get_data(as_text=True)
+    assert _sample(body, 'gateway_requests_total', status='502') == 1
+    assert _sample(body, 'gateway_upstream_requests_total', instance='http://127.0.0.1:1', status='error') == 1
+
+
+def test_runtime_stats_are_exported_as_gauges_and_counters(client):
+    client.get('/options-builder/api/v1/chain')
+    client.get('/options-builder/api/v1/chain')
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert _sample(body, 'gateway_response_cache_hits_total') == 1
+    assert _sample(body, 'gateway_response_cache_misses_total') == 1
+    assert '# TYPE gateway_response_cache_hits_total counter' in body
+    assert _sample(body, 'gateway_response_cache_entries') == 1
+    assert '# TYPE gateway_response_cache_entries gauge' in body
+    assert _sample(body, 'gateway_upstream_pool_connections_opened_total', service='options-builder') == 1
+    assert _sample(body, 'gateway_instance_circuit_open', service='options-builder') == 0
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe('/x', value=value)
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/x",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/x"} 4' in lines
+
+
+def test_metrics_can_be_turned_off(monkeypatch, upstream_url):
+    monkeypatch.setattr(Config, 'METRICS_ENABLED', False)
+    app = create_app('development')
+    assert app.test_client().get('/metrics').status_code == 404
@@ -0,0 +1,106 @@
+import json
+import time
+
+import pytest
+
+from app import create_app
+from config import Config
+from proxy.push import Subscriber
+
+
+@pytest.fixture
+def fast_polls(monkeypatch):
+    monkeypatch.setitem(Config.PUSH_TOPICS['chain'], 'interval', 0.05)
+    monkeypatch.setattr(Config, 'PUSH_HEARTBEAT_INTERVAL', 0.2)
+
+
+def read_event(stream):
+    """The next non-heartbeat event on an SSE stream, as (id, event, data)"""
+    for chunk in stream:
+        if chunk.startswith((b'retry:', b':')):
+            continue
+        fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+        return fields['id'], fields['event'], json.loads(fields['data'])
+
+
+def chain_polls(server):
+    return [headers for method, path, headers in server.requests_seen if path.startswith('/api/v1/chain')]
+
+
+def test_subscribers_share_one_upstream_poll(app, client, stub_upstream, fast_polls):
+    first = client.get('/subscribe/chain/AAPL', buffered=False)
+    second = client.get('/subscribe/chain/AAPL', buffered=False)
+    assert first.status_code == 200
+    assert first.mimetype == 'text/event-stream'
+
+    first_event = read_event(iter(first.response))
+    second_event = read_event(iter(second.response))
+    assert first_event == second_event
+    assert first_event[1] == 'update'
+    assert first_event[2]['body'] == {'path': '/api/v1/chain?symbol=AAPL'}
+
+    time.sleep(0.3)
+    polls = chain_polls(stub_upstream)
+    # one poller for both subscribers, revalidating with the ETag after the first fetch
+    assert 2 <= len(polls) <= 0.3 / 0.05 + 2
+    assert all(headers.get('If-None-Match') == '"chain-v1"' for headers in polls[1:])
+
+    stats = app.extensions['push_hub'].get_stats()
+    assert stats['subscribers'] == 2
+    assert stats['events'] == 1
+
+    first.close()
+    second.close()
+
+
+def test_poller_stops_when_the_last_subscriber_leaves(app, client, stub_upstream, fast_polls):
+    resp = client.get('/subscribe/chain/MSFT', buffered=False)
+    read_event(iter(resp.response))
+    resp.close()
+
+    stats = app.extensions['push_hub'].get_stats()
+    assert stats['subscribers'] == 0
+    assert stats['topics'] == {}
+    time.sleep(0.1)
+    polls = len(chain_polls(stub_upstream))
+    time.sleep(0.2)
+    assert len(chain_polls(stub_upstream)) == polls
+
+
+def test_late_subscriber_gets_the_current_state(app, client, fast_polls):
+    first = client.get('/subscribe/chain/AAPL', buffered=False)
+    event = read_event(iter(first.response))
+
+    late = client.get('/subscribe/chain/AAPL', buffered=False)
+    assert read_event(iter(late.response)) == event
+
+    first.close()
+    late.close()
+
+
+def test_unknown_topic_is_404(client):
+    resp = client.get('/subscribe/nope/AAPL')
+    assert resp.status_code == 404
+    assert 'chain' in resp.json['available_topics']
+
+
+def test_topics_of_unregistered_services_are_unavailable(client):
+    assert client.get('/subscribe/ledger/krishalgo').status_code == 404
+
+
+def test_subscriber_limit(upstream_url, monkeypatch):
+    monkeypatch.setattr(Config, 'PUSH_MAX_SUBSCRIBERS', 0)
+    resp = create_app('development').test_client().get('/subscribe/chain/AAPL')
+    assert resp.status_code == 503
+    assert 'Retry-After' in resp.headers
+
+
+def test_slow_subscriber_keeps_only_the_latest_events():
+    subscriber = Subscriber(max_pending=2)
+    for event in (b'1', b'2', b'3'):
+        subscriber.offer(event)
+
+    assert subscriber.dropped == 1
+    assert subscriber.next_event(timeout=0) == b'2'
+    assert subscriber.next_event(timeout=0) == b'3'
+    assert subscriber.next_event(timeout=0) is None
@@ -0,0 +1,81 @@
+def upstream_hits(stub_upstream, path):
+    return sum(1 for (_, seen_path, _) in stub_upstream.requests_seen if seen_path == path)
+
+
+def test_repeated_get_is_served_from_cache(app, client, stub_upstream):
+    first = client.get('/options-builder/api/v1/chain?symbol=AAPL')
+    second = client.get('/options-builder/api/v1/chain?symbol=AAPL')
+
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.json == first.json
+    assert upstream_hits(stub_upstream, '/api/v1/chain?symbol=AAPL') == 1
+
+    stats = app.extensions['response_cache'].get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_query_string_is_part_of_the_key(client, stub_upstream):
+    client.get('/options-builder/api/v1/chain?symbol=AAPL')
+    resp = client.get('/options-builder/api/v1/chain?symbol=GOOG')
+
+    assert resp.headers['X-Cache'] == 'MISS'
+    assert resp.json == {'path': '/api/v1/chain?symbol=GOOG'}
+
+
+def test_cookies_are_part_of_the_key(client, stub_upstream):
+    client.set_cookie('session', 'alice')
+    client.get('/options-builder/api/v1/chain?symbol=AAPL')
+    client.set_cookie('session', 'bob')
+    resp = client.get('/options-builder/api/v1/chain?symbol=AAPL')
+
+    assert resp.headers['X-Cache'] == 'MISS'
+    assert upstream_hits(stub_upstream, '/api/v1/chain?symbol=AAPL') == 2
+
+
+def test_routes_without_ttl_are_not_cached(client, stub_upstream):
+    client.get('/options-builder/api/v1/ping')
+    resp = client.get('/options-builder/api/v1/ping')
+
+    assert 'X-Cache' not in resp.headers
+    assert upstream_hits(stub_upstream, '/api/v1/ping') == 2
+
+
+def test_no_store_responses_are_not_cached(app, client, stub_upstream):
+    client.get('/options-builder/api/v1/chain/nostore')
+    client.get('/options-builder/api/v1/chain/nostore')
+
+    assert upstream_hits(stub_upstream, '/api/v1/chain/nostore') == 2
+    assert app.extensions['response_cache'].get_stats()['entries'] == 0
+
+
+def test_stale_entry_is_revalidated_with_etag(app, client, stub_upstream):
+    client.get('/options-builder/api/v1/chain')
+    key = next(iter(app.extensions['response_cache']._entries))
+    app.extensions['response_cache']._entries[key].expires_at = 0
+
+    resp = client.get('/options-builder/api/v1/chain')
+
+    assert resp.headers['X-Cache'] == 'REVALIDATED'
+    assert resp.json == {'path': '/api/v1/chain'}
+    assert stub_upstream.requests_seen[-1][2]['If-None-Match'] == '"chain-v1"'
+
+
+def test_client_conditional_request_gets_304(client):
+    client.get('/options-builder/api/v1/chain')
+    resp = client.get('/options-builder/api/v1/chain', headers={'If-None-Match': '"chain-v1"'})
+
+    assert resp.status_code == 304
+    assert resp.data == b''
+
+
+def test_lru_eviction_respects_max_entries(app, client):
+    app.extensions['response_cache'].max_entries = 2
+    for symbol in ('AAPL', 'GOOG', 'MSFT'):
+        client.get(f'/options-builder/api/v1/chain?symbol={symbol}')
+
+    stats = app.extensions['response_cache'].get_stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    assert client.get('/options-builder/api/v1/chain?symbol=AAPL').headers['X-Cache'] == 'MISS'
@@ -0,0 +1,58 @@
+import pytest
+
+from app import create_app
+from config import Config
+from proxy.registry import Service
+
+
+def test_round_robin_spreads_requests_across_instances(monkeypatch, stub_upstream, second_stub_upstream):
+    urls = [f'http://127.0.0.1:{server.server_port}' for server in (stub_upstream, second_stub_upstream)]
+    monkeypatch.setitem(Config.SERVICES['options-builder'], 'instances', urls)
+    client = create_app('development').test_client()
+
+    for _ in range(4):
+        assert client.get('/options-builder/api/v1/quote').status_code == 200
+
+    assert len(stub_upstream.requests_seen) == 2
+    assert len(second_stub_upstream.requests_seen) == 2
+
+
+def test_least_outstanding_prefers_idle_instance():
+    service = Service('svc', '/svc', 'Service', ['http://a', 'http://b'], balancer='least_outstanding')
+    busy = service.pick()
+    service.acquire(busy)
+
+    for _ in range(3):
+        assert service.pick() is not busy
+
+    service.release(busy)
+    assert {service.pick().url, service.pick().url} == {'http://a', 'http://b'}
+
+
+def test_pick_skips_excluded_instances_when_possible():
+    service = Service('svc', '/svc', 'Service', ['http://a', 'http://b'])
+    first = service.instances[0]
+
+    assert all(service.pick(exclude=[first]) is not first for _ in range(3))
+    assert Service('one', '/one', 'One', ['http://a']).pick(exclude=[first]).url == 'http://a'
+
+
+def test_invalid_service_config_is_rejected():
+    with pytest.raises(ValueError):
+        Service('svc', '/svc', 'Service', [])
+    with pytest.raises(ValueError):
+        Service('svc', '/svc', 'Service', ['http://a'], balancer='random')
+
+
+def test_services_in_config_get_generated_blueprints(monkeypatch, upstream_url, stub_upstream):
+    monkeypatch.setitem(Config.SERVICES, 'mean-reversion', {
+        'prefix': '/mean-reversion',
+        'description': 'Mean Reversion Service',
+        'instances': [upstream_url],
+    })
+    client = create_app('development').test_client()
+
+    assert client.get('/mean-reversion/api/v1/signal').json == {'path': '/api/v1/signal'}
+    assert client.get('/health').json['registered_services'] == ['options-builder', 'mean-reversion']
+    assert client.get('/api/info').json['available_services']['/mean-reversion/*'] == 'Mean Reversion Service'
+    assert client.get('/mean-reversion/health').json['status'] == 'healthy'
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from proxy.singleflight import SingleFlight
+
+
+def fire_concurrently(app, path, count, headers=None):
+    responses = []
+    barrier = threading.Barrier(count)
+
+    def call():
+        client = app.test_client()
+        barrier.wait()
+        responses.append(client.get(path, headers=headers or {}))
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def upstream_hits(stub_upstream, path):
+    return sum(1 for (_, seen_path, _) in stub_upstream.requests_seen if seen_path == path)
+
+
+def test_concurrent_identical_requests_share_one_upstream_call(app, stub_upstream):
+    responses = fire_concurrently(app, '/options-builder/api/v1/strategies/slow', 8)
+
+    assert [r.status_code for r in responses] == [200] * 8
+    assert all(r.json == {'path': '/api/v1/strategies/slow'} for r in responses)
+    assert upstream_hits(stub_upstream, '/api/v1/strategies/slow') == 1
+
+    stats = app.extensions['single_flight'].get_stats()
+    assert stats['leaders'] == 1
+    assert stats['collapsed'] == 7
+    assert stats['in_flight'] == 0
+
+
+def test_different_queries_are_not_collapsed(app, stub_upstream):
+    client = app.test_client()
+    client.get('/options-builder/api/v1/strategies/slow?a=1')
+    client.get('/options-builder/api/v1/strategies/slow?a=2')
+
+    assert app.extensions['single_flight'].get_stats()['collapsed'] == 0
+    assert len(stub_upstream.requests_seen) == 2
+
+
+def test_errors_fan_out_to_all_waiters(app):
+    flight = SingleFlight(app)
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing_call():
+        started.set()
+        release.wait()
+        raise ConnectionError('upstream down')
+
+    def run(fn):
+        try:
+            flight.do('key', fn)
+        except ConnectionError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run, args=(failing_call,))
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=run, args=(lambda: pytest.fail('follower must not call upstream'),))
+    follower.start()
+    while flight.get_stats()['collapsed'] == 0:
+        time.sleep(0.01)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert len(errors) == 2
+    assert flight.get_stats()['errors'] == 1
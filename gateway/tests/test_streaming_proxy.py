@@ -0,0 +1,68 @@
+import gzip
+import io
+
+
+def test_compressed_body_is_forwarded_untouched(client):
+    resp = client.get('/options-builder/gzip')
+
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(resp.data) == b'{"compressed": true}'
+
+
+def test_large_body_is_streamed_with_upstream_length(client):
+    resp = client.get('/options-builder/large?size=1000000', buffered=False)
+
+    assert resp.is_streamed
+    assert resp.headers['Content-Length'] == '1000000'
+    assert len(resp.get_data()) == 1000000
+
+
+def test_streamed_responses_return_connections_to_the_pool(app, client):
+    for _ in range(3):
+        client.get('/options-builder/large?size=200000').get_data()
+
+    assert app.extensions['upstream_pool'].get_stats()['options-builder']['connections_opened'] == 1
+
+
+def test_request_body_is_streamed_upstream_with_length(client, stub_upstream):
+    resp = client.post('/options-builder/echo', data=b'a' * 5000, content_type='application/octet-stream')
+
+    assert resp.data == b'a' * 5000
+    method, path, headers = stub_upstream.requests_seen[-1]
+    assert headers['Content-Length'] == '5000'
+    assert 'Transfer-Encoding' not in headers
+
+
+def test_chunked_request_body_is_streamed_upstream_chunked(client, stub_upstream):
+    resp = client.post('/options-builder/echo', input_stream=io.BytesIO(b'c' * 3000),
+                       headers={'Transfer-Encoding': 'chunked', 'Content-Type': 'application/octet-stream'},
+                       environ_overrides={'wsgi.input_terminated': True, 'CONTENT_LENGTH': ''})
+
+    assert resp.data == b'c' * 3000
+    method, path, headers = stub_upstream.requests_seen[-1]
+    assert headers['Transfer-Encoding'] == 'chunked'
+
+
+def test_bodiless_request_is_sent_without_a_body_when_input_is_terminated(client, stub_upstream):
+    # gunicorn marks every request's input as terminated, bodies or not
+    client.get('/options-builder/api/v1/ping', environ_overrides={'wsgi.input_terminated': True})
+
+    method, path, headers = stub_upstream.requests_seen[-1]
+    assert 'Transfer-Encoding' not in headers
+    assert 'Content-Length' not in headers
+
+
+def test_json_passthrough_keeps_upstream_bytes(client):
+    resp = client.get('/options-builder/api/v1/ping')
+
+    assert resp.data == b'{"message": "pong"}'
+    assert resp.json == {'message': 'pong'}
+
+
+def test_buffered_mode_still_available(app, client):
+    app.config['PROXY_STREAM_RESPONSES'] = False
+    resp = client.get('/options-builder/api/v1/ping')
+
+    # the buffered path re-encodes JSON through jsonify
+    assert resp.data != b'{"message": "pong"}'
+    assert resp.json == {'message': 'pong'}
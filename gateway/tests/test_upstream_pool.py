@@ -0,0 +1,54 @@
+from proxy.pool import forwardable_headers
+
+
+def test_proxied_requests_reuse_one_connection(app, client):
+    for _ in range(5):
+        resp = client.get('/options-builder/api/v1/quote')
+        assert resp.status_code == 200
+
+    stats = app.extensions['upstream_pool'].get_stats()['options-builder']
+    assert stats['requests'] == 5
+    assert stats['in_flight'] == 0
+    assert stats['connections_opened'] == 1
+    assert stats['idle_connections'] == 1
+
+
+def test_health_check_shares_the_service_pool(app, client):
+    client.get('/options-builder/health')
+    client.get('/options-builder/api/v1/ping')
+
+    stats = app.extensions['upstream_pool'].get_stats()['options-builder']
+    assert stats['requests'] == 2
+    assert stats['connections_opened'] == 1
+
+
+def test_connections_opened_keeps_counting_when_host_pools_are_evicted(app, stub_upstream, second_stub_upstream):
+    pool = app.extensions['upstream_pool']
+    pool.pool_connections = 1  # one host pool per service: each switch of host evicts the other
+    urls = [f'http://127.0.0.1:{server.server_port}/api/v1/ping' for server in (stub_upstream, second_stub_upstream)]
+
+    for url in urls + urls[:1]:
+        pool.request('options-builder', 'GET', url).close()
+
+    assert pool.get_stats()['options-builder']['connections_opened'] == 3
+
+
+def test_upstream_cookies_are_not_shared_between_clients(app, client):
+    resp = client.get('/options-builder/set-cookie')
+
+    # the client still sees the cookie, but the shared session must not keep it
+    assert 'session=secret' in resp.headers.get('Set-Cookie')
+    assert len(app.extensions['upstream_pool'].session('options-builder').cookies) == 0
+
+
+def test_hop_by_hop_headers_are_not_forwarded():
+    headers = [('Host', 'gateway'), ('Connection', 'close'), ('Accept', 'application/json')]
+    assert forwardable_headers(headers) == {'Accept': 'application/json'}
+
+
+def test_stats_endpoint_reports_pool_usage(client):
+    client.get('/options-builder/api/v1/ping')
+    resp = client.get('/api/stats')
+
+    assert resp.status_code == 200
+    assert resp.json['upstream_pools']['options-builder']['requests'] == 1
@@ -1,14 +1,42 @@
+import json
 import os
-from flask import Flask, jsonify, request
+import click
+from flask import Flask, Response, jsonify, request, stream_with_context
 from sqlalchemy import select, insert, delete
-from db_config import get_db_connection, ledger
-from docker_utils import build_docker_image, run_docker_container, stop_docker_container
+from book import apply_entries, apply_trades, get_holdings, rebuild_snapshot
+from db_config import get_db_connection, ledger, trades
+from read_cache import LedgerReadCache
+from model_pool import ModelPool
+from scheduler import LedgerStore, TickScheduler
+from trade_history import stream_trades, trades_page
+from worth import RESOLUTIONS, downsample_worth, parse_timestamp, pick_resolution, worth_series
+from valuation import JsonFilePriceSource, Valuation, YFinancePriceSource
+from builds import BuildQueue
+from docker_utils import ensure_image, export_image, image_exists, image_tag, remove_model_container, run_model_tick
 
-ORDERBOOKS_TABLE_NAME = 'order_books_v2'
+VIEW_TRADES_LIMIT = 100  # most recent trades returned by view_ledger by default
+VIEW_TRADES_MAX_LIMIT = 1000  # most recent trades view_ledger returns at most
+BULK_TRADES_LIMIT = 10000  # trades accepted by one bulk_trades request
+TRADES_PAGE_LIMIT = 1000  # most trades returned by one /trades page
 
 
 app = Flask(__name__)
 
+# view_ledger responses, dropped whenever this process writes to a ledger; the TTL bounds how
+# stale a read can be after a write from another process (the scheduler applies trades in its
+# own), so keep it well below the shortest update_time
+read_cache = LedgerReadCache(ttl=float(os.getenv('LEDGER_READ_CACHE_TTL', 5)),
+                             max_entries=int(os.getenv('LEDGER_READ_CACHE_SIZE', 1024)))
+
+# algorithm images are built on background workers; see /build_status
+build_queue = BuildQueue(ensure_image, export_image, max_workers=int(os.getenv('LEDGER_BUILD_WORKERS', 2)))
+
+
+@app.route('/ping', methods=['GET'])
+def ping():
+    return jsonify({"message": "Ledger service is alive!"})
+
+
 """
 This endpoint creates a ledger instance. It expects the following arguments:
     - name: unique name of algorithm
@@ -16,7 +44,10 @@ This endpoint creates a ledger instance. It expects the following arguments:
     - algo_path: path to algorithm from the projects directory (ex. harv-extension')
     - updatetime: time interval for updates (minutes)
     - end: lifespan of instance (days)
-It creates an entry in the database for the ledger, as well as generates a Docker image, saved as a tar file in [TODO: directory]
+    - export (optional): true to also save the image as a tar in docker_images/
+It creates an entry in the database for the ledger, tied to a Docker image tagged with a hash of
+the algorithm's code. If that image does not exist yet it is built in the background: the
+response is then 202 with a build job to poll at /build_status.
 """
 
 
@@ -27,26 +58,17 @@ def create_ledger():
     algo_path = request.args.get('algo_path')
     update_time = request.args.get('updatetime', type=int)
     end_duration = request.args.get('end', type=int)
+    export = request.args.get('export', 'false').lower() == 'true'
 
     # input validation
     if not name or not algo_path or not update_time or not end_duration:
         return jsonify({"error": "Missing required parameters"}), 400
 
     try:
-        # paths to pull algorithm and store image
+        # path to pull the algorithm from, and the image its current code maps to
         path_to_algo = f"../{algo_path}"
-        path_to_image = f"docker_images/{name}.tar"
-
-        # check if image with this name already exists. If not, build it from the path_to_algo.
-        if not os.path.exists(path_to_image):
-            # build docker image
-            image = build_docker_image(name, path_to_algo)
-
-            # save image as .tar to path_to_image
-            with open(path_to_image, 'wb') as image_tar:
-                for chunk in image.save():
-                    image_tar.write(chunk)
-            print(f"Saved Docker image for '{name}' to {path_to_image}")
+        image = image_tag(path_to_algo)
+        path_to_image = f"docker_images/{image.split(':')[1]}.tar"
 
         # save the ledger in the database
         with get_db_connection() as conn:
@@ -54,50 +76,302 @@ def create_ledger():
                 name=name,
                 tickers_to_track=tickers_to_track,
                 algo_link=algo_path,
+                image=image,
                 update_time=update_time,
                 end_duration=end_duration
             )
             conn.execute(stmt)
             conn.commit()
 
-        return jsonify({'info': f"Ledger '{name}' has been created."}), 201
+        # identical code reuses its image; otherwise build (and export) it in the background
+        if image_exists(image) and (not export or os.path.exists(path_to_image)):
+            return jsonify({'info': f"Ledger '{name}' has been created.", 'image': image}), 201
+
+        job = build_queue.submit(image, path_to_algo, export_to=path_to_image if export else None)
+        return jsonify({
+            'info': f"Ledger '{name}' has been created; its image is being built.",
+            'image': image,
+            'build': {'id': job['id'], 'status': job['status'], 'status_url': f"/build_status?id={job['id']}"},
+        }), 202
 
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(e)
         return jsonify({"error": str(e)}), 500
 
 
+"""
+This endpoint reports the status of an image build started by create_ledger.
+Expects: id of the build job.
+Returns: the job, with status queued, building, exporting, done or failed (and its error).
+"""
+
+
+@app.route('/build_status', methods=['GET'])
+def build_status():
+    job = build_queue.get(request.args.get('id'))
+    if job is None:
+        return {"error": "Build job not found"}, 404
+    return jsonify(job)
+
+
 """
 This endpoint allows you to view a ledger.
 Expects: name of algorithm.
-Returns: a json containing the trades, worth, and balance of the ledger.
+Optional: since / until (ISO timestamps, UTC unless they carry an offset), to limit the trades and
+worth history to a time range; ticker, to filter the trades; limit (default 100, at most 1000), the
+number of most recent matching trades returned; and resolution (minute, hour or day), one worth point per
+minute/hour/day. By default the resolution is the finest one still stored for the requested range.
+Returns: a json containing the trades, holding, worth, and balance of the ledger. Holding and
+balance come from the ledger's snapshot, so this costs the same however many trades it has.
 """
 
 
+def trade_to_dict(row):
+    return {
+        "type": row.type,
+        "ticker": row.ticker,
+        "price": float(row.price),
+        "quantity": float(row.quantity),
+        "ts": row.ts.isoformat(),
+    }
+
+
+def time_range():
+    """The since / until query arguments as naive UTC datetimes; raises ValueError when malformed"""
+    return parse_timestamp(request.args.get('since')), parse_timestamp(request.args.get('until'))
+
+
 @app.route("/view_ledger", methods=["GET"])
 def view_ledger():
     name = request.args.get('name')
+    ticker = request.args.get('ticker')
+    limit = request.args.get('limit', VIEW_TRADES_LIMIT, type=int)
+    resolution = request.args.get('resolution')
+
+    # input validation
+    if not 1 <= limit <= VIEW_TRADES_MAX_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {VIEW_TRADES_MAX_LIMIT}"}), 400
+    if resolution is not None and resolution not in RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+    try:
+        since, until = time_range()
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO timestamps"}), 400
+    resolution = resolution or pick_resolution(since)
+
+    # served from the read cache while the ledger has not changed
+    view = read_cache.get_or_load(name, (since, until, ticker, limit, resolution),
+                                  lambda: load_ledger_view(name, since, until, ticker, limit, resolution))
+    if view is None:
+        return {"error": "Ledger not found"}, 404
+    return jsonify(view)
+
+
+def recent_trades_query(name, since, until, ticker, limit):
+    """The ledger's `limit` most recent matching trades, newest first"""
+    # served by the (name, ts, id) and (name, ticker, ts, id) indexes
+    stmt = (select(trades).where(trades.c.name == name)
+            .order_by(trades.c.ts.desc(), trades.c.id.desc()).limit(limit))
+    if since:
+        stmt = stmt.where(trades.c.ts >= since)
+    if until:
+        stmt = stmt.where(trades.c.ts < until)
+    if ticker:
+        stmt = stmt.where(trades.c.ticker == ticker)
+    return stmt
 
-    # retrieve ledger from database
+
+def load_ledger_view(name, since, until, ticker, limit, resolution):
+    """view_ledger's response, read from the database; None when the ledger does not exist"""
     with get_db_connection() as conn:
-        stmt = select(ledger.c.trades, ledger.c.worth,
-                      ledger.c.balance).where(ledger.c.name == name)
+        stmt = select(ledger.c.balance).where(ledger.c.name == name)
         result = conn.execute(stmt).fetchone()
+        if not result:
+            return None
 
-    # return result if not empty, 404 otherwise
-    if result:
-        return jsonify({
-            "trades": result.trades,
-            "worth": result.worth,
-            "balance": result.balance,
-        })
-    return {"error": "Ledger not found"}, 404
+        holding = get_holdings(conn, name)
+
+        trade_rows = conn.execute(recent_trades_query(name, since, until, ticker, limit)).fetchall()
+
+        worth = worth_series(conn, name, resolution, since, until)
+
+    return {
+        "trades": [trade_to_dict(row) for row in reversed(trade_rows)],
+        "holding": {ticker: float(quantity) for ticker, quantity in holding.items()},
+        "worth": [{"ts": ts.isoformat(), "worth": value} for ts, value in worth],
+        "resolution": resolution,
+        "balance": float(result.balance),
+    }
+
+
+"""
+This endpoint pages through a ledger's trade history, oldest first.
+Expects: name of algorithm.
+Optional: since / until (ISO timestamps) and ticker, to filter the trades; limit (default 100,
+at most 1000), the page size; and cursor, the next_cursor of the previous page.
+Returns: {"trades": [...], "next_cursor": ...}; next_cursor is null on the last page. Pages are
+keyed on the last trade's (ts, id) rather than an offset, so every page costs the same.
+"""
+
+
+@app.route("/trades", methods=["GET"])
+def list_trades():
+    name = request.args.get('name')
+    limit = request.args.get('limit', VIEW_TRADES_LIMIT, type=int)
+
+    # input validation
+    if not 1 <= limit <= TRADES_PAGE_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {TRADES_PAGE_LIMIT}"}), 400
+    try:
+        since, until = time_range()
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO timestamps"}), 400
+
+    with get_db_connection() as conn:
+        if conn.execute(select(ledger.c.name).where(ledger.c.name == name)).first() is None:
+            return {"error": "Ledger not found"}, 404
+        try:
+            rows, next_cursor = trades_page(conn, name, limit, request.args.get('cursor'),
+                                            since, until, request.args.get('ticker'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    return jsonify({"trades": [trade_to_dict(row) for row in rows], "next_cursor": next_cursor})
+
+
+"""
+This endpoint exports a ledger's whole trade history as NDJSON, one trade per line, oldest first.
+Expects: name of algorithm.
+Optional: since / until (ISO timestamps) and ticker, to filter the trades.
+Trades are streamed from a server-side database cursor as they are read, so exports of any
+size use constant memory; read the response line by line (e.g. requests' iter_lines).
+"""
+
+
+@app.route("/export_trades", methods=["GET"])
+def export_trades():
+    name = request.args.get('name')
+    ticker = request.args.get('ticker')
+
+    # input validation
+    try:
+        since, until = time_range()
+    except ValueError:
+        return jsonify({"error": "since and until must be ISO timestamps"}), 400
+
+    with get_db_connection() as conn:
+        if conn.execute(select(ledger.c.name).where(ledger.c.name == name)).first() is None:
+            return {"error": "Ledger not found"}, 404
+
+    def generate():
+        with get_db_connection() as conn:
+            for row in stream_trades(conn, name, since, until, ticker):
+                yield json.dumps(trade_to_dict(row)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+"""
+This endpoint applies trades to a ledger.
+Expects: name of algorithm (query argument), and a json body in the Basic Model Output format:
+    {"trades": [{"type": "buy", "ticker": "AAPL", "price": 176, "quantity": 8}, ...]}
+Trades are applied in order, atomically: a buy needs enough balance and a sell enough holding
+(counting the trades before it). Trades that would violate the ledger are rejected and the rest
+are applied.
+Returns: a result per trade ({"status": "applied"} or {"status": "rejected", "error": ...}),
+and the ledger's balance and holding afterwards.
+"""
+
+
+@app.route("/trade", methods=["POST"])
+def trade():
+    name = request.args.get('name')
+    payload = request.get_json(silent=True)
+
+    # input validation
+    if not name or not isinstance(payload, dict) or not isinstance(payload.get('trades'), list):
+        return jsonify({"error": "Expected a name and a json body with a list of trades"}), 400
+
+    with get_db_connection() as conn:
+        applied = apply_trades(conn, name, payload['trades'])
+        if applied is None:
+            return {"error": "Ledger not found"}, 404
+        conn.commit()
+    read_cache.invalidate(name)
+
+    results, balance, holding = applied
+    return jsonify({
+        "results": results,
+        "balance": float(balance),
+        "holding": {ticker: float(quantity) for ticker, quantity in holding.items()},
+    })
+
+
+"""
+This endpoint applies trades for one or more ledgers in one transaction.
+Expects: either a json array of trades, or NDJSON (Content-Type: application/x-ndjson, one trade
+per line). Each trade names its ledger and may carry an idempotency key:
+    {"name": "krishalgo", "type": "buy", "ticker": "AAPL", "price": 176, "quantity": 8, "idempotency_key": "tick-42-0"}
+Trades are validated as in /trade and written with multi-row statements. A trade whose
+idempotency key was already recorded for its ledger is reported as a duplicate and not
+applied again, so a failed request can be retried as is.
+Returns: a result per trade, in order, and the balance and holding of every ledger involved.
+"""
+
+
+def read_bulk_trades():
+    """(name, trade) pairs from the request body, or None when it is not an array / NDJSON"""
+    if request.mimetype == 'application/x-ndjson':
+        entries = []
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                trade = json.loads(line)
+            except ValueError:
+                trade = None
+            entries.append(trade)
+    else:
+        entries = request.get_json(silent=True)
+        if not isinstance(entries, list):
+            return None
+    return [(trade.get('name') if isinstance(trade, dict) else None, trade) for trade in entries]
+
+
+@app.route("/bulk_trades", methods=["POST"])
+def bulk_trades():
+    entries = read_bulk_trades()
+
+    # input validation
+    if entries is None:
+        return jsonify({"error": "Expected a json array or NDJSON stream of trades"}), 400
+    if len(entries) > BULK_TRADES_LIMIT:
+        return jsonify({"error": f"At most {BULK_TRADES_LIMIT} trades per request"}), 413
+
+    with get_db_connection() as conn:
+        results, books = apply_entries(conn, entries)
+        conn.commit()
+    for name in books:
+        read_cache.invalidate(name)
+
+    return jsonify({
+        "results": results,
+        "ledgers": {
+            name: {
+                "balance": float(balance),
+                "holding": {ticker: float(quantity) for ticker, quantity in holding.items()},
+            } for name, (balance, holding) in books.items()
+        },
+    })
 
 
 """
 This endpoint deletes a ledger instance.
 Expects: name of algorithm.
-This function deletes the ledger instance from the database. The image persists in the docker_images folder.
+This function deletes the ledger instance from the database, and removes its model's container.
+The image persists in the docker_images folder.
 """
 
 
@@ -110,9 +384,6 @@ def delete_ledger():
         stmt = select(ledger.c.name).where(ledger.c.name == name)
         result = conn.execute(stmt).fetchone()
 
-        print(result)
-        print(f"DELETE FROM {ORDERBOOKS_TABLE_NAME} WHERE name = '{name}';")
-
         if not result:
             return {"Error": f"You are trying to delete a ledger called '{name}' that does not exist."}, 404
 
@@ -120,9 +391,146 @@ def delete_ledger():
         stmt = delete(ledger).where(ledger.c.name == name)
         conn.execute(stmt)
         conn.commit()
+    read_cache.invalidate(name)
+    app.logger.info("Deleted ledger '%s'", name)
+
+    # a ledger re-created under this name must not reuse the old model's container
+    try:
+        remove_model_container(name)
+    except Exception as e:
+        app.logger.warning("Could not remove the container of ledger '%s': %s", name, e)
 
     return {'Info': f"Deleted ledger named '{name}'"}
 
 
+"""
+Recomputes ledgers' holdings and balance from their trade history, to verify (or repair) the
+snapshots view_ledger reads. Rebuilds every ledger unless names are given; with --check, only
+reports the differences.
+    flask --app app rebuild-snapshots [--check] [name ...]
+"""
+
+
+@app.cli.command('rebuild-snapshots')
+@click.argument('names', nargs=-1)
+@click.option('--check', is_flag=True, help="Report differences without fixing them.")
+def rebuild_snapshots(names, check):
+    with get_db_connection() as conn:
+        if not names:
+            names = conn.execute(select(ledger.c.name).order_by(ledger.c.name)).scalars().all()
+
+        for name in names:
+            differences = rebuild_snapshot(conn, name)
+            if check or differences is None:
+                conn.rollback()
+            else:
+                conn.commit()
+
+            if differences is None:
+                print(f"{name}: no such ledger")
+                continue
+            if not differences:
+                print(f"{name}: ok")
+            for field, (snapshot, replayed) in differences.items():
+                print(f"{name}: {field} was {snapshot}, trades give {replayed}"
+                      + ("" if check else " (fixed)"))
+
+
+"""
+Rolls worth points past their retention up to hourly and daily points (this also runs
+automatically as worth is recorded). Run it from cron to keep the table compact for
+ledgers that stopped recording.
+    flask --app app downsample-worth
+"""
+
+
+@app.cli.command('downsample-worth')
+def downsample_worth_command():
+    with get_db_connection() as conn:
+        removed = downsample_worth(conn)
+        conn.commit()
+    print(f"Rolled up {removed} worth points")
+
+
+def price_source(prices):
+    """The price source given by --prices: 'yfinance', or the path of a {ticker: price} JSON file"""
+    return YFinancePriceSource() if prices == 'yfinance' else JsonFilePriceSource(prices)
+
+
+"""
+Marks every ledger (or the given ones) to market and records its worth: each distinct ticker
+held is priced once, from Yahoo Finance or from a local {ticker: price} JSON file.
+    flask --app app value-ledgers [--prices yfinance|prices.json] [name ...]
+"""
+
+
+@app.cli.command('value-ledgers')
+@click.argument('names', nargs=-1)
+@click.option('--prices', default=os.getenv('LEDGER_PRICES', 'yfinance'), show_default=True,
+              help="'yfinance', or a JSON file of {ticker: price}.")
+def value_ledgers(names, prices):
+    valuation = Valuation(price_source(prices))
+    with get_db_connection() as conn:
+        worths, unpriced = valuation.value(conn, list(names) or None)
+        conn.commit()
+    for name, worth in sorted(worths.items()):
+        print(f"{name}: {worth}")
+    for name in sorted(unpriced):
+        print(f"{name}: not valued, a ticker it holds has no price")
+
+
+"""
+Runs the tick scheduler in the foreground: every active ledger's model is called each
+update_time minutes and its trades applied, until the ledger's end_duration is over. Stats
+(including how late ticks start) are printed whenever the ledger list is refreshed.
+Models run in their Docker containers (--backend docker), or are imported once into a pool
+of warm worker processes (--backend process), which makes ticks much cheaper.
+After each tick the group's ledgers are marked to market with prices from --prices (use
+--prices none to skip this).
+    flask --app app run-scheduler [--workers 16] [--backend process --processes 4] [--prices yfinance]
+"""
+
+
+@app.cli.command('run-scheduler')
+@click.option('--workers', default=16, show_default=True, help="Models run at the same time.")
+@click.option('--refresh', default=60, show_default=True, help="Seconds between re-reading the ledgers.")
+@click.option('--backend', type=click.Choice(['docker', 'process']),
+              default=os.getenv('LEDGER_MODEL_BACKEND', 'docker'), show_default=True)
+@click.option('--processes', default=4, show_default=True, help="Worker processes of the process backend.")
+@click.option('--memory-limit', default=1024, show_default=True, help="MB per worker process.")
+@click.option('--tick-timeout', default=30, show_default=True, help="Seconds a model may take per tick.")
+@click.option('--prices', default=os.getenv('LEDGER_PRICES', 'yfinance'), show_default=True,
+              help="'yfinance', a JSON file of {ticker: price}, or 'none' to not record worth.")
+def run_scheduler(workers, refresh, backend, processes, memory_limit, tick_timeout, prices):
+    model_pool = None
+    run_model = run_model_tick
+    if backend == 'process':
+        model_pool = ModelPool(processes, memory_limit_mb=memory_limit, tick_timeout=tick_timeout)
+        run_model = lambda name, model, book_status: model_pool.run(name, f"../{model['algo_link']}", book_status)
+
+    after_tick = None
+    if prices != 'none':
+        valuation = Valuation(price_source(prices))
+
+        def after_tick(names):
+            with get_db_connection() as conn:
+                worths, unpriced = valuation.value(conn, names)
+                conn.commit()
+            if unpriced:
+                print(f"Not valued for lack of prices: {sorted(unpriced)}")
+
+    scheduler = TickScheduler(LedgerStore(), run_model, max_workers=workers, refresh_interval=refresh,
+                              after_tick=after_tick)
+    try:
+        scheduler.run_forever(on_refresh=lambda s: print(
+            f"Scheduler: {s.get_stats()}" + (f", model pool: {model_pool.get_stats()}" if model_pool else "")))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.close()
+        if model_pool:
+            model_pool.close()
+
+
 if __name__ == "__main__":
     app.run()
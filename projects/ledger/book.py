@@ -0,0 +1,241 @@
+"""
+Trade bookkeeping for ledgers: every trade is appended to the trades table and applied to
+the ledger's materialized holdings and balance in the same transaction, so reading a
+ledger's state never needs its trade history.
+"""
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import and_, bindparam, case, delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db_config import holdings, ledger, trades
+
+
+TRADE_TYPES = ('buy', 'sell')
+
+
+def signed_quantity(trade):
+    return trade['quantity'] if trade['type'] == 'buy' else -trade['quantity']
+
+
+def parse_trade(trade):
+    """
+    A trade from a model ({"type", "ticker", "price", "quantity"}, optionally an
+    "idempotency_key") with Decimal amounts. Raises ValueError when it is malformed.
+    """
+    if not isinstance(trade, dict):
+        raise ValueError("trade must be an object")
+    if trade.get('type') not in TRADE_TYPES:
+        raise ValueError(f"type must be one of {', '.join(TRADE_TYPES)}")
+    if not isinstance(trade.get('ticker'), str) or not trade['ticker']:
+        raise ValueError("ticker is required")
+    parsed = {'type': trade['type'], 'ticker': trade['ticker'], 'idempotency_key': trade.get('idempotency_key')}
+    if parsed['idempotency_key'] is not None and not isinstance(parsed['idempotency_key'], str):
+        raise ValueError("idempotency_key must be a string")
+    for field in ('price', 'quantity'):
+        try:
+            parsed[field] = Decimal(str(trade[field]))
+        except (KeyError, InvalidOperation):
+            raise ValueError(f"{field} must be a number")
+        if not parsed[field].is_finite() or parsed[field] <= 0:
+            raise ValueError(f"{field} must be positive")
+    return parsed
+
+
+def apply_trades(conn, name, new_trades):
+    """
+    Validate and apply a batch of trades to one ledger, in order, on the caller's transaction.
+    Returns None when the ledger does not exist, otherwise (results, balance, holding); see
+    apply_entries.
+    """
+    results, books = apply_entries(conn, [(name, trade) for trade in new_trades], ledgers=[name])
+    if name not in books:
+        return None
+    balance, holding = books[name]
+    return results, balance, holding
+
+
+def apply_entries(conn, entries, ledgers=()):
+    """
+    Validate and apply trades for any number of ledgers, in order, on the caller's transaction.
+    entries: a list of (ledger name, trade) pairs; ledgers: extra names to lock and report
+    even when none of their trades are valid.
+
+    The ledger rows are locked (SELECT ... FOR UPDATE, in name order) together with their
+    positions in the traded tickers in one query, so concurrent batches for the same ledger
+    queue up while other ledgers trade freely. Every trade is then checked against its
+    ledger's running balance and positions in memory: a buy needs the cash, a sell needs the
+    shares. Rejected trades are skipped, and the accepted ones are written with one multi-row
+    insert into trades, one multi-row upsert into holdings and one batched balance update,
+    however many trades and ledgers there are.
+
+    A trade whose idempotency_key was already recorded for its ledger (by an earlier request,
+    or earlier in this batch) is not applied again, so a client can safely retry a batch.
+
+    Returns (results, books): results has one {"status": "applied"}, {"status": "duplicate"}
+    or {"status": "rejected", "error": ...} per entry, and books maps every existing ledger
+    involved to its (balance, holding) afterwards. The caller commits.
+    """
+    parsed = []
+    for name, trade in entries:
+        try:
+            parsed.append((name, parse_trade(trade)))
+        except ValueError as e:
+            parsed.append((name, e))
+    valid = [(name, trade) for name, trade in parsed if isinstance(name, str) and isinstance(trade, dict)]
+    names = sorted({name for name, trade in parsed if isinstance(name, str)} | set(ledgers))
+    pairs = sorted({(name, trade['ticker']) for name, trade in valid})
+    keys = sorted({(name, trade['idempotency_key']) for name, trade in valid if trade['idempotency_key']})
+
+    balances = {}
+    positions = {}
+    for row in conn.execute(lock_books_query(names, pairs)):
+        balances[row.name] = row.balance
+        if row.ticker is not None:
+            positions[(row.name, row.ticker)] = row.quantity
+
+    # read under the ledger locks, so a concurrent retry cannot record the same key twice
+    seen_keys = set()
+    if keys:
+        stmt = select(trades.c.name, trades.c.idempotency_key).where(
+            tuple_(trades.c.name, trades.c.idempotency_key).in_(keys))
+        seen_keys = {(row.name, row.idempotency_key) for row in conn.execute(stmt)}
+
+    results, applied, changes = check_trades(parsed, balances, positions, seen_keys)
+
+    if applied:
+        conn.execute(insert(trades), applied)
+        conn.execute(holdings_upsert(changes))
+        conn.execute(update(ledger).where(ledger.c.name == bindparam('ledger_name'))
+                     .values(balance=bindparam('new_balance')),
+                     [{'ledger_name': name, 'new_balance': balances[name]}
+                      for name in sorted({trade['name'] for trade in applied})])
+
+    books = {name: (balance, {ticker: quantity for (owner, ticker), quantity in positions.items()
+                              if owner == name and quantity != 0})
+             for name, balance in balances.items()}
+    return results, books
+
+
+def lock_books_query(names, pairs):
+    """
+    The ledger rows of names, locked in name order, each joined to its current position in
+    the (name, ticker) pairs it trades (one row per position, a NULL ticker when it has none)
+    """
+    return (select(ledger.c.name, ledger.c.balance, holdings.c.ticker, holdings.c.quantity)
+            .select_from(ledger.outerjoin(holdings, and_(holdings.c.name == ledger.c.name,
+                                                         tuple_(holdings.c.name, holdings.c.ticker).in_(pairs))))
+            .where(ledger.c.name.in_(names))
+            .order_by(ledger.c.name)
+            .with_for_update(of=ledger))
+
+
+def check_trades(parsed, balances, positions, seen_keys):
+    """
+    The in-memory pass of apply_entries: check each (name, parsed trade or ValueError) in
+    order against its ledger's running balance and positions, updating balances
+    ({name: balance}), positions ({(name, ticker): quantity}) and seen_keys ({(name, key)})
+    as trades are accepted. Returns (results, applied trades, {(name, ticker): quantity change}).
+    """
+    results = []
+    applied = []
+    changes = {}
+    for name, trade in parsed:
+        if isinstance(trade, ValueError):
+            results.append({"status": "rejected", "error": str(trade)})
+            continue
+        if not isinstance(name, str):
+            results.append({"status": "rejected", "error": "name is required"})
+            continue
+        if name not in balances:
+            results.append({"status": "rejected", "error": f"ledger '{name}' not found"})
+            continue
+        key = (name, trade['idempotency_key'])
+        if trade['idempotency_key'] and key in seen_keys:
+            results.append({"status": "duplicate"})
+            continue
+        cost = trade['price'] * trade['quantity']
+        held = positions.get((name, trade['ticker']), 0)
+        if trade['type'] == 'buy' and cost > balances[name]:
+            results.append({"status": "rejected",
+                            "error": f"insufficient balance: {cost} needed, {balances[name]} available"})
+            continue
+        if trade['type'] == 'sell' and trade['quantity'] > held:
+            results.append({"status": "rejected",
+                            "error": f"insufficient holding: {trade['quantity']} {trade['ticker']} to sell, {held} held"})
+            continue
+        quantity = signed_quantity(trade)
+        balances[name] -= quantity * trade['price']
+        positions[(name, trade['ticker'])] = held + quantity
+        changes[(name, trade['ticker'])] = changes.get((name, trade['ticker']), 0) + quantity
+        if trade['idempotency_key']:
+            seen_keys.add(key)
+        applied.append(dict(trade, name=name))
+        results.append({"status": "applied"})
+    return results, applied, changes
+
+
+def holdings_upsert(changes):
+    """Add {(name, ticker): quantity change} to the holdings snapshot, in one statement"""
+    stmt = pg_insert(holdings).values([{'name': name, 'ticker': ticker, 'quantity': quantity}
+                                       for (name, ticker), quantity in changes.items()])
+    return stmt.on_conflict_do_update(
+        index_elements=[holdings.c.name, holdings.c.ticker],
+        set_={'quantity': holdings.c.quantity + stmt.excluded.quantity}
+    )
+
+
+def get_holdings(conn, name):
+    """{ticker: quantity} of the ledger's open positions, from the snapshot"""
+    stmt = select(holdings.c.ticker, holdings.c.quantity).where(holdings.c.name == name, holdings.c.quantity != 0)
+    return {row.ticker: row.quantity for row in conn.execute(stmt)}
+
+
+def replay_trades(conn, name):
+    """(holdings, balance) of a ledger recomputed from its full trade history"""
+    signed = case((trades.c.type == 'buy', trades.c.quantity), else_=-trades.c.quantity)
+    stmt = (select(trades.c.ticker,
+                   func.sum(signed).label('quantity'),
+                   func.sum(signed * trades.c.price).label('cost'))
+            .where(trades.c.name == name)
+            .group_by(trades.c.ticker))
+    rows = conn.execute(stmt).fetchall()
+    starting_balance = conn.execute(
+        select(ledger.c.starting_balance).where(ledger.c.name == name)).scalar_one()
+    positions = {row.ticker: row.quantity for row in rows if row.quantity != 0}
+    return positions, starting_balance - sum(row.cost for row in rows)
+
+
+def snapshot_differences(positions, balance, replayed_positions, replayed_balance):
+    """{field: (snapshot, replayed)} for the balance and every ticker that differ; empty when they match"""
+    differences = {}
+    if balance != replayed_balance:
+        differences['balance'] = (balance, replayed_balance)
+    for ticker in sorted(set(positions) | set(replayed_positions)):
+        if positions.get(ticker, 0) != replayed_positions.get(ticker, 0):
+            differences[ticker] = (positions.get(ticker, 0), replayed_positions.get(ticker, 0))
+    return differences
+
+
+def rebuild_snapshot(conn, name):
+    """
+    Replace a ledger's holdings and balance with the ones replayed from its trades.
+    The ledger row is locked for the duration so no trade lands mid-rebuild.
+    Returns the differences found, as {field: (snapshot, replayed)}; empty when it was correct,
+    None when the ledger does not exist.
+    """
+    balance = conn.execute(
+        select(ledger.c.balance).where(ledger.c.name == name).with_for_update()).scalar_one_or_none()
+    if balance is None:
+        return None
+    positions = get_holdings(conn, name)
+    replayed_positions, replayed_balance = replay_trades(conn, name)
+
+    differences = snapshot_differences(positions, balance, replayed_positions, replayed_balance)
+    if differences:
+        conn.execute(delete(holdings).where(holdings.c.name == name))
+        if replayed_positions:
+            conn.execute(insert(holdings), [{'name': name, 'ticker': ticker, 'quantity': quantity}
+                                            for ticker, quantity in replayed_positions.items()])
+        conn.execute(update(ledger).where(ledger.c.name == name).values(balance=replayed_balance))
+    return differences
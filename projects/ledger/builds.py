@@ -0,0 +1,99 @@
+"""
+Background Docker image builds for ledgers.
+
+Images are tagged with a hash of the algorithm directory (docker_utils.image_tag), so
+ledgers running the same code share one image, and changed code gets a new one. Builds run
+on a small pool of worker threads instead of inside the create_ledger request, and each is
+tracked as a job whose status is served by /build_status. A request for an image that is
+already being built joins that job rather than starting another.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BuildQueue:
+    def __init__(self, build_image, export_image, max_workers=2, max_jobs=500):
+        """
+        build_image(tag, path) builds (or reuses) an image; export_image(tag, tar_path)
+        saves it as a tar. max_jobs finished jobs are remembered for /build_status.
+        """
+        self.build_image = build_image
+        self.export_image = export_image
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ledger-build')
+        self._jobs = OrderedDict()  # id -> job, oldest first
+        self._active = {}  # image tag -> job, while queued or running
+        self._lock = threading.Lock()
+
+    def submit(self, tag, path, export_to=None):
+        """
+        Queue a build of the algorithm at path as image `tag`, then save it as a tar at
+        export_to if given. Returns the job (a copy), which may be an earlier one for the
+        same image that has not finished yet.
+        """
+        with self._lock:
+            job = self._active.get(tag)
+            if job is not None:
+                if export_to and not job['export_to'] and job['status'] in ('queued', 'building'):
+                    job['export_to'] = export_to
+                return dict(job)
+
+            job = {
+                'id': uuid.uuid4().hex,
+                'image': tag,
+                'path': path,
+                'export_to': export_to,
+                'status': 'queued',
+                'built': None,
+                'error': None,
+                'submitted_at': time.time(),
+                'finished_at': None,
+            }
+            self._jobs[job['id']] = job
+            self._active[tag] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return dict(job)
+
+    def _run(self, job):
+        try:
+            self._set(job, status='building')
+            built = self.build_image(job['image'], job['path'])
+            with self._lock:
+                export_to = job['export_to']
+                job['built'] = built
+                job['status'] = 'exporting' if export_to else job['status']
+            if export_to:
+                self.export_image(job['image'], export_to)
+            self._set(job, status='done')
+        except Exception as e:
+            print(f"Build of {job['image']} from {job['path']} failed: {e}")
+            self._set(job, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                job['finished_at'] = time.time()
+                if self._active.get(job['image']) is job:
+                    del self._active[job['image']]
+
+    def _set(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['finished_at'] is not None]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """A copy of the job, or None if it is unknown (or long finished)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def get_stats(self):
+        with self._lock:
+            statuses = [job['status'] for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ('queued', 'building', 'exporting', 'done', 'failed')}
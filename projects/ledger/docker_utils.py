@@ -1,11 +1,23 @@
-import docker
+import hashlib
+import json
 import os
 
-client = docker.from_env()
+import docker
+
+_client = None
+
+
+def get_client():
+    """The Docker client, connected on first use so that paths without Docker need no daemon"""
+    global _client
+    if _client is None:
+        _client = docker.from_env()
+    return _client
+
 
 def build_docker_image(name, dockerfile_path):
     try:
-        image, logs = client.images.build(path=dockerfile_path, tag=name)
+        image, logs = get_client().images.build(path=dockerfile_path, tag=name)
         return image
     except Exception as e:
         raise RuntimeError(f"Error building Docker image: {e}")
@@ -13,7 +25,7 @@ def build_docker_image(name, dockerfile_path):
 
 def run_docker_container(image_name, command=None):
     try:
-        container = client.containers.run(
+        container = get_client().containers.run(
             image_name,
             command=command
         )
@@ -24,9 +36,113 @@ def run_docker_container(image_name, command=None):
 
 def stop_docker_container(image_name):
     try:
-        container = client.containers.get(image_name)
+        container = get_client().containers.get(image_name)
         container.stop()
     except docker.errors.NotFound:
         print(f"Container '{image_name}' not found")
     except Exception as e:
         raise RuntimeError(f"Error stopping Docker container: {e}")
+
+
+IMAGE_REPOSITORY = 'ledger-algo'
+HASH_SKIPPED = {'.git', '__pycache__', '.pytest_cache', '.venv', 'venv'}
+
+
+def hash_directory(path):
+    """sha256 of every file's relative path and contents in an algorithm directory"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in HASH_SKIPPED)
+        for file_name in sorted(files):
+            if file_name.endswith('.pyc'):
+                continue
+            file_path = os.path.join(root, file_name)
+            digest.update(os.path.relpath(file_path, path).replace(os.sep, '/').encode() + b'\0')
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def image_tag(dockerfile_path):
+    """Image tag for an algorithm directory: identical code gets the same tag (and image)"""
+    if not os.path.isdir(dockerfile_path):
+        raise FileNotFoundError(f"Algorithm directory '{dockerfile_path}' does not exist")
+    return f"{IMAGE_REPOSITORY}:{hash_directory(dockerfile_path)[:16]}"
+
+
+def image_exists(tag):
+    try:
+        get_client().images.get(tag)
+        return True
+    except docker.errors.ImageNotFound:
+        return False
+
+
+def ensure_image(tag, dockerfile_path):
+    """Build the image unless one with this tag exists already. Returns whether it was built."""
+    if image_exists(tag):
+        return False
+    build_docker_image(tag, dockerfile_path)
+    return True
+
+
+def export_image(tag, path):
+    """Save an image as a tar at path (written to a temporary file first), unless it exists"""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    partial = f"{path}.partial"
+    try:
+        with open(partial, 'wb') as image_tar:
+            for chunk in get_client().images.get(tag).save():
+                image_tar.write(chunk)
+        os.replace(partial, path)
+    except Exception as e:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise RuntimeError(f"Error exporting Docker image: {e}")
+
+
+# Runs one tick of a model inside its container: the model module (model.py, following the
+# update_book_status/trade interface in the README) gets the book status and returns its trades.
+MODEL_TICK_SCRIPT = ("import json, sys, model; m = model.Model(); "
+                     "m.update_book_status(json.loads(sys.argv[1])); print(json.dumps(m.trade()))")
+
+
+def run_model_tick(name, ledger, book_status):
+    """
+    Run one tick of a ledger's model in a long-lived container of its image (ledger["image"],
+    started on first use and named after the ledger) and return the trades it made. A
+    container of another image (the ledger was re-created with other code) is replaced.
+    """
+    image = ledger['image']
+    if not image:
+        raise RuntimeError(f"Ledger '{name}' has no image")
+    client = get_client()
+    try:
+        container = client.containers.get(name)
+        if container.attrs['Config']['Image'] != image:
+            container.remove(force=True)
+            container = None
+        elif container.status != 'running':
+            container.start()
+    except docker.errors.NotFound:
+        container = None
+    if container is None:
+        container = client.containers.run(image, name=name, detach=True)
+
+    exit_code, output = container.exec_run(['python', '-c', MODEL_TICK_SCRIPT, json.dumps(book_status)])
+    if exit_code != 0:
+        raise RuntimeError(f"Model exited with {exit_code}: {output.decode(errors='replace')[-500:]}")
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    return result.get('trades', []) if isinstance(result, dict) else result
+
+
+def remove_model_container(name):
+    """Remove the container run_model_tick keeps for a ledger, if it has one"""
+    try:
+        get_client().containers.get(name).remove(force=True)
+    except docker.errors.NotFound:
+        pass
@@ -0,0 +1,174 @@
+"""
+Warm in-process execution of ledger models, as an alternative to a container per ledger.
+
+A fixed pool of long-lived worker processes hosts the models. Each ledger is assigned to one
+worker, which imports its model module (model.py in the algorithm directory, following the
+update_book_status/trade interface in the README) and creates its Model once, then keeps it
+for every later tick, so a tick costs a method call instead of a container exec. The modules
+a model imports from its own directory are private to it (two ledgers' helper.py do not
+clash), and the model is imported again when model.py or any of them changes.
+
+Each worker's address space is capped at memory_limit_mb (a model that exceeds it gets a
+MemoryError and its worker is restarted), and a tick that runs longer than tick_timeout
+seconds gets its worker killed and restarted. Models on a restarted worker are imported
+again on their next tick. This module only uses the standard library, so workers start
+without loading the ledger service itself.
+"""
+import importlib.util
+import multiprocessing
+import os
+import re
+import sys
+import threading
+
+try:
+    import resource
+except ImportError:  # not available on Windows: workers then run without a memory cap
+    resource = None
+
+
+class ModelError(RuntimeError):
+    """A model failed, timed out or exceeded its worker's limits"""
+
+
+def _is_from(path, module):
+    location = getattr(module, '__file__', None) or next(iter(getattr(module, '__path__', None) or []), None)
+    return location is not None and os.path.abspath(location).startswith(os.path.join(os.path.abspath(path), ''))
+
+
+def _load_model(name, path):
+    """
+    Import path/model.py as a module private to this ledger and instantiate its Model.
+    Returns the Model and the files of the directory that were imported for it.
+    """
+    module_name = f"ledger_model_{re.sub(r'[^0-9a-zA-Z_]', '_', name)}"
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(path, 'model.py'))
+    module = importlib.util.module_from_spec(spec)
+    files = [spec.origin]
+    # let the model import the other files of its directory
+    sys.path.insert(0, path)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(path)
+        # keep the directory's modules out of the shared sys.modules, so another ledger's
+        # same-named helper is imported from its own directory; this model keeps its own
+        # through its globals
+        for imported in [key for key, loaded in sys.modules.items() if _is_from(path, loaded)]:
+            loaded = sys.modules.pop(imported)
+            if getattr(loaded, '__file__', None):
+                files.append(loaded.__file__)
+    return module.Model(), files
+
+
+def _versions(files):
+    return tuple(os.stat(file).st_mtime if os.path.exists(file) else None for file in files)
+
+
+def _worker_main(conn, memory_limit):
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    models = {}  # ledger name -> (path, files, their mtimes, Model instance)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        name, path, book_status = message
+        try:
+            # reload when model.py or any module it imported from its directory changed
+            if name not in models or models[name][0] != path or _versions(models[name][1]) != models[name][2]:
+                model, files = _load_model(name, path)
+                models[name] = (path, files, _versions(files), model)
+            model = models[name][3]
+            model.update_book_status(book_status)
+            result = model.trade()
+            conn.send(('ok', result.get('trades', []) if isinstance(result, dict) else result or []))
+        except MemoryError:
+            # the worker may be left in a bad state: have it replaced
+            conn.send(('fatal', "model exceeded the worker memory limit"))
+            return
+        except BaseException as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context, memory_limit):
+        self.context = context
+        self.memory_limit = memory_limit
+        self.lock = threading.Lock()
+        self.ledgers = 0
+        self.restarts = 0
+        self._start()
+
+    def _start(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(target=_worker_main, args=(child_conn, self.memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def _restart(self):
+        self.stop()
+        self.restarts += 1
+        self._start()
+
+    def call(self, message, timeout):
+        with self.lock:
+            if not self.process.is_alive():
+                self._restart()
+            self.conn.send(message)
+            if not self.conn.poll(timeout):
+                self._restart()
+                raise ModelError(f"model did not return within {timeout}s")
+            try:
+                status, value = self.conn.recv()
+            except EOFError:
+                self._restart()
+                raise ModelError("model worker died")
+            if status == 'fatal':
+                self._restart()
+            if status != 'ok':
+                raise ModelError(value)
+            return value
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ModelPool:
+    def __init__(self, workers=4, memory_limit_mb=1024, tick_timeout=30):
+        context = multiprocessing.get_context('spawn')
+        self.tick_timeout = tick_timeout
+        self._workers = [_Worker(context, memory_limit_mb * 1024 * 1024 if memory_limit_mb else None)
+                         for _ in range(workers)]
+        self._assignments = {}  # ledger name -> worker
+        self._lock = threading.Lock()
+
+    def _worker_for(self, name):
+        """The ledger's worker; new ledgers go to the worker hosting the fewest"""
+        with self._lock:
+            worker = self._assignments.get(name)
+            if worker is None:
+                worker = self._assignments[name] = min(self._workers, key=lambda w: w.ledgers)
+                worker.ledgers += 1
+            return worker
+
+    def run(self, name, path, book_status):
+        """One tick of a ledger's model (the one in directory path); returns its trades"""
+        return self._worker_for(name).call((name, path, book_status), self.tick_timeout)
+
+    def get_stats(self):
+        with self._lock:
+            return {'workers': len(self._workers),
+                    'ledgers': len(self._assignments),
+                    'restarts': sum(worker.restarts for worker in self._workers)}
+
+    def close(self):
+        for worker in self._workers:
+            with worker.lock:
+                worker.stop()
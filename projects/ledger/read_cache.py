@@ -0,0 +1,60 @@
+"""
+In-process cache of ledger reads (view_ledger), keyed by ledger name and query.
+
+A ledger only changes when trades are applied to it or its worth is recorded, so every
+write path calls invalidate(name) after committing and reads are served from memory in
+between. Entries also expire after a TTL, which bounds staleness for writes made by another
+process (e.g. another server worker or a CLI command).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LedgerReadCache:
+    def __init__(self, ttl=5, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (name, key) -> (expires_at, value), in LRU order
+        self._generations = {}  # name -> number of invalidations
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+
+    def get_or_load(self, name, key, load):
+        """
+        The cached value for (name, key), or load() on a miss. None results (e.g. an
+        unknown ledger) are not cached. A value loaded while the ledger was invalidated is
+        returned but not stored, since it may predate the write.
+        """
+        with self._lock:
+            entry = self._entries.get((name, key))
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end((name, key))
+                self._stats['hits'] += 1
+                return entry[1]
+            self._stats['misses'] += 1
+            generation = self._generations.get(name, 0)
+
+        value = load()
+
+        if value is not None:
+            with self._lock:
+                if self._generations.get(name, 0) == generation:
+                    self._entries[(name, key)] = (time.monotonic() + self.ttl, value)
+                    self._entries.move_to_end((name, key))
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self._stats['evictions'] += 1
+        return value
+
+    def invalidate(self, name):
+        """Drop every cached read of a ledger; call after committing a write to it"""
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+            for cached in [cached for cached in self._entries if cached[0] == name]:
+                del self._entries[cached]
+            self._stats['invalidations'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
@@ -0,0 +1,188 @@
+"""
+Tick scheduler: calls every active ledger's model each update_time minutes, until the
+ledger's end_duration is over, and applies the trades it returns.
+
+Ticks are aligned to the clock (every minute on the minute, every 5 minutes at :00, :05,
+...), so all ledgers with the same update_time are due together and are ticked as one
+group: a single priority queue entry per update_time, one query for the group's book
+statuses and one transaction for all of its trades (book.apply_entries). Models of a group
+run in parallel on a bounded pool of worker threads, either in their containers
+(docker_utils.run_model_tick) or warm in a pool of worker processes (model_pool.ModelPool).
+A group whose previous tick is still running when it is due again skips that tick (counted
+as an overrun) rather than piling up. After its trades are applied, a group can be marked
+to market as a whole (after_tick, see valuation.py).
+
+    flask --app app run-scheduler [--backend docker|process]
+"""
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from sqlalchemy import select, text
+
+from book import apply_entries
+from db_config import get_db_connection, holdings, ledger, utc_now
+
+
+class LedgerStore:
+    """The scheduler's view of the database"""
+
+    def active_ledgers(self):
+        """
+        {name: (update_time in minutes, {"image", "algo_link"})} of the ledgers whose lifespan
+        is not over; the second item tells the model runner where the ledger's model is
+        """
+        ends_at = ledger.c.created_at + ledger.c.end_duration * text("INTERVAL '1 day'")
+        stmt = (select(ledger.c.name, ledger.c.update_time, ledger.c.image, ledger.c.algo_link)
+                .where(ends_at > utc_now()))
+        with get_db_connection() as conn:
+            return {row.name: (row.update_time, {"image": row.image, "algo_link": row.algo_link})
+                    for row in conn.execute(stmt)}
+
+    def book_statuses(self, names):
+        """{name: {"portfolio": {ticker: quantity}, "balance": balance}}, the input of a model's update_book_status"""
+        with get_db_connection() as conn:
+            statuses = {row.name: {"portfolio": {}, "balance": float(row.balance)} for row in conn.execute(
+                select(ledger.c.name, ledger.c.balance).where(ledger.c.name.in_(names)))}
+            for row in conn.execute(select(holdings).where(holdings.c.name.in_(names), holdings.c.quantity != 0)):
+                statuses[row.name]["portfolio"][row.ticker] = float(row.quantity)
+        return statuses
+
+    def apply_trades(self, entries):
+        """Apply (name, trade) pairs in one transaction; returns the per-trade results"""
+        with get_db_connection() as conn:
+            results, books = apply_entries(conn, entries)
+            conn.commit()
+        return results
+
+
+class TickScheduler:
+    def __init__(self, store, run_model, max_workers=16, refresh_interval=60, clock=time.time, after_tick=None):
+        """
+        run_model(name, model, book_status) runs one tick of a ledger's model (model being
+        what the store's active_ledgers gave for it) and returns its trades. Ledgers are
+        re-read from the store every refresh_interval seconds, which picks up new, deleted
+        and expired ledgers. after_tick(names), if given, is called with the ledgers of a
+        group once its trades are applied.
+        """
+        self.store = store
+        self.run_model = run_model
+        self.after_tick = after_tick
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._groups = {}  # update_time -> {name: model}
+        self._queue = []  # heap of (due_at, update_time), one entry per group
+        self._queued = set()  # update_times with an entry in the heap
+        self._running = set()  # update_times with a tick in progress
+        self._lock = threading.Lock()
+        self._models = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ledger-model')
+        self._groups_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ledger-tick')
+        self._stats = {'ticks': 0, 'ledger_ticks': 0, 'trades_applied': 0, 'trades_rejected': 0,
+                       'model_errors': 0, 'after_tick_errors': 0, 'overruns': 0,
+                       'last_lag_seconds': 0.0, 'max_lag_seconds': 0.0}
+
+    @staticmethod
+    def next_due(update_time, now):
+        """The next clock-aligned tick of a group after now"""
+        period = update_time * 60
+        return (now // period + 1) * period
+
+    def refresh(self):
+        ledgers = self.store.active_ledgers()
+        groups = {}
+        for name, (update_time, model) in ledgers.items():
+            if update_time and update_time > 0:
+                groups.setdefault(update_time, {})[name] = model
+        now = self.clock()
+        with self._lock:
+            for update_time in groups.keys() - self._queued:
+                heapq.heappush(self._queue, (self.next_due(update_time, now), update_time))
+                self._queued.add(update_time)
+            # groups that disappeared are dropped from the queue when they come due
+            self._groups = groups
+
+    def run_due(self):
+        """Dispatch every group that is due; returns the seconds until the next one is"""
+        now = self.clock()
+        due = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                due_at, update_time = heapq.heappop(self._queue)
+                if update_time not in self._groups:
+                    self._queued.discard(update_time)
+                    continue
+                heapq.heappush(self._queue, (self.next_due(update_time, now), update_time))
+                if update_time in self._running:
+                    self._stats['overruns'] += 1
+                    continue
+                self._running.add(update_time)
+                due.append((due_at, update_time, dict(self._groups[update_time])))
+            wait = self._queue[0][0] - now if self._queue else None
+        for due_at, update_time, group in due:
+            self._groups_pool.submit(self.tick, update_time, group, due_at)
+        return wait
+
+    def tick(self, update_time, group, due_at):
+        """Run one tick of a group of ledgers and apply their trades together"""
+        try:
+            lag = self.clock() - due_at
+            statuses = self.store.book_statuses(list(group))
+            futures = {self._models.submit(self.run_model, name, model, statuses[name]): name
+                       for name, model in group.items() if name in statuses}
+            entries = []
+            errors = 0
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    entries += [(name, trade) for trade in future.result() or []]
+                except Exception as e:
+                    errors += 1
+                    print(f"Model of ledger '{name}' failed: {e}")
+
+            results = self.store.apply_trades(entries) if entries else []
+            applied = sum(result['status'] == 'applied' for result in results)
+            after_tick_failed = False
+            if self.after_tick:
+                try:
+                    self.after_tick(list(statuses))
+                except Exception as e:
+                    after_tick_failed = True
+                    print(f"After-tick step of the {update_time} minute ledgers failed: {e}")
+            with self._lock:
+                self._stats['ticks'] += 1
+                self._stats['ledger_ticks'] += len(futures)
+                self._stats['trades_applied'] += applied
+                self._stats['trades_rejected'] += sum(result['status'] == 'rejected' for result in results)
+                self._stats['model_errors'] += errors
+                self._stats['after_tick_errors'] += after_tick_failed
+                self._stats['last_lag_seconds'] = lag
+                self._stats['max_lag_seconds'] = max(self._stats['max_lag_seconds'], lag)
+        except Exception as e:
+            print(f"Tick of the {update_time} minute ledgers failed: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(update_time)
+
+    def run_forever(self, stop=None, on_refresh=None):
+        """Schedule ticks until stop (a threading.Event) is set"""
+        stop = stop or threading.Event()
+        next_refresh = 0
+        while not stop.is_set():
+            if self.clock() >= next_refresh:
+                self.refresh()
+                next_refresh = self.clock() + self.refresh_interval
+                if on_refresh:
+                    on_refresh(self)
+            wait = self.run_due()
+            refresh_in = next_refresh - self.clock()
+            stop.wait(max(0.0, min(refresh_in, wait) if wait is not None else refresh_in))
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, ledgers=sum(len(group) for group in self._groups.values()),
+                        groups=len(self._groups), running=len(self._running))
+
+    def close(self):
+        self._groups_pool.shutdown(wait=True)
+        self._models.shutdown(wait=True)
@@ -3,14 +3,49 @@ CREATE TABLE order_books_v2 (
     name TEXT PRIMARY KEY,
     tickers_to_track TEXT[],
     algo_link TEXT NOT NULL,
+    image TEXT,
     update_time INT NOT NULL,
     end_duration INT NOT NULL,
     trades JSONB DEFAULT '[]',
     worth NUMERIC[] DEFAULT '{}',
     balance NUMERIC NOT NULL DEFAULT 100000,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    starting_balance NUMERIC NOT NULL DEFAULT 100000,
+    created_at TIMESTAMP DEFAULT timezone('utc', now())
 );
 
+-- append-only trade history (existing databases: sql_statements/migrations/001_trades_table.sql)
+CREATE TABLE trades (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL REFERENCES order_books_v2 (name) ON DELETE CASCADE,
+    ts TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+    ticker TEXT NOT NULL,
+    type TEXT NOT NULL,
+    price NUMERIC NOT NULL,
+    quantity NUMERIC NOT NULL,
+    idempotency_key TEXT
+);
+CREATE INDEX trades_name_ts_id_idx ON trades (name, ts, id);
+CREATE INDEX trades_name_ticker_ts_id_idx ON trades (name, ticker, ts, id);
+CREATE UNIQUE INDEX trades_name_idempotency_key_idx ON trades (name, idempotency_key) WHERE idempotency_key IS NOT NULL;
+
+-- materialized positions, updated with every trade (existing databases: migrations/002_holdings_snapshot.sql)
+CREATE TABLE holdings (
+    name TEXT NOT NULL REFERENCES order_books_v2 (name) ON DELETE CASCADE,
+    ticker TEXT NOT NULL,
+    quantity NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, ticker)
+);
+
+-- worth history at minute/hour/day resolution (existing databases: migrations/004_worth_points.sql)
+CREATE TABLE worth_points (
+    name TEXT NOT NULL REFERENCES order_books_v2 (name) ON DELETE CASCADE,
+    ts TIMESTAMP NOT NULL,
+    resolution TEXT NOT NULL,
+    worth DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (name, ts, resolution)
+);
+CREATE INDEX worth_points_resolution_ts_idx ON worth_points (resolution, ts);
+
 -- creating user
 CREATE USER reebxu WITH SUPERUSER PASSWORD 'watstreet';
 -- database name: postgres
@@ -0,0 +1,33 @@
+-- Moves trades out of the order_books_v2.trades JSONB array into an append-only table.
+-- Safe to re-run: ledgers that already have rows in trades are not backfilled again.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS trades (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL REFERENCES order_books_v2 (name) ON DELETE CASCADE,
+    ts TIMESTAMP NOT NULL DEFAULT timezone('utc', now()),
+    ticker TEXT NOT NULL,
+    type TEXT NOT NULL,
+    price NUMERIC NOT NULL,
+    quantity NUMERIC NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_name_ts_idx ON trades (name, ts);
+CREATE INDEX IF NOT EXISTS trades_name_ticker_idx ON trades (name, ticker);
+
+-- the JSONB entries carry no timestamp: keep their order by spacing them one
+-- microsecond apart from the ledger's creation time
+INSERT INTO trades (name, ts, ticker, type, price, quantity)
+SELECT b.name,
+       b.created_at + t.ord * INTERVAL '1 microsecond',
+       t.trade->>'ticker',
+       t.trade->>'type',
+       (t.trade->>'price')::NUMERIC,
+       (t.trade->>'quantity')::NUMERIC
+FROM order_books_v2 b
+CROSS JOIN LATERAL jsonb_array_elements(b.trades) WITH ORDINALITY AS t(trade, ord)
+WHERE NOT EXISTS (SELECT 1 FROM trades x WHERE x.name = b.name);
+
+COMMIT;
+
+-- Once the backfill is verified (counts per ledger match jsonb_array_length(trades)):
+-- ALTER TABLE order_books_v2 DROP COLUMN trades;
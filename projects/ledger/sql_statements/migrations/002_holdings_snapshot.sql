@@ -0,0 +1,30 @@
+-- Adds the materialized holdings snapshot and the starting balance it is replayed from.
+-- Run after 001_trades_table.sql. Existing balances are taken as current, so each
+-- ledger's starting balance is its balance with its recorded trades undone.
+BEGIN;
+
+ALTER TABLE order_books_v2 ADD COLUMN IF NOT EXISTS starting_balance NUMERIC NOT NULL DEFAULT 100000;
+
+UPDATE order_books_v2 b
+SET starting_balance = b.balance + t.cost
+FROM (
+    SELECT name, SUM(CASE WHEN type = 'buy' THEN quantity ELSE -quantity END * price) AS cost
+    FROM trades
+    GROUP BY name
+) t
+WHERE t.name = b.name;
+
+CREATE TABLE IF NOT EXISTS holdings (
+    name TEXT NOT NULL REFERENCES order_books_v2 (name) ON DELETE CASCADE,
+    ticker TEXT NOT NULL,
+    quantity NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, ticker)
+);
+
+INSERT INTO holdings (name, ticker, quantity)
+SELECT name, ticker, SUM(CASE WHEN type = 'buy' THEN quantity ELSE -quantity END)
+FROM trades
+GROUP BY name, ticker
+ON CONFLICT (name, ticker) DO UPDATE SET quantity = excluded.quantity;
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Lets clients attach an idempotency key to each trade so retried bulk requests
+-- (POST /bulk_trades) do not apply a trade twice.
+BEGIN;
+
+ALTER TABLE trades ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS trades_name_idempotency_key_idx
+    ON trades (name, idempotency_key) WHERE idempotency_key IS NOT NULL;
+
+COMMIT;
@@ -0,0 +1,27 @@
+-- Moves worth history out of the order_books_v2.worth NUMERIC[] array into worth_points.
+-- Array entries carry no timestamp: they are dated from the ledger's creation, one every
+-- update_time minutes. Run `flask --app app downsample-worth` afterwards to roll old points up.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS worth_points (
+    name TEXT NOT NULL REFERENCES order_books_v2 (name) ON DELETE CASCADE,
+    ts TIMESTAMP NOT NULL,
+    resolution TEXT NOT NULL,
+    worth DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (name, ts, resolution)
+);
+CREATE INDEX IF NOT EXISTS worth_points_resolution_ts_idx ON worth_points (resolution, ts);
+
+INSERT INTO worth_points (name, ts, resolution, worth)
+SELECT b.name,
+       date_trunc('minute', b.created_at) + (w.ord - 1) * b.update_time * INTERVAL '1 minute',
+       'minute',
+       w.worth
+FROM order_books_v2 b
+CROSS JOIN LATERAL unnest(b.worth) WITH ORDINALITY AS w(worth, ord)
+ON CONFLICT (name, ts, resolution) DO NOTHING;
+
+COMMIT;
+
+-- Once the backfill is verified:
+-- ALTER TABLE order_books_v2 DROP COLUMN worth;
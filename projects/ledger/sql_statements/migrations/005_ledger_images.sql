@@ -0,0 +1,3 @@
+-- Records the Docker image (tagged with a hash of the algorithm's code) each ledger runs.
+-- Existing ledgers get theirs the next time they are recreated.
+ALTER TABLE order_books_v2 ADD COLUMN IF NOT EXISTS image TEXT;
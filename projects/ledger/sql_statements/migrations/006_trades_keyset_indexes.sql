@@ -0,0 +1,8 @@
+-- Extends the trades indexes with the (ts, id) order that GET /trades pages and
+-- GET /export_trades streams in, so that a page (with or without a ticker filter) is one
+-- index range scan. The new indexes cover every lookup of the ones they replace.
+-- CONCURRENTLY cannot run in a transaction: run this file with psql as is.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS trades_name_ts_id_idx ON trades (name, ts, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS trades_name_ticker_ts_id_idx ON trades (name, ticker, ts, id);
+DROP INDEX CONCURRENTLY IF EXISTS trades_name_ts_idx;
+DROP INDEX CONCURRENTLY IF EXISTS trades_name_ticker_idx;
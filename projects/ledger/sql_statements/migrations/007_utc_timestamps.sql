@@ -0,0 +1,22 @@
+-- Stores timestamps as naive UTC: column defaults become timezone('utc', now()), and the
+-- timestamps written so far (in the session's local time) are converted to UTC.
+-- Run it ONCE, from a session in the time zone the service wrote with (the server's
+-- default time zone); running it again would shift the rows twice.
+BEGIN;
+
+ALTER TABLE order_books_v2 ALTER COLUMN created_at SET DEFAULT timezone('utc', now());
+ALTER TABLE trades ALTER COLUMN ts SET DEFAULT timezone('utc', now());
+
+UPDATE order_books_v2 SET created_at = timezone('utc', created_at::timestamptz);
+UPDATE trades SET ts = timezone('utc', ts::timestamptz);
+
+-- ts is part of worth_points' primary key, so shifting it in place can collide midway:
+-- rewrite the table instead (points that fall together across a DST change are merged)
+CREATE TEMP TABLE worth_points_utc ON COMMIT DROP AS
+SELECT name, timezone('utc', ts::timestamptz) AS ts, resolution, worth FROM worth_points;
+DELETE FROM worth_points;
+INSERT INTO worth_points (name, ts, resolution, worth)
+SELECT name, ts, resolution, worth FROM worth_points_utc
+ON CONFLICT (name, ts, resolution) DO NOTHING;
+
+COMMIT;
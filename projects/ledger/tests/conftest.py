@@ -0,0 +1,159 @@
+"""Stand-ins for the database, Docker and price feeds, shared by the ledger tests"""
+import os
+import threading
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.dialects import postgresql
+
+from db_config import ledger, metadata
+
+
+class StandInDatabase:
+    """Ledgers in a dict, counting the reads that reach it"""
+
+    def __init__(self):
+        self.ledgers = {'krishalgo': {'balance': 100000.0}}
+        self.reads = 0
+
+    def view(self, name):
+        self.reads += 1
+        ledger = self.ledgers.get(name)
+        return dict(ledger) if ledger is not None else None
+
+
+class StandInConnection:
+    """A database connection that only counts commits and rollbacks"""
+
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class StandInStore:
+    def __init__(self, ledgers):
+        self.ledgers = ledgers  # name -> (update_time, model)
+        self.status_reads = []
+        self.applied = []
+
+    def active_ledgers(self):
+        return dict(self.ledgers)
+
+    def book_statuses(self, names):
+        self.status_reads.append(sorted(names))
+        return {name: {"portfolio": {}, "balance": 100000.0} for name in names if name in self.ledgers}
+
+    def apply_trades(self, entries):
+        self.applied.append(entries)
+        return [{"status": "applied"} for _ in entries]
+
+
+class StandInDocker:
+    """Records builds and exports; builds wait for `release` so tests can observe queued jobs"""
+
+    def __init__(self):
+        self.builds = []
+        self.exports = []
+        self.release = threading.Event()
+
+    def build(self, tag, path):
+        self.release.wait(1)
+        if path == 'broken':
+            raise RuntimeError("Error building Docker image: bad Dockerfile")
+        self.builds.append((tag, path))
+        return True
+
+    def export(self, tag, tar_path):
+        self.exports.append((tag, tar_path))
+
+
+class StandInPriceSource:
+    def __init__(self, prices):
+        self.prices = prices
+        self.requests = []
+
+    def get_prices(self, tickers):
+        self.requests.append(sorted(tickers))
+        return {ticker: self.prices[ticker] for ticker in tickers if ticker in self.prices}
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db():
+    return StandInDatabase()
+
+
+@pytest.fixture
+def conn():
+    return StandInConnection()
+
+
+@pytest.fixture
+def store():
+    """A scheduler store without ledgers; tests set store.ledgers"""
+    return StandInStore({})
+
+
+@pytest.fixture
+def docker():
+    return StandInDocker()
+
+
+@pytest.fixture
+def price_source():
+    return StandInPriceSource({'AAPL': 100.0, 'MSFT': 400.0})
+
+
+@pytest.fixture
+def clock():
+    """A clock at 0 that tests move by setting clock.now"""
+    return Clock(0)
+
+
+@pytest.fixture
+def compile_pg():
+    """Render a statement as postgres SQL with its parameters inlined"""
+    def compile_pg(stmt):
+        return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    return compile_pg
+
+
+@pytest.fixture
+def pg_conn():
+    """
+    A connection to LEDGER_TEST_DATABASE_URL, in a session pinned to a time zone far from
+    UTC, with the tables created in a scratch schema; everything is rolled back afterwards.
+    """
+    url = os.getenv('LEDGER_TEST_DATABASE_URL')
+    if not url:
+        pytest.skip("LEDGER_TEST_DATABASE_URL is not set")
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        conn.execute(text("SET LOCAL TIME ZONE 'Asia/Kolkata'"))
+        conn.execute(text("CREATE SCHEMA ledger_test"))
+        conn.execute(text("SET LOCAL search_path TO ledger_test"))
+        metadata.create_all(conn)
+        conn.execute(insert(ledger).values(name='krishalgo', algo_link='ledger_test_model',
+                                           update_time=1, end_duration=1))
+        yield conn
+        conn.rollback()
+    engine.dispose()
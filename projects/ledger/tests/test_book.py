@@ -0,0 +1,117 @@
+from decimal import Decimal
+
+import pytest
+
+from book import check_trades, holdings_upsert, lock_books_query, parse_trade
+
+
+def trade(type, ticker, price, quantity, **extra):
+    return dict({"type": type, "ticker": ticker, "price": price, "quantity": quantity}, **extra)
+
+
+def check(entries, balances, positions=None, seen_keys=None):
+    parsed = []
+    for name, raw in entries:
+        try:
+            parsed.append((name, parse_trade(raw)))
+        except ValueError as e:
+            parsed.append((name, e))
+    balances = {name: Decimal(balance) for name, balance in balances.items()}
+    positions = {key: Decimal(quantity) for key, quantity in (positions or {}).items()}
+    results, applied, changes = check_trades(parsed, balances, positions, set(seen_keys or ()))
+    return [result['status'] for result in results], results, applied, changes, balances, positions
+
+
+@pytest.mark.parametrize('raw, error', [
+    ("buy", "trade must be an object"),
+    (trade("hold", "AAPL", 1, 1), "type must be one of buy, sell"),
+    (trade("buy", "", 1, 1), "ticker is required"),
+    (trade("buy", "AAPL", "abc", 1), "price must be a number"),
+    ({"type": "buy", "ticker": "AAPL", "price": 1}, "quantity must be a number"),
+    (trade("buy", "AAPL", 1, 0), "quantity must be positive"),
+    (trade("buy", "AAPL", -5, 1), "price must be positive"),
+    (trade("buy", "AAPL", "NaN", 1), "price must be positive"),
+    (trade("buy", "AAPL", 1, 1, idempotency_key=7), "idempotency_key must be a string"),
+])
+def test_malformed_trades_are_rejected(raw, error):
+    with pytest.raises(ValueError, match=error):
+        parse_trade(raw)
+
+
+def test_amounts_are_parsed_as_decimals():
+    parsed = parse_trade(trade("sell", "AAPL", 0.1, "3"))
+    assert (parsed['price'], parsed['quantity']) == (Decimal('0.1'), Decimal('3'))
+
+
+def test_buys_are_checked_against_the_running_balance():
+    statuses, results, applied, changes, balances, _ = check(
+        [("a", trade("buy", "AAPL", 100, 6)), ("a", trade("buy", "AAPL", 100, 5)), ("a", trade("buy", "MSFT", 50, 8))],
+        {"a": 1000})
+
+    assert statuses == ["applied", "rejected", "applied"]
+    assert results[1]['error'] == "insufficient balance: 500 needed, 400 available"
+    assert balances == {"a": Decimal(0)}
+    assert changes == {("a", "AAPL"): 6, ("a", "MSFT"): 8}
+    assert [(t['name'], t['ticker']) for t in applied] == [("a", "AAPL"), ("a", "MSFT")]
+
+
+def test_sells_count_earlier_trades_in_the_batch():
+    statuses, results, _, changes, balances, positions = check(
+        [("a", trade("sell", "AAPL", 10, 3)),   # only 2 held
+         ("a", trade("buy", "AAPL", 10, 5)),
+         ("a", trade("sell", "AAPL", 10, 7)),   # 2 held + 5 bought
+         ("a", trade("sell", "AAPL", 10, 1))],  # nothing left
+        {"a": 100}, {("a", "AAPL"): 2})
+
+    assert statuses == ["rejected", "applied", "applied", "rejected"]
+    assert results[0]['error'] == "insufficient holding: 3 AAPL to sell, 2 held"
+    assert positions == {("a", "AAPL"): 0}
+    assert changes == {("a", "AAPL"): -2}
+    assert balances == {"a": Decimal(120)}
+
+
+def test_ledgers_are_checked_independently():
+    statuses, results, *_ = check(
+        [("a", trade("buy", "AAPL", 10, 5)), ("b", trade("buy", "AAPL", 10, 5)), ("c", trade("buy", "AAPL", 1, 1)),
+         (None, trade("buy", "AAPL", 1, 1)), ("a", {"type": "buy"})],
+        {"a": 100, "b": 10})
+
+    assert statuses == ["applied", "rejected", "rejected", "rejected", "rejected"]
+    assert results[2]['error'] == "ledger 'c' not found"
+    assert results[3]['error'] == "name is required"
+
+
+def test_idempotency_keys_are_applied_once():
+    statuses, *_ = check(
+        [("a", trade("buy", "AAPL", 1, 1, idempotency_key="k1")),
+         ("a", trade("buy", "AAPL", 1, 1, idempotency_key="k1")),  # repeated in the batch
+         ("b", trade("buy", "AAPL", 1, 1, idempotency_key="k1")),  # keys are per ledger
+         ("a", trade("buy", "AAPL", 1, 1, idempotency_key="k0"))],  # recorded by an earlier request
+        {"a": 100, "b": 100}, seen_keys={("a", "k0")})
+
+    assert statuses == ["applied", "duplicate", "applied", "duplicate"]
+
+
+def test_rejected_trade_does_not_record_its_key():
+    statuses, *_ = check(
+        [("a", trade("buy", "AAPL", 1000, 1, idempotency_key="k1")),
+         ("a", trade("buy", "AAPL", 1, 1, idempotency_key="k1"))],
+        {"a": 100})
+
+    assert statuses == ["rejected", "applied"]
+
+
+def test_books_are_locked_in_name_order_with_their_traded_positions(compile_pg):
+    sql = compile_pg(lock_books_query(["a", "b"], [("a", "AAPL"), ("b", "MSFT")]))
+
+    assert "LEFT OUTER JOIN holdings ON holdings.name = order_books_v2.name" in sql
+    assert "(holdings.name, holdings.ticker) IN (('a', 'AAPL'), ('b', 'MSFT'))" in sql
+    assert "WHERE order_books_v2.name IN ('a', 'b')" in sql
+    assert sql.endswith("ORDER BY order_books_v2.name FOR UPDATE OF order_books_v2")
+
+
+def test_holdings_changes_are_added_in_one_upsert(compile_pg):
+    sql = compile_pg(holdings_upsert({("a", "AAPL"): Decimal(5), ("b", "MSFT"): Decimal(-2)}))
+
+    assert "VALUES ('a', 'AAPL', 5), ('b', 'MSFT', -2)" in sql
+    assert sql.endswith("ON CONFLICT (name, ticker) DO UPDATE SET quantity = (holdings.quantity + excluded.quantity)")
@@ -0,0 +1,48 @@
+import time
+
+from builds import BuildQueue
+
+
+def wait_for(queue, job_id, timeout=2):
+    deadline = time.monotonic() + timeout
+    while queue.get(job_id)['status'] not in ('done', 'failed'):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+def test_requests_for_an_image_being_built_share_one_job(docker):
+    queue = BuildQueue(docker.build, docker.export)
+
+    first = queue.submit('ledger-algo:abc', '../algo')
+    second = queue.submit('ledger-algo:abc', '../algo', export_to='docker_images/abc.tar')
+    assert second['id'] == first['id']
+    docker.release.set()
+
+    job = wait_for(queue, first['id'])
+    assert job['status'] == 'done'
+    assert docker.builds == [('ledger-algo:abc', '../algo')]
+    # the export asked for by the second request was added to the shared job
+    assert docker.exports == [('ledger-algo:abc', 'docker_images/abc.tar')]
+
+    # once finished, a new request starts a new job (which reuses the image)
+    assert queue.submit('ledger-algo:abc', '../algo')['id'] != first['id']
+
+
+def test_exports_are_optional(docker):
+    docker.release.set()
+    queue = BuildQueue(docker.build, docker.export)
+
+    wait_for(queue, queue.submit('ledger-algo:abc', '../algo')['id'])
+    assert docker.exports == []
+
+
+def test_failed_builds_report_their_error(docker):
+    docker.release.set()
+    queue = BuildQueue(docker.build, docker.export)
+
+    job = wait_for(queue, queue.submit('ledger-algo:bad', 'broken')['id'])
+    assert job['status'] == 'failed'
+    assert 'bad Dockerfile' in job['error']
+    assert queue.get_stats()['failed'] == 1
+    assert queue.get('unknown') is None
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+import app as ledger_app
+
+
+def ndjson(*lines):
+    return '\n'.join(lines) + '\n'
+
+
+@pytest.fixture
+def client():
+    return ledger_app.app.test_client()
+
+
+@pytest.fixture
+def applied(monkeypatch, conn):
+    """The entries each bulk_trades request hands to apply_entries, which applies none of them"""
+    applied = []
+
+    def apply_entries(conn, entries):
+        applied.append(entries)
+        return [{"status": "applied"} for _ in entries], {}
+
+    monkeypatch.setattr(ledger_app, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(ledger_app, 'apply_entries', apply_entries)
+    return applied
+
+
+def test_ndjson_lines_are_read_in_order_skipping_blank_ones(client, applied):
+    buy = {"name": "krishalgo", "type": "buy", "ticker": "AAPL", "price": 176, "quantity": 8, "idempotency_key": "k1"}
+    sell = {"name": "otheralgo", "type": "sell", "ticker": "MSFT", "price": 400, "quantity": 1}
+
+    resp = client.post('/bulk_trades', data=ndjson(json.dumps(buy), '', '   ', json.dumps(sell)),
+                       content_type='application/x-ndjson')
+
+    assert resp.status_code == 200
+    assert applied == [[("krishalgo", buy), ("otheralgo", sell)]]
+
+
+def test_malformed_ndjson_lines_become_entries_without_a_ledger(client, applied):
+    resp = client.post('/bulk_trades', data=ndjson('{"name": "krishalgo", "type": "buy"', '[1, 2]'),
+                       content_type='application/x-ndjson')
+
+    assert resp.status_code == 200
+    assert applied == [[(None, None), (None, [1, 2])]]
+
+
+def test_ndjson_over_the_limit_is_refused(client, applied, monkeypatch):
+    monkeypatch.setattr(ledger_app, 'BULK_TRADES_LIMIT', 3)
+    line = json.dumps({"name": "krishalgo", "type": "buy", "ticker": "AAPL", "price": 1, "quantity": 1})
+
+    assert client.post('/bulk_trades', data=ndjson(*[line] * 3), content_type='application/x-ndjson').status_code == 200
+    resp = client.post('/bulk_trades', data=ndjson(*[line] * 4), content_type='application/x-ndjson')
+
+    assert resp.status_code == 413
+    assert resp.json == {"error": "At most 3 trades per request"}
+    assert len(applied) == 1
+
+
+def test_body_must_be_an_array_or_ndjson(client, applied):
+    resp = client.post('/bulk_trades', json={"trades": []})
+
+    assert resp.status_code == 400
+    assert applied == []
+
+
+class UncommittedConnection:
+    """pg_conn for the endpoints: their commits are left to the test's rollback"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def commit(self):
+        pass
+
+
+def test_retried_batches_are_reported_as_duplicates(client, pg_conn, monkeypatch):
+    monkeypatch.setattr(ledger_app, 'get_db_connection', lambda: UncommittedConnection(pg_conn))
+    batch = [{"name": "krishalgo", "type": "buy", "ticker": "AAPL", "price": 100, "quantity": 5, "idempotency_key": "k1"},
+             {"name": "krishalgo", "type": "buy", "ticker": "AAPL", "price": 100, "quantity": 5, "idempotency_key": "k1"},
+             {"name": "krishalgo", "type": "buy", "ticker": "MSFT", "price": 400, "quantity": 1, "idempotency_key": "k2"}]
+
+    first = client.post('/bulk_trades', json=batch).json
+    retried = client.post('/bulk_trades', json=batch).json
+
+    assert [result['status'] for result in first['results']] == ["applied", "duplicate", "applied"]
+    assert [result['status'] for result in retried['results']] == ["duplicate"] * 3
+    assert retried['ledgers'] == first['ledgers'] == {
+        "krishalgo": {"balance": 99100.0, "holding": {"AAPL": 5.0, "MSFT": 1.0}}}
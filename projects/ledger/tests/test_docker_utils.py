@@ -0,0 +1,73 @@
+import json
+
+import docker
+import pytest
+
+import docker_utils
+from docker_utils import remove_model_container, run_model_tick
+
+
+class StandInContainer:
+    def __init__(self, containers, name, image):
+        self.containers = containers
+        self.name = name
+        self.attrs = {'Config': {'Image': image}}
+        self.status = 'running'
+        self.execs = 0
+
+    def exec_run(self, cmd):
+        self.execs += 1
+        return 0, json.dumps({'trades': [{'image': self.attrs['Config']['Image']}]}).encode()
+
+    def remove(self, force=False):
+        del self.containers.running[self.name]
+        self.containers.removed.append(self.name)
+
+
+class StandInContainers:
+    def __init__(self):
+        self.running = {}
+        self.removed = []
+
+    def get(self, name):
+        if name not in self.running:
+            raise docker.errors.NotFound(name)
+        return self.running[name]
+
+    def run(self, image, name, detach):
+        self.running[name] = StandInContainer(self, name, image)
+        return self.running[name]
+
+
+@pytest.fixture
+def containers(monkeypatch):
+    containers = StandInContainers()
+    monkeypatch.setattr(docker_utils, '_client', type('Client', (), {'containers': containers})())
+    return containers
+
+
+def test_container_is_reused_between_ticks(containers):
+    run_model_tick('krishalgo', {'image': 'ledger-algo:aaa'}, {})
+    container = containers.running['krishalgo']
+    run_model_tick('krishalgo', {'image': 'ledger-algo:aaa'}, {})
+
+    assert containers.running['krishalgo'] is container
+    assert container.execs == 2
+
+
+def test_container_of_another_image_is_replaced(containers):
+    run_model_tick('krishalgo', {'image': 'ledger-algo:aaa'}, {})
+
+    trades = run_model_tick('krishalgo', {'image': 'ledger-algo:bbb'}, {})
+
+    assert trades == [{'image': 'ledger-algo:bbb'}]
+    assert containers.removed == ['krishalgo']
+
+
+def test_removing_a_ledgers_container(containers):
+    run_model_tick('krishalgo', {'image': 'ledger-algo:aaa'}, {})
+
+    remove_model_container('krishalgo')
+    remove_model_container('krishalgo')  # already gone
+
+    assert containers.running == {}
@@ -0,0 +1,138 @@
+import os
+
+import pytest
+
+from model_pool import ModelError, ModelPool
+
+COUNTING_MODEL = '''
+IMPORTS = 0
+IMPORTS += 1
+
+
+class Model:
+    def __init__(self):
+        self.ticks = 0
+
+    def update_book_status(self, book_status):
+        self.balance = book_status["balance"]
+
+    def trade(self):
+        self.ticks += 1
+        return {"trades": [{"type": "buy", "ticker": "AAPL", "price": self.balance, "quantity": self.ticks,
+                            "imports": IMPORTS}]}
+'''
+
+SLOW_MODEL = '''
+import time
+
+
+class Model:
+    def update_book_status(self, book_status):
+        pass
+
+    def trade(self):
+        time.sleep(float(open(__file__.replace("model.py", "delay")).read()))
+        return {"trades": []}
+'''
+
+GREEDY_MODEL = '''
+class Model:
+    def update_book_status(self, book_status):
+        pass
+
+    def trade(self):
+        self.hoard = bytearray(512 * 1024 * 1024)
+        return {"trades": []}
+'''
+
+
+HELPER_MODEL = '''
+import helper
+
+
+class Model:
+    def update_book_status(self, book_status):
+        pass
+
+    def trade(self):
+        return {"trades": [{"type": "buy", "ticker": helper.TICKER, "price": 1, "quantity": 1}]}
+'''
+
+
+def model_dir(tmp_path, name, source, **modules):
+    path = tmp_path / name
+    path.mkdir()
+    (path / 'model.py').write_text(source)
+    for module, module_source in modules.items():
+        (path / f'{module}.py').write_text(module_source)
+    return str(path)
+
+
+@pytest.fixture
+def pool():
+    pool = ModelPool(workers=2, memory_limit_mb=256, tick_timeout=2)
+    yield pool
+    pool.close()
+
+
+def test_models_are_imported_once_and_kept_warm(tmp_path, pool):
+    path = model_dir(tmp_path, 'counting', COUNTING_MODEL)
+
+    for tick in (1, 2, 3):
+        [trade] = pool.run('krishalgo', path, {"portfolio": {}, "balance": 100})
+        assert trade['quantity'] == tick
+        assert trade['imports'] == 1
+
+    # another ledger running the same code gets its own instance
+    [trade] = pool.run('other', path, {"portfolio": {}, "balance": 5})
+    assert (trade['quantity'], trade['price']) == (1, 5)
+    assert pool.get_stats() == {'workers': 2, 'ledgers': 2, 'restarts': 0}
+
+
+def test_a_tick_over_the_time_limit_restarts_the_worker(tmp_path, pool):
+    path = model_dir(tmp_path, 'slow', SLOW_MODEL)
+    (tmp_path / 'slow' / 'delay').write_text('10')
+
+    with pytest.raises(ModelError, match='did not return'):
+        pool.run('slow', path, {"portfolio": {}, "balance": 1})
+
+    (tmp_path / 'slow' / 'delay').write_text('0')
+    assert pool.run('slow', path, {"portfolio": {}, "balance": 1}) == []
+    assert pool.get_stats()['restarts'] == 1
+
+
+def test_a_model_over_the_memory_limit_fails_without_taking_down_others(tmp_path, pool):
+    greedy = model_dir(tmp_path, 'greedy', GREEDY_MODEL)
+    counting = model_dir(tmp_path, 'counting', COUNTING_MODEL)
+    pool.run('counting', counting, {"portfolio": {}, "balance": 1})
+
+    with pytest.raises(ModelError, match='memory limit'):
+        pool.run('greedy', greedy, {"portfolio": {}, "balance": 1})
+
+    assert pool.run('counting', counting, {"portfolio": {}, "balance": 1})[0]['quantity'] == 2
+
+
+def test_model_exceptions_are_reported(tmp_path, pool):
+    path = model_dir(tmp_path, 'broken', "class Model:\n    pass\n")
+    with pytest.raises(ModelError, match='AttributeError'):
+        pool.run('broken', path, {"portfolio": {}, "balance": 1})
+
+
+def test_same_named_helper_modules_stay_private_to_their_model(tmp_path):
+    pool = ModelPool(workers=1, memory_limit_mb=256, tick_timeout=2)
+    try:
+        a = model_dir(tmp_path, 'a', HELPER_MODEL, helper="TICKER = 'AAPL'\n")
+        b = model_dir(tmp_path, 'b', HELPER_MODEL, helper="TICKER = 'MSFT'\n")
+
+        for _ in range(2):
+            assert pool.run('a', a, {"portfolio": {}, "balance": 1})[0]['ticker'] == 'AAPL'
+            assert pool.run('b', b, {"portfolio": {}, "balance": 1})[0]['ticker'] == 'MSFT'
+
+        # an edited helper is picked up on the next tick
+        helper = tmp_path / 'b' / 'helper.py'
+        helper.write_text("TICKER = 'GOOG'\n")
+        os.utime(helper, (os.path.getmtime(helper) + 5,) * 2)
+        assert pool.run('b', b, {"portfolio": {}, "balance": 1})[0]['ticker'] == 'GOOG'
+        assert pool.run('a', a, {"portfolio": {}, "balance": 1})[0]['ticker'] == 'AAPL'
+    finally:
+        pool.close()
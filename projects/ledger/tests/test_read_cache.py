@@ -0,0 +1,75 @@
+import threading
+
+from read_cache import LedgerReadCache
+
+
+def test_reads_are_served_from_the_cache_until_a_write(db):
+    cache = LedgerReadCache()
+
+    for _ in range(3):
+        assert cache.get_or_load('krishalgo', (), lambda: db.view('krishalgo')) == {'balance': 100000.0}
+    assert db.reads == 1
+
+    db.ledgers['krishalgo']['balance'] = 98592.0
+    cache.invalidate('krishalgo')
+    assert cache.get_or_load('krishalgo', (), lambda: db.view('krishalgo')) == {'balance': 98592.0}
+    assert db.reads == 2
+    assert cache.get_stats() == {'hits': 2, 'misses': 2, 'invalidations': 1, 'evictions': 0, 'entries': 1}
+
+
+def test_invalidation_only_drops_that_ledgers_reads(db):
+    db.ledgers['other'] = {'balance': 5.0}
+    cache = LedgerReadCache()
+    for name, key in (('krishalgo', 'a'), ('krishalgo', 'b'), ('other', 'a')):
+        cache.get_or_load(name, key, lambda: db.view(name))
+
+    cache.invalidate('krishalgo')
+    cache.get_or_load('other', 'a', lambda: db.view('other'))
+    assert db.reads == 3
+    assert cache.get_stats()['entries'] == 1
+
+
+def test_unknown_ledgers_are_not_cached(db):
+    cache = LedgerReadCache()
+    for _ in range(2):
+        assert cache.get_or_load('missing', (), lambda: db.view('missing')) is None
+    assert db.reads == 2
+
+
+def test_a_read_that_raced_a_write_is_not_cached(db):
+    cache = LedgerReadCache()
+    loading = threading.Event()
+    written = threading.Event()
+
+    def slow_view():
+        value = db.view('krishalgo')
+        loading.set()
+        written.wait(1)
+        return value
+
+    reader = threading.Thread(target=cache.get_or_load, args=('krishalgo', (), slow_view))
+    reader.start()
+    loading.wait(1)
+    db.ledgers['krishalgo']['balance'] = 1.0
+    cache.invalidate('krishalgo')
+    written.set()
+    reader.join()
+
+    assert cache.get_or_load('krishalgo', (), lambda: db.view('krishalgo')) == {'balance': 1.0}
+
+
+def test_entries_expire_and_are_evicted_least_recently_used_first(db):
+    cache = LedgerReadCache(ttl=0)
+    cache.get_or_load('krishalgo', (), lambda: db.view('krishalgo'))
+    cache.get_or_load('krishalgo', (), lambda: db.view('krishalgo'))
+    assert db.reads == 2
+
+    cache = LedgerReadCache(max_entries=2)
+    for key in ('a', 'b', 'a', 'c'):
+        cache.get_or_load('krishalgo', key, lambda: db.view('krishalgo'))
+    reads = db.reads
+    cache.get_or_load('krishalgo', 'a', lambda: db.view('krishalgo'))
+    assert db.reads == reads
+    cache.get_or_load('krishalgo', 'b', lambda: db.view('krishalgo'))
+    assert db.reads == reads + 1
+    assert cache.get_stats()['evictions'] == 2
@@ -0,0 +1,99 @@
+import threading
+
+from scheduler import TickScheduler
+
+
+def buy_one(name, model, book_status):
+    return [{"type": "buy", "ticker": "AAPL", "price": 1, "quantity": 1}]
+
+
+def test_ledgers_sharing_a_schedule_tick_together(store, clock):
+    store.ledgers = {'a': (1, 'img-a'), 'b': (1, 'img-b'), 'slow': (5, 'img-c')}
+    clock.now = 600.5
+    scheduler = TickScheduler(store, buy_one, max_workers=4, clock=clock)
+    scheduler.refresh()
+
+    clock.now = 660.5  # the one minute group is due, the five minute one is not
+    scheduler.run_due()
+    scheduler.close()
+
+    assert store.status_reads == [['a', 'b']]
+    assert len(store.applied) == 1
+    assert sorted(name for name, trade in store.applied[0]) == ['a', 'b']
+    stats = scheduler.get_stats()
+    assert stats['ticks'] == 1
+    assert stats['ledger_ticks'] == 2
+    assert stats['trades_applied'] == 2
+    assert stats['last_lag_seconds'] == 0.5
+
+
+def test_ticks_are_clock_aligned():
+    assert TickScheduler.next_due(1, 125) == 180
+    assert TickScheduler.next_due(5, 125) == 300
+    assert TickScheduler.next_due(5, 300) == 600
+
+
+def test_a_group_still_running_skips_its_next_tick(store, clock):
+    release = threading.Event()
+
+    def stuck(name, model, book_status):
+        release.wait(2)
+        return []
+
+    store.ledgers = {'a': (1, 'img-a')}
+    scheduler = TickScheduler(store, stuck, clock=clock)
+    scheduler.refresh()
+    clock.now = 60
+    scheduler.run_due()
+    clock.now = 120
+    scheduler.run_due()
+    release.set()
+    scheduler.close()
+
+    assert scheduler.get_stats()['overruns'] == 1
+    assert scheduler.get_stats()['ticks'] == 1
+
+
+def test_model_failures_do_not_stop_the_rest_of_the_group(store, clock):
+    def flaky(name, model, book_status):
+        if name == 'broken':
+            raise RuntimeError("model crashed")
+        return buy_one(name, model, book_status)
+
+    store.ledgers = {'a': (1, 'img-a'), 'broken': (1, 'img-b')}
+    scheduler = TickScheduler(store, flaky, clock=clock)
+    scheduler.refresh()
+    clock.now = 60
+    scheduler.run_due()
+    scheduler.close()
+
+    assert [name for name, trade in store.applied[0]] == ['a']
+    assert scheduler.get_stats()['model_errors'] == 1
+
+
+def test_removed_ledgers_stop_ticking(store, clock):
+    store.ledgers = {'a': (1, 'img-a')}
+    scheduler = TickScheduler(store, buy_one, clock=clock)
+    scheduler.refresh()
+    store.ledgers = {}
+    scheduler.refresh()
+    clock.now = 60
+
+    assert scheduler.run_due() is None
+    scheduler.close()
+    assert store.applied == []
+
+
+def test_after_tick_gets_the_group_once_trades_are_applied(store, clock):
+    store.ledgers = {'a': (1, 'img-a'), 'b': (1, 'img-b')}
+    ticked = []
+    clock.now = 600.5
+    scheduler = TickScheduler(store, buy_one, max_workers=2, clock=clock,
+                              after_tick=lambda names: ticked.append((sorted(names), len(store.applied))))
+    scheduler.refresh()
+
+    clock.now = 660.5
+    scheduler.run_due()
+    scheduler.close()
+
+    assert ticked == [(['a', 'b'], 1)]
@@ -0,0 +1,75 @@
+from decimal import Decimal
+
+from sqlalchemy import insert, select
+
+import app as ledger_app
+from book import apply_trades, get_holdings, rebuild_snapshot, replay_trades, snapshot_differences
+from db_config import holdings, ledger, trades
+
+
+def test_differences_list_the_balance_and_each_mismatched_ticker():
+    differences = snapshot_differences({'AAPL': Decimal(5), 'MSFT': Decimal(1)}, Decimal(100),
+                                       {'MSFT': Decimal(1), 'GOOG': Decimal(2)}, Decimal(90))
+
+    assert differences == {'balance': (100, 90), 'AAPL': (5, 0), 'GOOG': (0, 2)}
+    assert snapshot_differences({'AAPL': Decimal(5)}, Decimal(100), {'AAPL': Decimal(5)}, Decimal(100)) == {}
+
+
+def test_check_reports_differences_without_fixing_them(monkeypatch, conn):
+    rebuilt = {'a': {}, 'b': {'balance': (Decimal(100), Decimal(90)), 'AAPL': (Decimal(5), 0)}, 'ghost': None}
+    monkeypatch.setattr(ledger_app, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(ledger_app, 'rebuild_snapshot', lambda conn, name: rebuilt[name])
+
+    result = ledger_app.app.test_cli_runner().invoke(args=['rebuild-snapshots', '--check', 'a', 'b', 'ghost'])
+
+    assert result.output.splitlines() == ["a: ok",
+                                          "b: balance was 100, trades give 90",
+                                          "b: AAPL was 5, trades give 0",
+                                          "ghost: no such ledger"]
+    assert (conn.commits, conn.rollbacks) == (0, 3)
+
+
+def test_rebuild_fixes_and_reports_each_ledger(monkeypatch, conn):
+    rebuilt = {'a': {'AAPL': (Decimal(5), 0)}, 'ghost': None}
+    monkeypatch.setattr(ledger_app, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(ledger_app, 'rebuild_snapshot', lambda conn, name: rebuilt[name])
+
+    result = ledger_app.app.test_cli_runner().invoke(args=['rebuild-snapshots', 'ghost', 'a'])
+
+    assert result.output.splitlines() == ["ghost: no such ledger", "a: AAPL was 5, trades give 0 (fixed)"]
+    assert (conn.commits, conn.rollbacks) == (1, 1)
+
+
+def test_replay_drops_positions_sold_down_to_zero(pg_conn):
+    pg_conn.execute(insert(trades), [
+        {'name': 'krishalgo', 'ticker': 'AAPL', 'type': 'buy', 'price': 100, 'quantity': 10},
+        {'name': 'krishalgo', 'ticker': 'AAPL', 'type': 'sell', 'price': 110, 'quantity': 10},
+        {'name': 'krishalgo', 'ticker': 'MSFT', 'type': 'buy', 'price': 400, 'quantity': 2},
+    ])
+
+    assert replay_trades(pg_conn, 'krishalgo') == ({'MSFT': 2}, 99300)
+
+
+def test_rebuild_replaces_a_stale_snapshot(pg_conn):
+    pg_conn.execute(insert(holdings).values(name='krishalgo', ticker='AAPL', quantity=10))
+    pg_conn.execute(insert(trades), [
+        {'name': 'krishalgo', 'ticker': 'AAPL', 'type': 'buy', 'price': 100, 'quantity': 10},
+        {'name': 'krishalgo', 'ticker': 'AAPL', 'type': 'sell', 'price': 110, 'quantity': 10},
+    ])
+
+    assert rebuild_snapshot(pg_conn, 'krishalgo') == {'balance': (100000, 100100), 'AAPL': (10, 0)}
+    assert get_holdings(pg_conn, 'krishalgo') == {}
+    assert pg_conn.execute(select(ledger.c.balance)).scalar_one() == 100100
+    assert rebuild_snapshot(pg_conn, 'krishalgo') == {}
+
+
+def test_snapshot_kept_by_apply_trades_matches_the_replay(pg_conn):
+    apply_trades(pg_conn, 'krishalgo', [{'type': 'buy', 'ticker': 'AAPL', 'price': 100, 'quantity': 10},
+                                        {'type': 'sell', 'ticker': 'AAPL', 'price': 110, 'quantity': 10},
+                                        {'type': 'buy', 'ticker': 'MSFT', 'price': 400, 'quantity': 2}])
+
+    assert rebuild_snapshot(pg_conn, 'krishalgo') == {}
+
+
+def test_unknown_ledgers_are_not_rebuilt(pg_conn):
+    assert rebuild_snapshot(pg_conn, 'ghost') is None
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+
+from trade_history import decode_cursor, encode_cursor, trades_query
+
+
+def test_cursor_round_trips():
+    ts = datetime(2025, 1, 6, 14, 30, 0, 123456)
+    cursor = encode_cursor(ts, 42)
+
+    assert decode_cursor(cursor) == (ts, 42)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not a cursor', encode_cursor(datetime(2025, 1, 6), 1)[:-3]])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_pages_continue_after_the_cursor_in_ts_id_order(compile_pg):
+    sql = compile_pg(trades_query('krishalgo', ticker='AAPL', after=(datetime(2025, 1, 6), 42)))
+
+    assert "(trades.ts, trades.id) > ('2025-01-06 00:00:00', 42)" in sql
+    assert "trades.ticker = 'AAPL'" in sql
+    assert sql.endswith("ORDER BY trades.ts, trades.id")
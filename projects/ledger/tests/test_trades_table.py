@@ -0,0 +1,68 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+import app as ledger_app
+from app import recent_trades_query
+from db_config import ledger
+from trade_history import trades_query
+
+MIGRATION = os.path.join(os.path.dirname(__file__), '..', 'sql_statements', 'migrations', '001_trades_table.sql')
+
+
+def run_migration(conn, path):
+    """Run a migration file inside the test's transaction (without its own BEGIN / COMMIT)"""
+    with open(path) as f:
+        sql = '\n'.join(line for line in f if line.strip() not in ('BEGIN;', 'COMMIT;'))
+    conn.exec_driver_sql(sql)
+
+
+def test_view_filters_trades_by_ticker_and_range(compile_pg):
+    sql = compile_pg(recent_trades_query('krishalgo', datetime(2025, 1, 6), datetime(2025, 1, 7), 'AAPL', 50))
+
+    assert "trades.name = 'krishalgo'" in sql
+    assert "trades.ts >= '2025-01-06 00:00:00'" in sql
+    assert "trades.ts < '2025-01-07 00:00:00'" in sql
+    assert "trades.ticker = 'AAPL'" in sql
+    assert sql.endswith("ORDER BY trades.ts DESC, trades.id DESC \n LIMIT 50")
+
+
+def test_view_without_filters_reads_the_latest_trades(compile_pg):
+    sql = compile_pg(recent_trades_query('krishalgo', None, None, None, 100))
+
+    assert sql.split("WHERE ")[1].startswith("trades.name = 'krishalgo' ORDER BY")
+
+
+@pytest.mark.parametrize('limit', ['0', '-5', '1001'])
+def test_view_limit_out_of_range_is_rejected(limit, db, monkeypatch):
+    monkeypatch.setattr(ledger_app, 'load_ledger_view', lambda *args: db.view('krishalgo'))
+    client = ledger_app.app.test_client()
+
+    resp = client.get('/view_ledger', query_string={'name': 'krishalgo', 'limit': limit})
+
+    assert resp.status_code == 400
+    assert resp.json == {"error": "limit must be between 1 and 1000"}
+    assert db.reads == 0
+    assert client.get('/view_ledger', query_string={'name': 'krishalgo', 'limit': '1000'}).status_code == 200
+
+
+def test_backfilled_trades_keep_their_order(pg_conn):
+    jsonb_trades = [{"type": "buy", "ticker": "AAPL", "price": 176, "quantity": 8},
+                    {"type": "buy", "ticker": "MSFT", "price": 400, "quantity": 1},
+                    {"type": "sell", "ticker": "AAPL", "price": 180, "quantity": 3}]
+    pg_conn.execute(update(ledger).values(trades=jsonb_trades))
+
+    run_migration(pg_conn, MIGRATION)
+    run_migration(pg_conn, MIGRATION)  # re-running does not backfill twice
+
+    rows = pg_conn.execute(trades_query('krishalgo')).fetchall()
+    assert [{"type": r.type, "ticker": r.ticker, "price": int(r.price), "quantity": int(r.quantity)}
+            for r in rows] == jsonb_trades
+
+    created_at = pg_conn.execute(select(ledger.c.created_at)).scalar_one()
+    recent = pg_conn.execute(recent_trades_query('krishalgo', created_at, created_at + timedelta(seconds=1),
+                                                 'AAPL', 1)).fetchall()
+    assert [(r.type, int(r.quantity)) for r in recent] == [("sell", 3)]
+    assert pg_conn.execute(recent_trades_query('krishalgo', None, created_at, None, 10)).first() is None
@@ -0,0 +1,32 @@
+from valuation import Valuation, mark_to_market
+
+
+def test_worth_is_balance_plus_holdings_at_market():
+    balances = {'a': 1000.0, 'b': 50.0, 'cash': 10.0}
+    positions = [('a', 'AAPL', 2), ('a', 'MSFT', 1), ('b', 'AAPL', -1)]
+    worths, unpriced = mark_to_market(balances, positions, {'AAPL': 100.0, 'MSFT': 400.0})
+
+    assert worths == {'a': 1600.0, 'b': -50.0, 'cash': 10.0}
+    assert unpriced == set()
+
+
+def test_ledgers_holding_an_unpriced_ticker_are_not_valued():
+    balances = {'a': 1000.0, 'b': 50.0}
+    positions = [('a', 'AAPL', 2), ('b', 'XYZ', 1)]
+    worths, unpriced = mark_to_market(balances, positions, {'AAPL': 100.0})
+
+    assert worths == {'a': 1200.0}
+    assert unpriced == {'b'}
+
+
+def test_prices_are_fetched_once_while_fresh(price_source, clock):
+    valuation = Valuation(price_source, max_price_age=30, clock=clock)
+
+    assert valuation.prices({'AAPL'}) == {'AAPL': 100.0}
+    clock.now = 10
+    assert valuation.prices({'AAPL', 'MSFT'}) == {'AAPL': 100.0, 'MSFT': 400.0}
+    assert price_source.requests == [['AAPL'], ['MSFT']]
+
+    clock.now = 35  # AAPL is stale, MSFT is not
+    valuation.prices({'AAPL', 'MSFT'})
+    assert price_source.requests[-1] == ['AAPL']
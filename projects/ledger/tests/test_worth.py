@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert, select
+
+from db_config import ledger, trades, worth_points
+from worth import downsample_worth, parse_timestamp, pick_resolution, record_worths
+
+
+def test_timestamps_are_normalized_to_naive_utc():
+    assert parse_timestamp('2025-01-06T09:30:00-05:00') == datetime(2025, 1, 6, 14, 30)
+    assert parse_timestamp('2025-01-06T14:30:00+00:00') == datetime(2025, 1, 6, 14, 30)
+    assert parse_timestamp('2025-01-06T14:30:00') == datetime(2025, 1, 6, 14, 30)
+    assert parse_timestamp(None) is None
+    assert parse_timestamp('') is None
+
+
+@pytest.mark.parametrize('value', ['yesterday', '2025-13-01', '2025-01-06T25:00'])
+def test_malformed_timestamps_raise_value_error(value):
+    with pytest.raises(ValueError):
+        parse_timestamp(value)
+
+
+def test_resolution_is_the_finest_one_still_stored():
+    now = datetime.now(timezone.utc)
+    assert pick_resolution(parse_timestamp((now - timedelta(hours=3)).isoformat())) == 'minute'
+    assert pick_resolution(parse_timestamp((now - timedelta(days=5)).isoformat())) == 'hour'
+    assert pick_resolution(parse_timestamp((now - timedelta(days=90)).isoformat())) == 'day'
+    assert pick_resolution(None) == 'day'
+
+
+class RecordingConnection:
+    """Compiles the statements executed on it instead of running them"""
+
+    def __init__(self, compile_pg):
+        self.compile_pg = compile_pg
+        self.statements = []
+
+    def execute(self, stmt):
+        self.statements.append(self.compile_pg(stmt))
+        return SimpleNamespace(rowcount=0)
+
+
+def test_points_and_cutoffs_use_utc_rather_than_the_session_time_zone(compile_pg):
+    conn = RecordingConnection(compile_pg)
+    record_worths(conn, {'krishalgo': 100.0})
+    downsample_worth(conn)
+
+    assert "date_trunc('minute', timezone('utc', now()))" in conn.statements[0]
+    assert all("localtimestamp" not in sql.lower() for sql in conn.statements)
+    assert any("date_trunc('hour', timezone('utc', now()) - make_interval(0, 0, 0, 2))" in sql
+               for sql in conn.statements)
+    assert trades.c.ts.server_default.arg.text == "timezone('utc', now())"
+    assert ledger.c.created_at.server_default.arg.text == "timezone('utc', now())"
+
+
+def test_stored_timestamps_are_utc_in_a_non_utc_session(pg_conn):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    # two days ago by UTC, which a local (UTC+5:30) cutoff would already roll up
+    kept = now - timedelta(days=2) + timedelta(hours=2)
+    pg_conn.execute(insert(worth_points).values(name='krishalgo', ts=kept, resolution='minute', worth=1.0))
+    pg_conn.execute(insert(trades).values(name='krishalgo', ticker='AAPL', type='buy', price=1, quantity=1))
+    record_worths(pg_conn, {'krishalgo': 2.0})
+    downsample_worth(pg_conn)
+
+    created_at = pg_conn.execute(select(ledger.c.created_at)).scalar_one()
+    traded_at = pg_conn.execute(select(trades.c.ts)).scalar_one()
+    points = pg_conn.execute(select(worth_points.c.ts).where(worth_points.c.resolution == 'minute')
+                             .order_by(worth_points.c.ts)).scalars().all()
+    assert abs(created_at - now) < timedelta(minutes=1)
+    assert abs(traded_at - now) < timedelta(minutes=1)
+    assert points[0] == kept
+    assert abs(points[1] - now) < timedelta(minutes=1)
@@ -0,0 +1,70 @@
+"""
+Reading a ledger's trade history in pieces, oldest first, in (ts, id) order.
+
+Pages use keyset pagination: a page ends with an opaque cursor encoding the (ts, id) of its
+last trade, and the next page starts strictly after it. Each page is then one range scan of
+the (name, ts, id) index (or (name, ticker, ts, id) with a ticker filter), however deep into
+the history it is, and trades recorded while a client pages through are neither skipped nor
+repeated.
+
+Exports read the whole (filtered) history through a server-side cursor, fetching
+EXPORT_BATCH_SIZE rows at a time, so neither the service nor the database materializes the
+result.
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
+
+from db_config import trades
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def encode_cursor(ts, trade_id):
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{trade_id}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(ts, id) of a cursor made by encode_cursor; raises ValueError for anything else"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, trade_id = raw.split('|')
+        return datetime.fromisoformat(ts), int(trade_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+def trades_query(name, since=None, until=None, ticker=None, after=None):
+    """The ledger's trades in (ts, id) order, from since to until, after the (ts, id) `after`"""
+    stmt = select(trades).where(trades.c.name == name).order_by(trades.c.ts, trades.c.id)
+    if since:
+        stmt = stmt.where(trades.c.ts >= since)
+    if until:
+        stmt = stmt.where(trades.c.ts < until)
+    if ticker:
+        stmt = stmt.where(trades.c.ticker == ticker)
+    if after:
+        stmt = stmt.where(tuple_(trades.c.ts, trades.c.id) > tuple_(*after))
+    return stmt
+
+
+def trades_page(conn, name, limit, cursor=None, since=None, until=None, ticker=None):
+    """
+    Up to limit trades following cursor (from the start when None), and the cursor of the
+    page after it (None when this is the last page)
+    """
+    after = decode_cursor(cursor) if cursor else None
+    rows = conn.execute(trades_query(name, since, until, ticker, after).limit(limit + 1)).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].ts, rows[-1].id)
+
+
+def stream_trades(conn, name, since=None, until=None, ticker=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the ledger's matching trades from a server-side cursor, batch_size rows at a time"""
+    result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+        trades_query(name, since, until, ticker))
+    with result:
+        yield from result
@@ -0,0 +1,117 @@
+"""
+Mark-to-market valuation of ledgers: worth = balance + sum(quantity * price) of holdings.
+
+Instead of pricing ledger by ledger, a valuation pass reads the holdings of every ledger
+being valued at once, fetches the price of each distinct ticker once (and reuses it for
+max_price_age seconds, so groups of ledgers ticking at the same moment share a fetch),
+computes all worths in one vectorized pass over the holdings, and records them with one
+multi-row insert (worth.record_worths).
+
+Price sources are objects with get_prices(tickers) -> {ticker: price}; tickers they have no
+price for are left out, and ledgers holding them are not valued that round.
+"""
+import json
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from db_config import holdings, ledger
+from worth import record_worths
+
+
+class JsonFilePriceSource:
+    """Prices from a local {ticker: price} JSON file, re-read on every fetch so another process can update it"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_prices(self, tickers):
+        with open(self.path) as f:
+            prices = json.load(f)
+        return {ticker: float(prices[ticker]) for ticker in tickers if ticker in prices}
+
+
+class YFinancePriceSource:
+    """Latest prices from Yahoo Finance, all tickers in one download"""
+
+    def get_prices(self, tickers):
+        import yfinance as yf
+
+        if not tickers:
+            return {}
+        closes = yf.download(list(tickers), period='1d', interval='1m', progress=False)['Close']
+        latest = closes.ffill().iloc[-1]
+        return {ticker: float(latest[ticker]) for ticker in tickers
+                if ticker in latest.index and not np.isnan(latest[ticker])}
+
+
+def mark_to_market(balances, positions, prices):
+    """
+    balances: {name: balance}; positions: [(name, ticker, quantity)]; prices: {ticker: price}.
+    Returns ({name: worth}, {names that hold a ticker without a price}).
+    """
+    names = list(balances)
+    if not positions:
+        return {name: float(balance) for name, balance in balances.items()}, set()
+
+    row_of = {name: i for i, name in enumerate(names)}
+    tickers = sorted({ticker for _, ticker, _ in positions})
+    column_of = {ticker: i for i, ticker in enumerate(tickers)}
+    price_vector = np.array([prices.get(ticker, np.nan) for ticker in tickers], dtype=float)
+
+    rows = np.fromiter((row_of[name] for name, _, _ in positions), dtype=np.intp, count=len(positions))
+    columns = np.fromiter((column_of[ticker] for _, ticker, _ in positions), dtype=np.intp, count=len(positions))
+    quantities = np.fromiter((float(quantity) for _, _, quantity in positions), dtype=float, count=len(positions))
+
+    # holdings x prices, summed per ledger; a missing price makes the ledger's sum NaN
+    market_values = np.bincount(rows, weights=quantities * price_vector[columns], minlength=len(names))
+    worths = np.array([float(balances[name]) for name in names]) + market_values
+    valued = ~np.isnan(worths)
+    return ({name: float(worth) for name, worth, ok in zip(names, worths, valued) if ok},
+            {name for name, ok in zip(names, valued) if not ok})
+
+
+class Valuation:
+    def __init__(self, price_source, max_price_age=30, clock=time.monotonic):
+        self.price_source = price_source
+        self.max_price_age = max_price_age
+        self.clock = clock
+        self._prices = {}  # ticker -> (fetched_at, price)
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def prices(self, tickers):
+        """Prices of tickers, fetching only the ones not fetched in the last max_price_age seconds"""
+        now = self.clock()
+        with self._lock:
+            prices = {ticker: entry[1] for ticker, entry in self._prices.items()
+                      if ticker in tickers and now - entry[0] < self.max_price_age}
+        missing = sorted(set(tickers) - prices.keys())
+        if missing:
+            fetched = self.price_source.get_prices(missing)
+            with self._lock:
+                self.fetches += 1
+                for ticker, price in fetched.items():
+                    self._prices[ticker] = (now, price)
+            prices.update(fetched)
+        return prices
+
+    def value(self, conn, names=None):
+        """
+        Mark the given ledgers (all of them by default) to market and record their worth.
+        Returns ({name: worth}, {names not valued for lack of a price}). The caller commits.
+        """
+        stmt = select(ledger.c.name, ledger.c.balance)
+        positions_stmt = select(holdings.c.name, holdings.c.ticker, holdings.c.quantity).where(holdings.c.quantity != 0)
+        if names is not None:
+            stmt = stmt.where(ledger.c.name.in_(names))
+            positions_stmt = positions_stmt.where(holdings.c.name.in_(names))
+        balances = {row.name: row.balance for row in conn.execute(stmt)}
+        positions = [tuple(row) for row in conn.execute(positions_stmt) if row.name in balances]
+
+        prices = self.prices({ticker for _, ticker, _ in positions})
+        worths, unpriced = mark_to_market(balances, positions, prices)
+        record_worths(conn, worths)
+        return worths, unpriced
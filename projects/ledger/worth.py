@@ -0,0 +1,119 @@
+"""
+Worth history of ledgers, stored as one row per point in worth_points instead of an
+ever-growing array on the ledger row.
+
+Points are recorded at minute resolution. Once older than their retention they are rolled
+up to the next resolution, keeping the last value of each hour, then of each day; daily
+points are kept for the ledger's lifetime. The roll-up runs automatically from
+record_worth (at most every DOWNSAMPLE_INTERVAL seconds per process), or on demand with
+`flask --app app downsample-worth`.
+"""
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db_config import utc_now, worth_points
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+# how long points are kept at a resolution before being rolled up to the next one
+RETENTION_DAYS = {'minute': 2, 'hour': 30}
+DOWNSAMPLE_INTERVAL = 600
+
+_last_downsample = 0.0
+
+
+def record_worth(conn, name, worth):
+    """Record a ledger's current worth as this minute's point. The caller commits."""
+    record_worths(conn, {name: worth})
+
+
+def record_worths(conn, worths):
+    """Record {name: worth} as this minute's points, in one multi-row statement. The caller commits."""
+    if not worths:
+        return
+    minute = func.date_trunc('minute', utc_now())
+    stmt = pg_insert(worth_points).values([
+        {'name': name, 'ts': minute, 'resolution': 'minute', 'worth': float(worth)}
+        for name, worth in worths.items()
+    ])
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[worth_points.c.name, worth_points.c.ts, worth_points.c.resolution],
+        set_={'worth': stmt.excluded.worth}
+    ))
+    maybe_downsample(conn)
+
+
+def maybe_downsample(conn):
+    global _last_downsample
+    if time.monotonic() - _last_downsample >= DOWNSAMPLE_INTERVAL:
+        _last_downsample = time.monotonic()
+        downsample_worth(conn)
+
+
+def downsample_worth(conn):
+    """
+    Roll every point past its retention up to the next resolution, for all ledgers.
+    Cutoffs are aligned to the coarser resolution, so only complete hours (days) are rolled
+    up. Returns the number of points removed. The caller commits.
+    """
+    removed = 0
+    for finer, coarser in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+        cutoff = func.date_trunc(coarser, utc_now() - func.make_interval(0, 0, 0, RETENTION_DAYS[finer]))
+        bucket = func.date_trunc(coarser, worth_points.c.ts)
+        # last point of each bucket
+        latest = (select(worth_points.c.name, bucket, literal(coarser), worth_points.c.worth)
+                  .where(worth_points.c.resolution == finer, worth_points.c.ts < cutoff)
+                  .distinct(worth_points.c.name, bucket)
+                  .order_by(worth_points.c.name, bucket, worth_points.c.ts.desc()))
+        stmt = pg_insert(worth_points).from_select(['name', 'ts', 'resolution', 'worth'], latest)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[worth_points.c.name, worth_points.c.ts, worth_points.c.resolution],
+            set_={'worth': stmt.excluded.worth}
+        ))
+        removed += conn.execute(delete(worth_points).where(worth_points.c.resolution == finer,
+                                                           worth_points.c.ts < cutoff)).rowcount
+    return removed
+
+
+def parse_timestamp(value):
+    """
+    An ISO timestamp, with or without an offset, as a naive UTC datetime (how timestamps are
+    stored); None for a missing or empty one. Raises ValueError when it is malformed.
+    """
+    if not value:
+        return None
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def pick_resolution(since):
+    """The finest resolution still stored for points from `since` (a naive UTC datetime) onwards"""
+    if since is None:
+        return 'day'
+    age = datetime.now(timezone.utc).replace(tzinfo=None) - since
+    for resolution in RESOLUTIONS[:-1]:
+        if age.days < RETENTION_DAYS[resolution]:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def worth_series(conn, name, resolution, since=None, until=None):
+    """
+    [(ts, worth)] of a ledger between since and until, one point per `resolution` bucket
+    (the last value in it). Ranges that are only stored at a coarser resolution come back
+    at that resolution.
+    """
+    bucket = func.date_trunc(resolution, worth_points.c.ts).label('bucket')
+    stmt = (select(bucket, worth_points.c.worth)
+            .where(worth_points.c.name == name)
+            .distinct(bucket)
+            .order_by(bucket, worth_points.c.ts.desc()))
+    if since:
+        stmt = stmt.where(worth_points.c.ts >= since)
+    if until:
+        stmt = stmt.where(worth_points.c.ts < until)
+    return [(row.bucket, row.worth) for row in conn.execute(stmt)]